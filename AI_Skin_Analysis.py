@@ -1,11 +1,29 @@
 import os
-import tempfile
 from openai import OpenAI
 from dotenv import load_dotenv
 import base64
 import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import requests
 
+from provider_router import router_from_env
+from vision_preprocess import GEMINI_TILE, OPENAI_SHORT_SIDE, PreparedImage, prepare_vision_image
+from analysis_cache import AnalysisCache, cache_from_env, prompt_version
+from rate_limiter import RateLimitExceeded, limiter_from_env
+from skin_schema import SKIN_METRICS_SCHEMA, SkinMetrics, parse_skin_metrics
+from product_ranker import rank_products
+from text_tokens import estimate_tokens, estimate_message_tokens
+from conversation_memory import ConversationMemory
+from tts_cache import TTSCache, tts_cache_from_env
+from audio_store import audio_store_from_env
+from tts_pipeline import split_sentences, synthesize_pipelined
+import audio_bank as audio_bank_module
+from audio_profiles import AudioProfile, get_profile, profile_snapshot, transcode
+import voice_trace
+
 # Load environment variables
 load_dotenv()
 
@@ -62,6 +80,80 @@ except Exception as e:
 
 # Anthropic/Claude removed - using OpenAI and Gemini only
 
+
+# -------------------- PROVIDER ROUTING --------------------
+
+# Routes analyze_face between Gemini and GPT-4o by rolling latency / error rate.
+# FACE_ROUTER_HEDGE=1 fires the second provider after FACE_ROUTER_HEDGE_DELAY seconds.
+# The route of the last call on a thread is available via face_router.last_record().
+face_router = router_from_env("analyze_face", "FACE_ROUTER")
+
+# GPT4O_SPECULATIVE_RETRY=1 sends the short refusal-retry prompt while the main
+# prompt is still running, once it has taken longer than the p90 of recent main
+# calls (at most GPT4O_SPECULATIVE_DELAY seconds; 0 sends both at once), instead
+# of only after a refusal. The first usable answer wins and the other request is
+# dropped. "skipped" counts calls answered before a retry was sent, "used" calls
+# answered by the retry, "discarded" calls where the retry was sent but lost.
+# "wasted_tokens" is what the dropped requests cost; "used_tokens" what the
+# winning retries cost. GPT4O_SPECULATIVE_DEBUG=1 prints the stats after each call.
+GPT4O_SPECULATIVE_RETRY = os.getenv("GPT4O_SPECULATIVE_RETRY", "0").strip().lower() in ("1", "true", "yes")
+GPT4O_SPECULATIVE_DEBUG = os.getenv("GPT4O_SPECULATIVE_DEBUG", "0").strip().lower() in ("1", "true", "yes")
+try:
+    GPT4O_SPECULATIVE_DELAY = float(os.getenv("GPT4O_SPECULATIVE_DELAY", "4.0"))
+except ValueError:
+    GPT4O_SPECULATIVE_DELAY = 4.0
+speculative_retry_stats = {
+    "calls": 0,
+    "skipped": 0,
+    "used": 0,
+    "discarded": 0,
+    "used_tokens": 0,
+    "wasted_tokens": 0,
+}
+_speculative_main_latencies = deque(maxlen=50)
+_speculative_lock = threading.Lock()
+_speculative_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="gpt4o-speculative")
+
+# analyze_face results keyed on image digest + language + prompt version.
+# ANALYSIS_CACHE_SIZE bounds the memory tier; ANALYSIS_CACHE_DIR enables the disk tier.
+face_cache = cache_from_env("ANALYSIS_CACHE")
+_face_prompt_version_value = None
+_structured_prompt_version_value = None
+
+
+# -------------------- RATE LIMITING --------------------
+
+# Client-side requests/tokens-per-minute budgets, shared by all worker processes on
+# the host through a flock()-guarded state file (see rate_limiter.SharedRateLimiter).
+# Each limiter is configured by <PREFIX>_RPM / <PREFIX>_TPM. A call waits up to
+# RATE_LIMIT_MAX_WAIT seconds for budget and fails fast when it would need longer.
+provider_limiters = {
+    "gpt-4o-mini": limiter_from_env("gpt-4o-mini", "OPENAI_CHAT", rpm=500, tpm=200000),
+    "gpt-4o": limiter_from_env("gpt-4o", "OPENAI_VISION", rpm=500, tpm=30000),
+    "tts-1-hd": limiter_from_env("tts-1-hd", "OPENAI_TTS", rpm=500),
+    "gemini": limiter_from_env("gemini", "GEMINI", rpm=60, tpm=1000000),
+}
+try:
+    RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "2.0"))
+except ValueError:
+    RATE_LIMIT_MAX_WAIT = 2.0
+
+# Rough per-request token cost of a face analysis (resized image + prompt + answer)
+FACE_TOKENS_ESTIMATE = 2000
+
+provider_call_stats = {}
+_provider_stats_lock = threading.Lock()
+
+
+def _acquire_budget(name: str, tokens: float = 0, limiters: dict = None):
+    """
+    Take rate-limit budget for one request to `name`, or raise RateLimitExceeded.
+    `limiters` overrides provider_limiters for this call only (batch jobs).
+    """
+    limiter = (limiters or {}).get(name) or provider_limiters.get(name)
+    if limiter is not None and not limiter.acquire(tokens=tokens, timeout=RATE_LIMIT_MAX_WAIT):
+        raise RateLimitExceeded(f"Rate limit exceeded for {name} (client-side budget exhausted)")
+
 # Initialize Google Gemini client (for skin analysis)
 
 
@@ -85,8 +177,11 @@ except Exception as e:
    # GEMINI_AVAILABLE = False
    # gemini_client = None
 
-# Conversation history for context
-conversation_history = {}
+# Products offered to analyze() per turn; the rest of the catalog is left out of the prompt
+try:
+    PRODUCTS_TOP_K = int(os.getenv("ANALYZE_PRODUCTS_TOP_K", "6"))
+except ValueError:
+    PRODUCTS_TOP_K = 6
 
 
 def clean_response_formatting(text):
@@ -125,43 +220,48 @@ def clean_response_formatting(text):
     
     return text
 
-def analyze(question: str, language: str = "en", user_id: str = "default", available_products: list = None) -> str:
-    if not question or len(question.strip()) < 2:
-        # Return empty string instead of error message
-        return ""
 
-    try:
-        # Determine response language
-        response_lang = "Russian" if language == "ru" else "English"
-        
-        # Get conversation history for this user
-        if user_id not in conversation_history:
-            conversation_history[user_id] = []
-        
-        history = conversation_history[user_id]
-        
-        # Keep only last 4 messages for context (2 exchanges)
-        if len(history) > 8:
-            history = history[-8:]
-            conversation_history[user_id] = history
-        
-        # Get relevant context from dataset if available
-        dataset_context = ""
-        if DATASET_AVAILABLE and dataset_manager:
-            dataset_context = dataset_manager.get_relevant_context(question, max_context_length=500)
-            if dataset_context:
-                print(f"📚 Found relevant context from dataset ({len(dataset_context)} chars)")
-        
-        # Get available products list for AI context
-        available_products_list = available_products or []
-        
-        # Build messages with history (shorter prompt for faster processing)
-        products_context = ""
-        if available_products_list:
-            products_context = f"\n\nAVAILABLE PRODUCTS YOU CAN RECOMMEND (use EXACT names):\n" + "\n".join([f"- {p}" for p in available_products_list])
-            products_context += "\n\nCRITICAL: When recommending products, you MUST use the EXACT product names from the list above. Do NOT invent product names or use variations."
-        
-        system_prompt = f"""You are RUNOVA, an AI dermatologist assistant. Provide concise, professional skincare advice.
+# -------------------- TTS CACHE --------------------
+
+# All generated audio goes through one budgeted store (AUDIO_STORE_DIR, _MAX_MB,
+# _MAX_AGE_DAYS, _SWEEP_SECONDS) whose background sweeper evicts stale files.
+audio_store = audio_store_from_env("AUDIO_STORE")
+
+# Synthesized speech keyed on (text, voice, model, speed); repeated phrases are served
+# from the store. TTS_CACHE=0 disables it, TTS_CACHE_MAX_MB bounds it.
+TTS_MODEL = "tts-1-hd"
+TTS_SPEED = 1.0
+tts_cache = tts_cache_from_env("TTS_CACHE", store=audio_store)
+
+# Pre-rendered product blurbs and fixed phrases (see prerender_audio.py), loaded once
+audio_bank = audio_bank_module.AudioBank(os.getenv("AUDIO_BANK_DIR") or audio_bank_module.DEFAULT_DIR)
+if len(audio_bank):
+    print(f"✅ Audio bank loaded: {len(audio_bank)} pre-rendered phrases")
+
+# Streaming synthesis (stream_voice): chunk size relayed to the client, whether the
+# finished clip is written to the TTS cache afterwards, and time-to-first-byte samples.
+TTS_STREAM_CHUNK = 4096
+TTS_STREAM_PERSIST = os.getenv("TTS_STREAM_PERSIST", "1").lower() not in ("0", "false", "no", "off")
+tts_stream_stats = {"streams": 0, "cache_hits": 0, "errors": 0, "ttfb": []}
+_tts_stream_lock = threading.Lock()
+_tts_persist_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-persist")
+
+# Sentence-pipelined synthesis: segments synthesized in parallel per answer
+try:
+    TTS_PIPELINE_WORKERS = int(os.getenv("TTS_PIPELINE_WORKERS", "3"))
+except ValueError:
+    TTS_PIPELINE_WORKERS = 3
+
+# Speech-to-text for uploaded voice clips (/analyze-audio)
+TRANSCRIBE_MODEL = os.getenv("TRANSCRIBE_MODEL", "gpt-4o-transcribe")
+
+
+# -------------------- PROMPTS --------------------
+
+# Static part of the analyze() system prompt, identical on every call so providers can
+# serve it from their prompt cache. Per-turn content (products, knowledge base) goes
+# in a separate system message after the conversation history.
+STATIC_SYSTEM_PROMPT = """You are RUNOVA, an AI dermatologist assistant. Provide concise, professional skincare advice.
 
 CRITICAL FORMATTING RULES - NEVER VIOLATE THESE:
 - NEVER use numbered lists ("1.", "2.", "3.") - FORBIDDEN
@@ -183,7 +283,7 @@ PRODUCT RECOMMENDATION RULES:
 - If recommending multiple products, mention at least 2-3 products by their exact names
 - CRITICAL: When recommending multiple products, mention them in the ORDER they appear in the available products list (first product first, second product second, etc.)
 - This ensures the verbal order matches the visual card order (left-to-right)
-- Do NOT abbreviate or modify product names{products_context}
+- Do NOT abbreviate or modify product names
 
 Keep responses SHORT (2-3 sentences max). Be direct and helpful.
 
@@ -192,20 +292,218 @@ SYSTEM RULES:
 - If input is not English, still respond in English.
 - Do not output any other language.
 - Always respond in English with natural American English."""
+
+# analyze() prompt-cache accounting from the provider's usage report
+prompt_cache_stats = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0}
+_prompt_cache_lock = threading.Lock()
+
+
+def _record_prompt_cache(usage: dict, latency: float):
+    """Log cached vs uncached prompt tokens reported by the provider for one analyze() call."""
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    with _prompt_cache_lock:
+        prompt_cache_stats["calls"] += 1
+        prompt_cache_stats["prompt_tokens"] += prompt_tokens
+        prompt_cache_stats["cached_tokens"] += cached_tokens
+        total_prompt = prompt_cache_stats["prompt_tokens"]
+        total_cached = prompt_cache_stats["cached_tokens"]
+    hit_rate = total_cached / total_prompt * 100 if total_prompt else 0.0
+    print(f"🗄️ Prompt tokens: {prompt_tokens} ({cached_tokens} cached, {prompt_tokens - cached_tokens} uncached), "
+          f"{latency:.2f}s; overall cached {hit_rate:.0f}%")
+
+
+def _products_context(products: list) -> str:
+    products_context = f"\n\nAVAILABLE PRODUCTS YOU CAN RECOMMEND (use EXACT names):\n" + "\n".join([f"- {p}" for p in products])
+    products_context += "\n\nCRITICAL: When recommending products, you MUST use the EXACT product names from the list above. Do NOT invent product names or use variations."
+    return products_context
+
+
+def _summarize_conversation(previous_summary: str, messages: list) -> str:
+    """Fold older turns into the rolling summary (runs off the request path)."""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    openai_key = os.getenv("OPENAI_API_KEY")
+    if not openai_key or not openai_key.startswith("sk-"):
+        # No model available: keep the user's side of the conversation verbatim
+        user_turns = " ".join(m["content"] for m in messages if m["role"] == "user")
+        return f"{previous_summary} User asked: {user_turns}".strip()
+    
+    if not provider_limiters["gpt-4o-mini"].acquire(tokens=estimate_tokens(transcript) + 150, timeout=30):
+        raise RateLimitExceeded("No budget to summarize conversation")
+    response = requests.post(
+        'https://api.openai.com/v1/chat/completions',
+        headers={'Authorization': f'Bearer {openai_key}', 'Content-Type': 'application/json'},
+        json={
+            'model': 'gpt-4o-mini',
+            'messages': [
+                {
+                    "role": "system",
+                    "content": "Update the running summary of a skincare consultation. Keep the user's skin type, "
+                               "concerns, products already recommended and their reactions. At most 80 words, plain text."
+                },
+                {
+                    "role": "user",
+                    "content": f"Current summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"
+                }
+            ],
+            'max_tokens': 150,
+            'temperature': 0.2
+        },
+        timeout=20
+    )
+    response.raise_for_status()
+    return response.json()['choices'][0]['message']['content'].strip()
+
+
+# Conversation history for context. CONVERSATION_TOKEN_BUDGET caps the summary plus
+# recent turns sent with each question.
+try:
+    CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "800"))
+except ValueError:
+    CONVERSATION_TOKEN_BUDGET = 800
+conversation_memory = ConversationMemory(_summarize_conversation, token_budget=CONVERSATION_TOKEN_BUDGET)
+
+# Optional hedging of analyze() across OpenAI and Gemini. CHAT_ROUTER_HEDGE=1 turns it
+# on; the hedge fires once OpenAI exceeds CHAT_ROUTER_HEDGE_PERCENTILE (default p95) of
+# its recent latency, or CHAT_ROUTER_HEDGE_DELAY seconds until there is enough data.
+chat_router = router_from_env("analyze", "CHAT_ROUTER", hedge_percentile=95)
+CHAT_HEDGE = chat_router.hedge
+
+
+class ChatResponseError(Exception):
+    """A chat provider answered, but with nothing usable; carries the user-facing message."""
+
+    def __init__(self, user_message: str):
+        super().__init__(user_message)
+        self.user_message = user_message
+
+
+def _chat_openai(headers: dict, payload: dict) -> str:
+    """One OpenAI chat completion for analyze(); returns the cleaned answer."""
+    # Wait briefly for client-side budget; fail fast instead of collecting a 429
+    if not provider_limiters["gpt-4o-mini"].acquire(tokens=estimate_message_tokens(payload['messages']) + 200, timeout=RATE_LIMIT_MAX_WAIT):
+        raise ChatResponseError("Rate limit exceeded. Please try again in a moment.")
+    
+    try:
+        request_start = time.time()
+        response = requests.post(
+            'https://api.openai.com/v1/chat/completions',
+            headers=headers,
+            json=payload,
+            timeout=8
+        )
+        latency = time.time() - request_start
+    except requests.exceptions.Timeout:
+        print(f"❌ OpenAI API timeout (8 seconds)")
+        raise
+    except requests.exceptions.RequestException as req_err:
+        print(f"❌ OpenAI API request error: {req_err}")
+        raise
+    
+    if response.status_code != 200:
+        error_msg = response.text
+        print(f"❌ OpenAI API error: {response.status_code} - {error_msg}")
+        print(f"❌ Full error response: {error_msg}")
+        # Don't raise exception, return a helpful message instead
+        if response.status_code == 401:
+            raise ChatResponseError("OpenAI API key error. Please check your API key configuration.")
+        elif response.status_code == 429:
+            raise ChatResponseError("Rate limit exceeded. Please try again in a moment.")
+        else:
+            raise Exception(f"OpenAI API returned status {response.status_code}: {error_msg}")
+    
+    result = response.json()
+    print(f"✅ OpenAI API response received")
+    _record_prompt_cache(result.get("usage") or {}, latency)
+    
+    # Check if response has choices
+    if 'choices' not in result or len(result['choices']) == 0:
+        print(f"❌ No choices in OpenAI response: {result}")
+        raise ChatResponseError("I'm sorry, I couldn't generate a response. Please try again.")
+    
+    answer = result['choices'][0]['message']['content'].strip()
+    print(f"📝 Extracted answer: {repr(answer[:100])}... (length: {len(answer)})")
+    
+    # Post-process to remove any formatting that might have slipped through
+    answer = clean_response_formatting(answer)
+    
+    if not answer or len(answer.strip()) == 0:
+        print("⚠️ WARNING: Empty answer_text from OpenAI response")
+        raise ChatResponseError("I'm sorry, I couldn't generate a response. Please try rephrasing your question.")
+    
+    return answer
+
+
+def _chat_gemini(messages: list) -> str:
+    """The analyze() conversation answered by Gemini (hedge provider); returns the cleaned answer."""
+    _acquire_budget("gemini", estimate_message_tokens(messages) + 200)
+    system_text = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+    turns = "\n".join(
+        f"{'User' if m['role'] == 'user' else 'Assistant'}: {m['content']}"
+        for m in messages if m["role"] != "system"
+    )
+    response = gemini_client.generate_content(f"{system_text}\n\nConversation:\n{turns}\nAssistant:")
+    answer = clean_response_formatting(response.text.strip())
+    if not answer:
+        raise ChatResponseError("I'm sorry, I couldn't generate a response. Please try rephrasing your question.")
+    return answer
+
+
+def analyze(question: str, language: str = "en", user_id: str = "default", available_products: list = None) -> str:
+    if not question or len(question.strip()) < 2:
+        # Return empty string instead of error message
+        return ""
+
+    try:
+        # Determine response language
+        response_lang = "Russian" if language == "ru" else "English"
         
-        if dataset_context:
-            system_prompt += f"\n\nUse the following knowledge base for reference:\n{dataset_context}"
+        # Conversation context for this user: rolling summary of older turns plus the
+        # most recent exchanges, compacted in the background to stay within budget
+        history = conversation_memory.context_messages(user_id)
+        print(f"🧠 Conversation context: {len(history)} messages, ~{estimate_message_tokens(history)} tokens")
         
+        # Get relevant context from dataset if available
+        dataset_context = ""
+        if DATASET_AVAILABLE and dataset_manager:
+            dataset_context = dataset_manager.get_relevant_context(question, max_context_length=500)
+            if dataset_context:
+                print(f"📚 Found relevant context from dataset ({len(dataset_context)} chars)")
+        
+        # Get available products list for AI context, pruned to the products relevant
+        # to this question (original order kept, so verbal order still matches card order)
+        all_products = available_products or []
+        available_products_list = rank_products(all_products, question, history, top_k=PRODUCTS_TOP_K)
+        
+        # Build messages with history (shorter prompt for faster processing)
+        products_context = ""
+        if available_products_list:
+            products_context = _products_context(available_products_list)
+            if len(available_products_list) < len(all_products):
+                print(f"🧴 Products in prompt: {len(available_products_list)}/{len(all_products)}, "
+                      f"~{estimate_tokens(_products_context(all_products))} → ~{estimate_tokens(products_context)} tokens")
+        
+        # Static rules first, then the conversation, then the per-turn products / knowledge
+        # base: the provider can reuse its cached prefix (rules + earlier turns) across calls
         messages = [
             {
                 "role": "system",
-                "content": system_prompt
+                "content": STATIC_SYSTEM_PROMPT
             }
         ]
         
         # Add conversation history
         messages.extend(history)
         
+        dynamic_context = products_context
+        if dataset_context:
+            dynamic_context += f"\n\nUse the following knowledge base for reference:\n{dataset_context}"
+        if dynamic_context:
+            messages.append({
+                "role": "system",
+                "content": dynamic_context.strip()
+            })
+        
         # Add current question
         messages.append({
             "role": "user",
@@ -228,7 +526,7 @@ SYSTEM RULES:
             return error_msg
         
         # Use ChatGPT to generate intelligent responses via direct HTTP (avoids library version issues)
-        print(f"🤖 Calling OpenAI API with {len(messages)} messages, max_tokens=200")
+        print(f"🤖 Calling OpenAI API with {len(messages)} messages (~{estimate_message_tokens(messages)} prompt tokens), max_tokens=200")
         print(f"🔑 API key present: {openai_key[:7]}...{openai_key[-4:] if len(openai_key) > 11 else 'N/A'}")
         
         headers = {
@@ -243,53 +541,34 @@ SYSTEM RULES:
         }
         
         try:
-            response = requests.post(
-                'https://api.openai.com/v1/chat/completions',
-                headers=headers,
-                json=payload,
-                timeout=8
-            )
-        except requests.exceptions.Timeout:
-            print(f"❌ OpenAI API timeout (8 seconds)")
-            raise
-        except requests.exceptions.RequestException as req_err:
-            print(f"❌ OpenAI API request error: {req_err}")
-            raise
-        
-        if response.status_code != 200:
-            error_msg = response.text
-            print(f"❌ OpenAI API error: {response.status_code} - {error_msg}")
-            print(f"❌ Full error response: {error_msg}")
-            # Don't raise exception, return a helpful message instead
-            if response.status_code == 401:
-                return "OpenAI API key error. Please check your API key configuration."
-            elif response.status_code == 429:
-                return "Rate limit exceeded. Please try again in a moment."
-            else:
-                raise Exception(f"OpenAI API returned status {response.status_code}: {error_msg}")
-        
-        result = response.json()
-        print(f"✅ OpenAI API response received")
-        
-        # Check if response has choices
-        if 'choices' not in result or len(result['choices']) == 0:
-            print(f"❌ No choices in OpenAI response: {result}")
-            return "I'm sorry, I couldn't generate a response. Please try again."
-        
-        answer = result['choices'][0]['message']['content'].strip()
-        print(f"📝 Extracted answer: {repr(answer[:100])}... (length: {len(answer)})")
-        
-        # Post-process to remove any formatting that might have slipped through
-        answer = clean_response_formatting(answer)
-        
-        if not answer or len(answer.strip()) == 0:
-            print("⚠️ WARNING: Empty answer_text from OpenAI response")
-            return "I'm sorry, I couldn't generate a response. Please try rephrasing your question."
+            # Traced under the voice utterance id when the request carries one
+            with voice_trace.span("llm", model=payload["model"], messages=len(messages)):
+                if CHAT_HEDGE and GEMINI_AVAILABLE and gemini_client:
+                    # Same conversation to Gemini once OpenAI runs past its latency percentile;
+                    # the first valid answer wins
+                    openai_errors = []
+
+                    def chat_openai():
+                        try:
+                            return _chat_openai(headers, payload)
+                        except Exception as e:
+                            openai_errors.append(e)
+                            raise
+
+                    try:
+                        answer = chat_router.run({"openai": chat_openai, "gemini": lambda: _chat_gemini(messages)})
+                    except Exception:
+                        # Both failed: report OpenAI's error (and its user-facing message), not the hedge's
+                        if openai_errors:
+                            raise openai_errors[0] from None
+                        raise
+                else:
+                    answer = _chat_openai(headers, payload)
+        except ChatResponseError as response_error:
+            return response_error.user_message
         
         # Update conversation history
-        history.append({"role": "user", "content": question})
-        history.append({"role": "assistant", "content": answer})
-        conversation_history[user_id] = history
+        conversation_memory.append(user_id, question, answer)
         
         return answer
         
@@ -341,19 +620,12 @@ def analyze_skin(image_bytes: bytes, language: str = "en") -> dict:
         return {"error": str(e)}
 
 
-def analyze_face(image_base64: str, language: str = "en") -> str:
-    """Analyze face image for skin problems using AI (dermatology analysis)"""
-    if not image_base64:
-        # Return empty string instead of error message
-        return ""
+def _analyze_face_gemini(prepared: PreparedImage, language: str = "en", limiters: dict = None) -> str:
+    """Dermatology analysis with Google Gemini. Raises on any provider error."""
+    print("🔬 Using Google Gemini for dermatology analysis (primary)...")
+    response_lang = "Russian" if language == "ru" else "English"
     
-    # Try Gemini FIRST (less restrictive, better for medical images)
-    if GEMINI_AVAILABLE and gemini_client:
-        try:
-            print("🔬 Using Google Gemini for dermatology analysis (primary)...")
-            response_lang = "Russian" if language == "ru" else "English"
-            
-            prompt_ru = """Ты профессиональный дерматолог на приеме пациента. Пациент пришел к тебе на консультацию по состоянию кожи.
+    prompt_ru = """Ты профессиональный дерматолог на приеме пациента. Пациент пришел к тебе на консультацию по состоянию кожи.
 
 КРИТИЧЕСКИ ВАЖНО: 
 - Ты НЕ идентифицируешь личность. Ты НЕ определяешь, кто это человек.
@@ -375,8 +647,8 @@ def analyze_face(image_base64: str, language: str = "en") -> str:
 10. ОБЩЕЕ СОСТОЯНИЕ: общая оценка здоровья кожи
 
 Дай профессиональную дерматологическую оценку, как на приеме у врача. Предложи конкретные рекомендации по уходу и продуктам."""
-            
-            prompt_en = """You are a professional dermatologist during a patient consultation. The patient came to you for a skin condition consultation.
+    
+    prompt_en = """You are a professional dermatologist during a patient consultation. The patient came to you for a skin condition consultation.
 
 CRITICALLY IMPORTANT:
 - You are NOT identifying the person. You are NOT determining who this person is.
@@ -398,40 +670,28 @@ Analyze the skin image and describe in detail:
 10. OVERALL CONDITION: general skin health assessment
 
 Provide professional dermatological assessment, as during a doctor's appointment. Give specific skincare and product recommendations."""
-            
-            # Clean base64
-            clean_base64 = image_base64
-            if "," in clean_base64:
-                clean_base64 = clean_base64.split(",")[1]
-            
-            # Convert base64 to image data
-            image_data = base64.b64decode(clean_base64)
-            
-            # Create image for Gemini
-            import PIL.Image
-            import io
-            image = PIL.Image.open(io.BytesIO(image_data))
-            
-            # Generate with Gemini
-            prompt_text = prompt_ru if language == "ru" else prompt_en
-            response = gemini_client.generate_content([prompt_text, image])
-            
-            answer = response.text.strip()
-            print(f"✅ Gemini analysis successful: {len(answer)} characters")
-            return answer
-            
-        except Exception as gemini_error:
-            print(f"❌ Gemini error: {gemini_error}")
-            import traceback
-            traceback.print_exc()
-            print("🔄 Falling back to GPT-4o...")
-    
-    # Fallback to GPT-4o if Gemini not available
-    try:
-        print("🔬 Using GPT-4o for dermatology analysis...")
-        response_lang = "Russian" if language == "ru" else "English"
-        
-        prompt_ru = """Ты профессиональный дерматолог, анализирующий медицинское изображение кожи для клинической оценки.
+    
+    # Image decoded once per request and resized to Gemini's single-tile geometry
+    image = prepared.pil_for("gemini")
+    if image is None:
+        raise RuntimeError("Pillow is required for Gemini analysis")
+    
+    # Generate with Gemini
+    prompt_text = prompt_ru if language == "ru" else prompt_en
+    _acquire_budget("gemini", FACE_TOKENS_ESTIMATE, limiters)
+    response = gemini_client.generate_content([prompt_text, image])
+    
+    answer = response.text.strip()
+    print(f"✅ Gemini analysis successful: {len(answer)} characters")
+    return answer
+
+
+def _analyze_face_gpt4o(image_base64: str, language: str = "en", limiters: dict = None) -> str:
+    """Dermatology analysis with GPT-4o, retrying once on a refusal. Raises on any provider error."""
+    print("🔬 Using GPT-4o for dermatology analysis...")
+    response_lang = "Russian" if language == "ru" else "English"
+    
+    prompt_ru = """Ты профессиональный дерматолог, анализирующий медицинское изображение кожи для клинической оценки.
 
 ВАЖНО: Это медицинский анализ состояния кожи, НЕ распознавание личности. Ты анализируешь биологическую ткань (кожу), как врач-дерматолог на приеме.
 
@@ -448,8 +708,8 @@ Provide professional dermatological assessment, as during a doctor's appointment
 10. ОБЩЕЕ СОСТОЯНИЕ: общая оценка здоровья кожи
 
 Дай профессиональную дерматологическую оценку. Это медицинская консультация, не идентификация личности."""
-        
-        prompt_en = """You are a professional dermatologist analyzing a medical skin image for clinical assessment.
+    
+    prompt_en = """You are a professional dermatologist analyzing a medical skin image for clinical assessment.
 
 IMPORTANT: This is medical skin condition analysis, NOT identity recognition. You are analyzing biological tissue (skin), like a dermatologist during a medical consultation.
 
@@ -467,12 +727,30 @@ Analyze the image and describe in detail:
 
 Provide professional dermatological assessment. This is medical consultation, not identity identification.
 """       
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"""You are a professional dermatologist AI assistant providing skincare consultations. Your job is to analyze skin condition from images for clinical assessment.
+    if GPT4O_SPECULATIVE_RETRY:
+        return _gpt4o_speculative(image_base64, language, prompt_ru, prompt_en, limiters)
+    
+    response = _gpt4o_main_call(image_base64, language, prompt_ru, prompt_en, limiters)
+    answer = response.choices[0].message.content.strip()
+    
+    # Check if GPT refused - if so, force analysis with stronger prompt
+    if _is_refusal(answer):
+        print("⚠️ GPT refused, retrying with stronger prompt...")
+        retry_response = _gpt4o_retry_call(image_base64, language, limiters)
+        answer = retry_response.choices[0].message.content.strip()
+    
+    return answer
+
+
+def _gpt4o_main_call(image_base64: str, language: str, prompt_ru: str, prompt_en: str, limiters: dict = None):
+    """Main GPT-4o dermatology prompt with the full image."""
+    _acquire_budget("gpt-4o", FACE_TOKENS_ESTIMATE, limiters)
+    return client.chat.completions.create(
+        model="gpt-4o",
+        messages=[
+            {
+                "role": "system",
+                "content": f"""You are a professional dermatologist AI assistant providing skincare consultations. Your job is to analyze skin condition from images for clinical assessment.
 
 CRITICAL INSTRUCTIONS:
 - You MUST analyze the skin image. This is a MEDICAL SKIN ANALYSIS, not identity recognition.
@@ -486,66 +764,237 @@ SYSTEM RULES:
 - If input is not English, still respond in English.
 - Do not output any other language.
 - Always respond in English."""
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt_ru if language == "ru" else prompt_en
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}",
-                                "detail": "high"  # High detail for better skin analysis
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=600,  # Increased for more detailed analysis
-            temperature=0.3  # Lower temperature for more consistent medical analysis
-        )
-        
-        answer = response.choices[0].message.content.strip()
-        
-        # Check if GPT refused - if so, force analysis with stronger prompt
-        refusal_keywords = ["can't", "cannot", "sorry", "не могу", "извините", "не могу помочь", "cannot help", "dermatologist", "к дерматологу"]
-        if any(keyword in answer.lower() for keyword in refusal_keywords) and ("анализ" not in answer.lower() and "analysis" not in answer.lower()):
-            print("⚠️ GPT refused, retrying with stronger prompt...")
-            # Retry with even stronger prompt
-            retry_prompt_ru = "Проанализируй это изображение кожи. Опиши: количество прыщей, тип кожи, сухость, жирность, поры, черные точки, воспаления, текстуру, пигментацию. Дай конкретные рекомендации по уходу и продуктам."
-            retry_prompt_en = "Analyze this skin image. Describe: acne count, skin type, dryness, oiliness, pores, blackheads, inflammation, texture, pigmentation. Give specific skincare and product recommendations."
-            
-            retry_response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
+            },
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": prompt_ru if language == "ru" else prompt_en
+                    },
                     {
-                        "role": "system",
-                        "content": f"""You are a dermatology AI. You MUST analyze skin images. This is medical skin tissue analysis, not identity recognition. Always provide detailed skin analysis.
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{image_base64}",
+                            "detail": "high"  # High detail for better skin analysis
+                        }
+                    }
+                ]
+            }
+        ],
+        max_tokens=600,  # Increased for more detailed analysis
+        temperature=0.3  # Lower temperature for more consistent medical analysis
+    )
+
+
+def _gpt4o_retry_call(image_base64: str, language: str, limiters: dict = None):
+    """Short, stronger GPT-4o prompt used when the main prompt is refused."""
+    retry_prompt_ru = "Проанализируй это изображение кожи. Опиши: количество прыщей, тип кожи, сухость, жирность, поры, черные точки, воспаления, текстуру, пигментацию. Дай конкретные рекомендации по уходу и продуктам."
+    retry_prompt_en = "Analyze this skin image. Describe: acne count, skin type, dryness, oiliness, pores, blackheads, inflammation, texture, pigmentation. Give specific skincare and product recommendations."
+    
+    _acquire_budget("gpt-4o", FACE_TOKENS_ESTIMATE, limiters)
+    return client.chat.completions.create(
+        model="gpt-4o",
+        messages=[
+            {
+                "role": "system",
+                "content": f"""You are a dermatology AI. You MUST analyze skin images. This is medical skin tissue analysis, not identity recognition. Always provide detailed skin analysis.
 
 SYSTEM RULES:
 - Language: English ONLY.
 - If input is not English, still respond in English.
 - Do not output any other language.
 - Always respond in English."""
-                    },
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": retry_prompt_ru if language == "ru" else retry_prompt_en},
-                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}", "detail": "high"}}
-                        ]
-                    }
-                ],
-                max_tokens=600,
-                temperature=0.3
-            )
-            answer = retry_response.choices[0].message.content.strip()
-        
-        return answer
-        
+            },
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": retry_prompt_ru if language == "ru" else retry_prompt_en},
+                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}", "detail": "high"}}
+                ]
+            }
+        ],
+        max_tokens=600,
+        temperature=0.3
+    )
+
+
+def _is_refusal(answer: str) -> bool:
+    """Heuristic: GPT-4o declined to analyze instead of describing the skin."""
+    refusal_keywords = ["can't", "cannot", "sorry", "не могу", "извините", "не могу помочь", "cannot help", "dermatologist", "к дерматологу"]
+    return any(keyword in answer.lower() for keyword in refusal_keywords) and ("анализ" not in answer.lower() and "analysis" not in answer.lower())
+
+
+def _record_speculative_usage(key: str, response):
+    """Add a speculative retry response's token usage to speculative_retry_stats[key]."""
+    usage = getattr(response, "usage", None)
+    if not usage:
+        return
+    with _speculative_lock:
+        speculative_retry_stats[key] += (usage.prompt_tokens or 0) + (usage.completion_tokens or 0)
+
+
+def _speculative_delay() -> float:
+    """How long the main prompt may run before the retry is sent alongside it."""
+    with _speculative_lock:
+        samples = sorted(_speculative_main_latencies)
+    if len(samples) < 5:
+        return GPT4O_SPECULATIVE_DELAY
+    return min(GPT4O_SPECULATIVE_DELAY, samples[min(len(samples) - 1, int(round(0.9 * (len(samples) - 1))))])
+
+
+def _record_main_latency(start: float):
+    def record(future):
+        if future.exception() is None:
+            with _speculative_lock:
+                _speculative_main_latencies.append(time.time() - start)
+    return record
+
+
+def _drop_speculative(future):
+    """Drop the losing request: cancel it if not started, else ignore its result."""
+    if not future.cancel():
+        future.add_done_callback(
+            lambda f: f.exception() is None and _record_speculative_usage("wasted_tokens", f.result())
+        )
+
+
+def _gpt4o_speculative(image_base64: str, language: str, prompt_ru: str, prompt_en: str,
+                       limiters: dict = None) -> str:
+    """
+    Run the main prompt and, if it is slower than usual, the short retry prompt
+    next to it; the first usable answer wins.
+    
+    The retry is sent once the main call passes _speculative_delay(), or as soon
+    as the main prompt is refused or fails, so a normal answer costs one vision
+    call. A refusal from the main prompt is not usable; the retry's answer always is.
+    """
+    main_future = _speculative_executor.submit(_gpt4o_main_call, image_base64, language, prompt_ru, prompt_en,
+                                               limiters)
+    main_future.add_done_callback(_record_main_latency(time.time()))
+    futures = {main_future: "main"}
+    with _speculative_lock:
+        speculative_retry_stats["calls"] += 1
+    
+    def send_retry():
+        retry_future = _speculative_executor.submit(_gpt4o_retry_call, image_base64, language, limiters)
+        futures[retry_future] = "retry"
+        return retry_future
+    
+    try:
+        done, _ = wait([main_future], timeout=_speculative_delay())
+        pending = set(futures)
+        if not done:
+            pending.add(send_retry())
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind = futures[future]
+                try:
+                    response = future.result()
+                    answer = response.choices[0].message.content.strip()
+                except Exception as e:
+                    print(f"⚠️ GPT-4o {kind} prompt failed: {e}")
+                    last_error = e
+                    answer = None
+                if kind == "main" and (answer is None or _is_refusal(answer)):
+                    if "retry" not in futures.values():
+                        print("⚠️ GPT refused, retrying with stronger prompt...")
+                        pending.add(send_retry())
+                    continue
+                if answer is None:
+                    continue
+                
+                for loser in pending:
+                    _drop_speculative(loser)
+                with _speculative_lock:
+                    if kind == "retry":
+                        speculative_retry_stats["used"] += 1
+                    elif len(futures) > 1:
+                        speculative_retry_stats["discarded"] += 1
+                    else:
+                        speculative_retry_stats["skipped"] += 1
+                if kind == "retry":
+                    _record_speculative_usage("used_tokens", response)
+                return answer
+        raise last_error
+    finally:
+        if GPT4O_SPECULATIVE_DEBUG:
+            print(f"📊 GPT-4o speculative retry stats: {speculative_retry_stats}")
+
+
+def _face_prompt_version() -> str:
+    """Version of the analyze_face prompts/models; any prompt edit changes it."""
+    global _face_prompt_version_value
+    if _face_prompt_version_value is None:
+        _face_prompt_version_value = prompt_version(
+            _analyze_face_gemini, _analyze_face_gpt4o, _gpt4o_main_call, _gpt4o_retry_call,
+            extra=f"gemini-tile={GEMINI_TILE};openai-short-side={OPENAI_SHORT_SIDE}",
+        )
+    return _face_prompt_version_value
+
+
+def _call_provider(name: str, fn):
+    """Run one provider call, counting calls and provider-side 429 rejections."""
+    with _provider_stats_lock:
+        stats = provider_call_stats.setdefault(name, {"calls": 0, "rejected": 0, "throttled": 0})
+        stats["calls"] += 1
+    try:
+        return fn()
+    except RateLimitExceeded:
+        with _provider_stats_lock:
+            provider_call_stats[name]["throttled"] += 1
+        raise
+    except Exception as e:
+        if "429" in str(e) or "rate limit" in str(e).lower():
+            with _provider_stats_lock:
+                provider_call_stats[name]["rejected"] += 1
+        raise
+
+
+def analyze_face_result(image_base64: str, language: str = "en", limiters: dict = None) -> dict:
+    """
+    Analyze a face image and return {"analysis", "cached", "provider"}.
+    
+    Unlike analyze_face, provider failures raise instead of being turned into
+    a user-facing message. `limiters` (name -> SharedRateLimiter) replaces
+    provider_limiters for this call's provider requests.
+    """
+    prepared = prepare_vision_image(image_base64)
+    
+    cache_key = AnalysisCache.make_key(prepared.raw, language, _face_prompt_version())
+    start = time.time()
+    entry = face_cache.get(cache_key)
+    if entry is not None:
+        print(f"⚡ analyze_face cache hit ({entry.get('provider')}, {(time.time() - start) * 1000:.1f} ms)")
+        return {"analysis": entry["result"], "cached": True, "provider": entry.get("provider")}
+    
+    # Gemini is preferred (less restrictive, better for medical images) until the
+    # router has latency/error data; after that the fastest healthy provider goes first
+    providers = {}
+    if GEMINI_AVAILABLE and gemini_client:
+        providers["gemini"] = lambda: _call_provider(
+            "gemini", lambda: _analyze_face_gemini(prepared, language, limiters))
+    providers["gpt-4o"] = lambda: _call_provider(
+        "gpt-4o", lambda: _analyze_face_gpt4o(prepared.base64_for("openai"), language, limiters))
+    
+    answer = face_router.run(providers)
+    provider = face_router.last_record()["winner"]
+    # A refusal that survived the retry is returned but not cached (the disk tier would keep it)
+    if answer and not _is_refusal(answer):
+        face_cache.put(cache_key, answer, provider=provider)
+    return {"analysis": answer, "cached": False, "provider": provider}
+
+
+def analyze_face(image_base64: str, language: str = "en") -> str:
+    """Analyze face image for skin problems using AI (dermatology analysis)"""
+    if not image_base64:
+        # Return empty string instead of error message
+        return ""
+    
+    try:
+        return analyze_face_result(image_base64, language=language)["analysis"]
     except Exception as e:
         print(f"❌ Face analysis error: {e}")
         import traceback
@@ -555,17 +1004,126 @@ SYSTEM RULES:
         return "Skin analysis error. Please ensure OpenAI API key is configured (OPENAI_API_KEY in .env file)."
 
 
-def generate_voice(text: str, language: str = "en", voice: str = "alloy") -> str:
+def _structured_prompt(language: str) -> str:
+    summary_lang = "Russian" if language == "ru" else "English"
+    return f"""You are a professional dermatologist assessing skin condition from a photo for a clinical skincare consultation. This is skin tissue analysis, not identity recognition.
+
+Return ONLY a JSON object matching this schema (no prose, no markdown):
+{json.dumps(SKIN_METRICS_SCHEMA, ensure_ascii=False)}
+
+Scores are 0-100 severity (0 = none, 100 = severe). acne_count and blackhead_count are visible lesion counts.
+barrier_ok is false when there are signs of a damaged barrier (flaking, irritation, raw or very red areas).
+regions lists only areas with visible concerns. summary is one or two sentences in {summary_lang}."""
+
+
+def _structured_gemini(prepared: PreparedImage, language: str) -> SkinMetrics:
+    """Structured skin metrics from Gemini (JSON response mode)."""
+    image = prepared.pil_for("gemini")
+    if image is None:
+        raise RuntimeError("Pillow is required for Gemini analysis")
+    _acquire_budget("gemini", FACE_TOKENS_ESTIMATE)
+    response = gemini_client.generate_content(
+        [_structured_prompt(language), image],
+        generation_config={"response_mime_type": "application/json", "temperature": 0.2},
+    )
+    return parse_skin_metrics(response.text)
+
+
+def _structured_gpt4o(image_base64: str, language: str) -> SkinMetrics:
+    """Structured skin metrics from GPT-4o (strict json_schema response format)."""
+    _acquire_budget("gpt-4o", FACE_TOKENS_ESTIMATE)
+    response = client.chat.completions.create(
+        model="gpt-4o",
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": _structured_prompt(language)},
+                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}", "detail": "high"}}
+                ]
+            }
+        ],
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "skin_metrics", "strict": True, "schema": SKIN_METRICS_SCHEMA},
+        },
+        max_tokens=500,
+        temperature=0.2
+    )
+    return parse_skin_metrics(response.choices[0].message.content)
+
+
+def analyze_face_structured(image_base64: str, language: str = "en") -> SkinMetrics:
+    """
+    Analyze a face image into fixed, typed skin metrics (see skin_schema).
+    
+    Goes through the same router, rate limits and result cache as analyze_face.
+    Raises on provider failure or when no provider returns valid metrics.
+    """
+    global _structured_prompt_version_value
+    if _structured_prompt_version_value is None:
+        _structured_prompt_version_value = prompt_version(
+            _structured_prompt, _structured_gemini, _structured_gpt4o,
+            extra=json.dumps(SKIN_METRICS_SCHEMA, sort_keys=True),
+        )
+    
+    prepared = prepare_vision_image(image_base64)
+    cache_key = AnalysisCache.make_key(prepared.raw, language, _structured_prompt_version_value)
+    entry = face_cache.get(cache_key)
+    if entry is not None:
+        print(f"⚡ analyze_face_structured cache hit ({entry.get('provider')})")
+        return SkinMetrics.from_dict(entry["result"])
+    
+    providers = {}
+    if GEMINI_AVAILABLE and gemini_client:
+        providers["gemini"] = lambda: _call_provider("gemini", lambda: _structured_gemini(prepared, language))
+    providers["gpt-4o"] = lambda: _call_provider("gpt-4o", lambda: _structured_gpt4o(prepared.base64_for("openai"), language))
+    
+    metrics = face_router.run(providers)
+    if not _is_refusal(metrics.summary):
+        face_cache.put(cache_key, metrics.as_dict(), provider=face_router.last_record()["winner"])
+    return metrics
+
+
+def generate_voice(text: str, language: str = "en", voice: str = "alloy", profile: str = None) -> str:
+    """URL of the clip for text; traced as the "tts" span of the current voice utterance."""
+    with voice_trace.span("tts", chars=len(text or ""), profile=get_profile(profile).name) as attrs:
+        audio_url = _generate_voice(text, language, voice, profile)
+        attrs["ok"] = audio_url is not None
+    return audio_url
+
+
+def _generate_voice(text: str, language: str = "en", voice: str = "alloy", profile: str = None) -> str:
    
     if not text or len(text.strip()) < 2:
         print("⚠️ TTS: Text too short or empty")
         return None
     
+    voice = voice if voice else "alloy"
+    # Output format/bitrate (audio_profiles.PROFILES); each profile is cached separately
+    audio_profile = get_profile(profile)
+    banked_file = audio_bank.lookup(text, voice, TTS_MODEL, TTS_SPEED, audio_profile.cache_tag)
+    if banked_file:
+        print(f"⚡ TTS audio bank: /audio/{banked_file}")
+        voice_trace.annotate(source="bank")
+        return f"/audio/{banked_file}"
+    
     # Check if OpenAI client is initialized
     if not client:
         print("❌ TTS: OpenAI client not initialized")
         return None
     
+    cache_key = None
+    if tts_cache is not None:
+        cache_key = TTSCache.make_key(text, voice, TTS_MODEL, TTS_SPEED, audio_profile.cache_tag)
+        cached_file = tts_cache.get(cache_key)
+        if cached_file:
+            voice_trace.annotate(source="cache")
+            stats = tts_cache.snapshot()
+            print(f"⚡ TTS cache hit: /audio/{cached_file} (hit rate {stats['hit_rate'] * 100:.0f}%, "
+                  f"{stats['seconds_saved']}s of synthesis saved)")
+            return f"/audio/{cached_file}"
+    
     try:
         print(f"🔊 Generating ChatGPT voice (alloy) for text length: {len(text)}")
         print(f"🔊 Text preview: {text[:100]}...")
@@ -574,22 +1132,39 @@ def generate_voice(text: str, language: str = "en", voice: str = "alloy") -> str
         # Voice options: "alloy" (neutral, ChatGPT-like), "echo" (male), "fable" (British), 
         # ChatGPT uses "alloy" voice - neutral, natural, conversational
         # This is the exact voice used in ChatGPT
+        if not provider_limiters["tts-1-hd"].acquire(timeout=RATE_LIMIT_MAX_WAIT):
+            print("❌ TTS: Rate limit exceeded (client-side)")
+            return None
+        
+        synthesis_start = time.time()
         response = client.audio.speech.create(
-            model="tts-1-hd",  # Highest quality (same as ChatGPT)
-            voice=voice if voice else "alloy",  # ChatGPT voice (neutral, natural)
+            model=TTS_MODEL,  # Highest quality (same as ChatGPT)
+            voice=voice,  # ChatGPT voice (neutral, natural)
             input=text,
-            speed=1.0  # Natural ChatGPT pace (exactly like ChatGPT)
+            speed=TTS_SPEED,  # Natural ChatGPT pace (exactly like ChatGPT)
+            response_format=audio_profile.response_format
         )
+        audio_bytes = transcode(response.content, audio_profile)
+        synthesis_seconds = time.time() - synthesis_start
+        voice_trace.annotate(source="synthesized", bytes=len(audio_bytes))
+        
+        print(f"✅ TTS response received, size: {len(audio_bytes)} bytes "
+              f"({audio_profile.name}, {synthesis_seconds:.2f}s)")
         
-        print(f"✅ TTS response received, size: {len(response.content)} bytes")
+        if tts_cache is not None:
+            try:
+                filename = tts_cache.put(cache_key, audio_bytes, seconds=synthesis_seconds,
+                                         extension=audio_profile.extension)
+                audio_url = f"/audio/{filename}"
+                print(f"✅ TTS audio cached: {audio_url}")
+                return audio_url
+            except OSError as cache_error:
+                print(f"⚠️ TTS cache write failed, writing an uncached file: {cache_error}")
         
-        # Save to temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3", dir=tempfile.gettempdir())
-        temp_file.write(response.content)
-        temp_file.close()
+        # Uncached clip: still written through the store so the sweeper reclaims it
+        filename = audio_store.write(audio_store.new_filename(audio_profile.extension), audio_bytes)
         
         # Return the filename (will be served via /audio/<filename> endpoint)
-        filename = os.path.basename(temp_file.name)
         audio_url = f"/audio/{filename}"
         print(f"✅ TTS audio saved: {audio_url}")
         return audio_url
@@ -608,4 +1183,205 @@ def generate_voice(text: str, language: str = "en", voice: str = "alloy") -> str
         
         import traceback
         traceback.print_exc()
-        return None
\ No newline at end of file
+        return None
+
+
+def transcribe_stream(audio, filename: str = "voice.webm", content_type: str = "audio/webm",
+                      language: str = None) -> str:
+    """
+    Transcript of an audio file object that may still be arriving (see
+    audio_ingest.ChunkPipe): the request body is read from it chunk by chunk.
+    """
+    if not client:
+        raise RuntimeError("OpenAI client not initialized")
+    kwargs = {"model": TRANSCRIBE_MODEL, "file": (filename, audio, content_type)}
+    if language:
+        kwargs["language"] = language
+    with voice_trace.span("transcription", model=TRANSCRIBE_MODEL) as attrs:
+        # No retries: a body streamed from the upload can't be replayed
+        result = client.with_options(max_retries=0).audio.transcriptions.create(**kwargs)
+        attrs["bytes"] = getattr(audio, "bytes_written", None)
+    return (result.text or "").strip()
+
+
+def _record_tts_ttfb(seconds: float):
+    with _tts_stream_lock:
+        samples = tts_stream_stats["ttfb"]
+        samples.append(round(seconds, 4))
+        # Keep a bounded window for percentiles
+        del samples[:-200]
+
+
+def tts_stream_snapshot() -> dict:
+    """Stream counters plus p50/p95 time-to-first-audio-byte over recent streams."""
+    with _tts_stream_lock:
+        samples = sorted(tts_stream_stats["ttfb"])
+        snapshot = {k: v for k, v in tts_stream_stats.items() if k != "ttfb"}
+
+    def percentile(q):
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))]
+
+    snapshot.update(ttfb_p50=percentile(50), ttfb_p95=percentile(95), ttfb_samples=len(samples))
+    if tts_cache is not None:
+        snapshot["cache"] = tts_cache.snapshot()
+    snapshot["profiles"] = profile_snapshot()
+    return snapshot
+
+
+def stream_voice(text: str, language: str = "en", voice: str = "alloy", profile: str = None):
+    """
+    Generator of mp3 bytes for text, relayed chunk by chunk as the TTS API
+    produces them, so playback can start before synthesis finishes. Cached
+    clips are read from disk; new clips are cached in the background once
+    complete (TTS_STREAM_PERSIST=0 turns that off). The stream carries the
+    provider's native encoding in the profile's format; the cached copy is
+    re-encoded to the profile bitrate. Yields nothing when synthesis fails
+    before the first chunk, and raises when it fails after.
+    """
+    if not text or len(text.strip()) < 2:
+        print("⚠️ TTS: Text too short or empty")
+        return
+    
+    voice = voice if voice else "alloy"
+    start = time.time()
+    with _tts_stream_lock:
+        tts_stream_stats["streams"] += 1
+    
+    audio_profile = get_profile(profile)
+    stored_path = None
+    banked_file = audio_bank.lookup(text, voice, TTS_MODEL, TTS_SPEED, audio_profile.cache_tag)
+    if banked_file:
+        stored_path = os.path.join(audio_bank.directory, banked_file)
+    
+    cache_key = None
+    if stored_path is None and tts_cache is not None:
+        cache_key = TTSCache.make_key(text, voice, TTS_MODEL, TTS_SPEED, audio_profile.cache_tag)
+        cached_file = tts_cache.get(cache_key)
+        if cached_file:
+            stored_path = os.path.join(tts_cache.directory, cached_file)
+    
+    if stored_path is not None:
+        with _tts_stream_lock:
+            tts_stream_stats["cache_hits"] += 1
+        with open(stored_path, "rb") as f:
+            first = True
+            for chunk in iter(lambda: f.read(TTS_STREAM_CHUNK), b""):
+                if first:
+                    _record_tts_ttfb(time.time() - start)
+                    first = False
+                yield chunk
+        return
+    
+    if not client:
+        print("❌ TTS: OpenAI client not initialized")
+        return
+    
+    if not provider_limiters["tts-1-hd"].acquire(timeout=RATE_LIMIT_MAX_WAIT):
+        print("❌ TTS: Rate limit exceeded (client-side)")
+        return
+    
+    chunks = []
+    try:
+        print(f"🔊 Streaming ChatGPT voice ({voice}) for text length: {len(text)}")
+        with client.audio.speech.with_streaming_response.create(
+            model=TTS_MODEL,
+            voice=voice,
+            input=text,
+            speed=TTS_SPEED,
+            response_format=audio_profile.response_format
+        ) as response:
+            for chunk in response.iter_bytes(TTS_STREAM_CHUNK):
+                if not chunks:
+                    ttfb = time.time() - start
+                    _record_tts_ttfb(ttfb)
+                    print(f"⏱️ TTS first audio byte after {ttfb:.3f}s")
+                chunks.append(chunk)
+                yield chunk
+    except Exception as e:
+        with _tts_stream_lock:
+            tts_stream_stats["errors"] += 1
+        print(f"❌ TTS streaming error after {sum(len(c) for c in chunks)} bytes: {e}")
+        if chunks:
+            # Audio already went out: abort the chunked response rather than end it
+            # cleanly, so the client sees a broken transfer instead of a short clip
+            raise
+        return
+    
+    synthesis_seconds = time.time() - start
+    print(f"✅ TTS stream finished: {sum(len(c) for c in chunks)} bytes in {synthesis_seconds:.2f}s")
+    if tts_cache is not None and TTS_STREAM_PERSIST and chunks:
+        # The client already has the audio; the cache write happens off the response path
+        _tts_persist_executor.submit(_persist_streamed_voice, cache_key, b"".join(chunks), synthesis_seconds,
+                                     audio_profile)
+
+
+def _persist_streamed_voice(cache_key: str, data: bytes, seconds: float, audio_profile: AudioProfile):
+    try:
+        tts_cache.put(cache_key, transcode(data, audio_profile), seconds=seconds, extension=audio_profile.extension)
+    except OSError as e:
+        print(f"⚠️ TTS cache write failed for streamed audio: {e}")
+
+
+def audio_file_path(filename: str):
+    """Local path of a generated clip named in an /audio/<filename> URL, or None."""
+    filename = os.path.basename(filename)
+    directories = [audio_bank.directory, tts_cache.directory if tts_cache is not None else None, audio_store.directory]
+    for directory in filter(None, directories):
+        path = os.path.join(directory, filename)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def iter_voice_playlist(text: str, language: str = "en", voice: str = "alloy", profile: str = None):
+    """
+    Yield /audio/ URLs for the sentences of text in order. Segments are
+    synthesized in parallel (TTS_PIPELINE_WORKERS) and each URL is yielded as
+    soon as it and the ones before it are ready. Failed segments are skipped.
+    """
+    segments = split_sentences(text)
+    print(f"🔊 TTS pipeline: {len(segments)} segments, {TTS_PIPELINE_WORKERS} workers")
+    start = time.time()
+    # Pool threads don't inherit the trace context
+    utterance_id = voice_trace.current_utterance_id()
+
+    def synthesize(segment):
+        with voice_trace.trace_context(utterance_id):
+            return generate_voice(segment, language=language, voice=voice, profile=profile)
+
+    for index, segment, audio_url in synthesize_pipelined(segments, synthesize, max_workers=TTS_PIPELINE_WORKERS):
+        if index == 0:
+            print(f"⏱️ TTS pipeline first segment ready after {time.time() - start:.3f}s")
+        if audio_url:
+            yield audio_url
+        else:
+            print(f"⚠️ TTS pipeline: segment {index + 1} failed: {segment[:60]}")
+
+
+def generate_voice_playlist(text: str, language: str = "en", voice: str = "alloy", profile: str = None) -> list:
+    """Ordered list of /audio/ URLs, one per sentence segment of text."""
+    return list(iter_voice_playlist(text, language=language, voice=voice, profile=profile))
+
+
+def stream_voice_pipelined(text: str, language: str = "en", voice: str = "alloy", profile: str = None):
+    """
+    Generator of mp3 bytes for text: segment clips concatenated in order (mp3
+    frames play back seamlessly when joined), the first one sent as soon as it
+    is synthesized.
+    """
+    start = time.time()
+    with _tts_stream_lock:
+        tts_stream_stats["streams"] += 1
+    first = True
+    for audio_url in iter_voice_playlist(text, language=language, voice=voice, profile=profile):
+        path = audio_file_path(audio_url)
+        if path is None:
+            continue
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(TTS_STREAM_CHUNK), b""):
+                if first:
+                    _record_tts_ttfb(time.time() - start)
+                    first = False
+                yield chunk
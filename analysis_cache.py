@@ -0,0 +1,130 @@
+"""
+Result cache for vision analyses.
+
+Entries are keyed on the decoded image digest, the language and a prompt
+version. The prompt version is a hash of the string constants in the
+functions that build the provider requests, so editing a prompt invalidates
+every cached result automatically.
+
+A bounded in-memory LRU tier is always on. An on-disk tier (one JSON file per
+entry) is enabled by passing a directory, e.g. via ANALYSIS_CACHE_DIR.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def prompt_version(*functions, extra: str = "") -> str:
+    """Short hash over the string constants (prompts, model names) of functions."""
+    digest = hashlib.sha256(extra.encode("utf-8"))
+
+    def add_constants(code):
+        for const in code.co_consts:
+            if isinstance(const, str):
+                digest.update(const.encode("utf-8"))
+            elif hasattr(const, "co_consts"):
+                add_constants(const)
+
+    for fn in functions:
+        digest.update(fn.__name__.encode("utf-8"))
+        add_constants(fn.__code__)
+    return digest.hexdigest()[:16]
+
+
+class AnalysisCache:
+    """Two-tier (memory LRU + optional disk) cache of analysis results."""
+
+    def __init__(self, max_entries: int = 256, disk_dir: str = None, disk_max_entries: int = 5000):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_max_entries = disk_max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(image_bytes: bytes, language: str, version: str) -> str:
+        image_digest = hashlib.sha256(image_bytes).hexdigest()
+        return hashlib.sha256(f"{image_digest}:{language}:{version}".encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def get(self, key: str):
+        """Return the cached entry dict ({"result", "provider", "created"}) or None."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                entry = None
+            if entry is not None:
+                self._remember(key, entry)
+                with self._lock:
+                    self.stats["hits"] += 1
+                    self.stats["disk_hits"] += 1
+                return entry
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, result, provider: str = None):
+        entry = {"result": result, "provider": provider, "created": time.time()}
+        self._remember(key, entry)
+        with self._lock:
+            self.stats["stores"] += 1
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(entry, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+                self._trim_disk()
+            except OSError as e:
+                print(f"⚠️ Analysis cache disk write failed: {e}")
+
+    def _remember(self, key: str, entry: dict):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _trim_disk(self):
+        """Drop the oldest disk entries once the directory exceeds its budget."""
+        names = [n for n in os.listdir(self.disk_dir) if n.endswith(".json")]
+        if len(names) <= self.disk_max_entries:
+            return
+        paths = sorted((os.path.join(self.disk_dir, n) for n in names), key=os.path.getmtime)
+        for path in paths[:len(paths) - self.disk_max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def cache_from_env(prefix: str) -> AnalysisCache:
+    """Build a cache configured from <PREFIX>_SIZE / <PREFIX>_DIR / <PREFIX>_DISK_SIZE."""
+    try:
+        max_entries = int(os.getenv(f"{prefix}_SIZE", "256"))
+        disk_max_entries = int(os.getenv(f"{prefix}_DISK_SIZE", "5000"))
+    except ValueError:
+        max_entries, disk_max_entries = 256, 5000
+    disk_dir = os.getenv(f"{prefix}_DIR") or None
+    return AnalysisCache(max_entries=max_entries, disk_dir=disk_dir, disk_max_entries=disk_max_entries)
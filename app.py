@@ -1,12 +1,14 @@
 import os
 import base64
+import itertools
 import uuid
 import socket
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Dict, Optional, Tuple
 
 import requests
-from flask import Flask, request, jsonify, make_response, render_template
+from flask import Flask, Response, abort, request, jsonify, make_response, render_template, send_file, stream_with_context
 
 # =========================
 # Minimal .env loader
@@ -27,6 +29,11 @@ def load_dotenv():
 
 load_dotenv()
 
+import AI_Skin_Analysis as skin_ai
+from audio_profiles import CONTENT_TYPES, profile_for_extension, record_served, select_profile
+import voice_trace
+from audio_ingest import AudioUpload, UploadError, transcribe_upload
+
 # =========================
 # App
 # =========================
@@ -37,7 +44,7 @@ app = Flask(__name__, template_folder="templates", static_folder="static")
 def cors(resp):
     resp.headers["Access-Control-Allow-Origin"] = "*"
     resp.headers["Access-Control-Allow-Methods"] = "GET,POST,OPTIONS"
-    resp.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+    resp.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-Utterance-Id"
     return resp
 
 def options_204():
@@ -172,6 +179,181 @@ def youcam_alias():
         return options_204()
     return skin_analyze()
 
+# =========================
+# Voice
+# =========================
+
+def utterance_trace():
+    """Trace context for the voice utterance named in X-Utterance-Id (no-op without one)."""
+    return voice_trace.trace_context(request.headers.get(voice_trace.HEADER))
+
+# Transcription requests reading uploads while they arrive
+transcribe_executor = ThreadPoolExecutor(max_workers=int(os.getenv("TRANSCRIBE_WORKERS", "4")),
+                                         thread_name_prefix="transcribe")
+
+@app.route("/analyze-audio", methods=["POST", "OPTIONS"])
+def analyze_audio():
+    """
+    Voice question -> transcript + Runova's answer. The body (multipart "audio"
+    file or a raw audio/* body, chunked or not) is relayed to transcription as
+    it is received, never buffered whole.
+    """
+    if request.method == "OPTIONS":
+        return options_204()
+
+    utterance_id = request.headers.get(voice_trace.HEADER)
+    try:
+        upload = AudioUpload(request.stream, request.headers).open()
+        language = request.args.get("language") or upload.form().get("language")
+
+        def transcribe(audio, filename, content_type):
+            with voice_trace.trace_context(utterance_id):
+                return skin_ai.transcribe_stream(audio, filename, content_type, language=language)
+
+        with utterance_trace(), voice_trace.span("upload") as attrs:
+            text = transcribe_upload(upload, transcribe, transcribe_executor)
+            attrs["bytes"] = upload.bytes_read
+    except UploadError as e:
+        return jsonify({"ok": False, "error": str(e)}), e.status
+    except Exception as e:
+        print(f"❌ /analyze-audio transcription failed: {e}")
+        return jsonify({"ok": False, "error": "Transcription failed"}), 502
+
+    form = upload.form()
+    language = language or form.get("language") or "en"
+    print(f"🎙️ /analyze-audio: {upload.bytes_read / 1024:.0f} KB {upload.content_type} → {text[:80]!r}")
+    with utterance_trace():
+        answer = skin_ai.analyze(text, language=language, user_id=form.get("user_id") or "voice") if text else ""
+    return jsonify({"ok": True, "recognized_text": text, "reply": answer})
+
+# Request headers select_profile() reads; responses that depend on the profile vary on them
+PROFILE_VARY = "Save-Data, ECT, Downlink, Accept, User-Agent"
+
+def wants_audio_stream(body: Dict[str, Any]) -> bool:
+    if str(body.get("stream") or request.args.get("stream") or "").lower() in ("1", "true", "yes"):
+        return True
+    return "audio/" in (request.headers.get("Accept") or "")
+
+def counted(chunks, profile_name: str):
+    """Pass a byte stream through, recording its size against the profile."""
+    total = 0
+    try:
+        for chunk in chunks:
+            total += len(chunk)
+            yield chunk
+    finally:
+        record_served(profile_name, total)
+
+@app.route("/generate-audio", methods=["GET", "POST", "OPTIONS"])
+def generate_audio():
+    if request.method == "OPTIONS":
+        return options_204()
+
+    # GET (with ?text=) lets an <audio src> element play the stream directly
+    if request.method == "POST":
+        body = request.get_json(silent=True) or {}
+    else:
+        body = request.args.to_dict()
+    text = (body.get("text") or "").strip()
+    voice = body.get("voice") or "alloy"
+    if not text:
+        return jsonify({"ok": False, "error": "Missing text"}), 400
+
+    # pipeline=1: synthesize sentence by sentence in parallel
+    pipeline = str(body.get("pipeline") or "").lower() in ("1", "true", "yes")
+    # profile=hd|mobile|mobile-aac, otherwise chosen from Save-Data / ECT / Downlink hints
+    profile = select_profile(request.headers, body.get("profile"))
+
+    if not wants_audio_stream(body):
+        with utterance_trace():
+            if pipeline:
+                audio_urls = skin_ai.generate_voice_playlist(text, voice=voice, profile=profile.name)
+            else:
+                audio_urls = [url for url in [skin_ai.generate_voice(text, voice=voice, profile=profile.name)] if url]
+        if not audio_urls:
+            return jsonify({"ok": False, "error": "Audio generation failed", "audio_url": None}), 502
+        # Bytes are counted against the profile when /audio/ actually serves the clips
+        result = {"ok": True, "audio_url": audio_urls[0]}
+        if pipeline:
+            result["audio_urls"] = audio_urls
+        resp = jsonify(result)
+        # The profile travels in headers; the JSON body keeps its original keys
+        resp.headers["X-Audio-Profile"] = profile.name
+        resp.headers["X-Audio-Content-Type"] = profile.content_type
+        resp.headers["Vary"] = PROFILE_VARY
+        return resp
+
+    # Chunked transfer: bytes go out as the TTS API produces them
+    stream = skin_ai.stream_voice_pipelined if pipeline else skin_ai.stream_voice
+    audio = stream(text, voice=voice, profile=profile.name)
+    # Wait for the first chunk before committing to a 200: a synthesis that fails
+    # up front gets the same JSON error as the non-streaming branch
+    first = next(audio, None)
+    if first is None:
+        return jsonify({"ok": False, "error": "Audio generation failed", "audio_url": None}), 502
+    chunks = counted(itertools.chain([first], audio), profile.name)
+    resp = Response(stream_with_context(chunks), mimetype=profile.content_type)
+    resp.headers["X-Audio-Profile"] = profile.name
+    resp.headers["Vary"] = PROFILE_VARY
+    resp.headers["Cache-Control"] = "no-store"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+# Older clips (uuid-named, never rewritten) are still served from the repo directories
+LEGACY_AUDIO_DIRS = [Path(__file__).parent / "audio", Path(__file__).parent / "static" / "audio"]
+
+# Every /audio/ filename is unique or content-addressed and never rewritten in place
+AUDIO_MAX_AGE = 365 * 24 * 3600
+
+def find_audio_file(filename: str) -> Optional[str]:
+    path = skin_ai.audio_file_path(filename)
+    if path:
+        return path
+    for directory in LEGACY_AUDIO_DIRS:
+        candidate = directory / filename
+        if candidate.is_file():
+            return str(candidate)
+    return None
+
+@app.route("/audio/<filename>", methods=["GET", "HEAD"])
+def serve_audio(filename):
+    if filename != os.path.basename(filename) or filename.startswith("."):
+        abort(404)
+    path = find_audio_file(filename)
+    if not path:
+        abort(404)
+
+    stem, _, extension = filename.rpartition(".")
+    # Strong validator from the unique name + size; no need to hash the body
+    etag = f"{stem}-{os.path.getsize(path)}"
+    # send_file answers If-None-Match with 304 and Range with 206, and hands
+    # whole-file bodies to the server's file wrapper (sendfile where supported)
+    resp = send_file(
+        path,
+        mimetype=CONTENT_TYPES.get(extension.lower(), "application/octet-stream"),
+        conditional=True,
+        etag=etag,
+        max_age=AUDIO_MAX_AGE,
+    )
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    resp.headers["Accept-Ranges"] = "bytes"
+    if resp.status_code != 304:
+        skin_ai.audio_store.mark_served(filename)
+    profile_name = profile_for_extension(extension)
+    if request.method == "GET" and resp.status_code in (200, 206) and profile_name:
+        # Bytes actually sent (a Range request gets only its part)
+        record_served(profile_name, resp.content_length or 0)
+    return resp
+
+@app.route("/tts-stats", methods=["GET"])
+def tts_stats():
+    return jsonify(skin_ai.tts_stream_snapshot())
+
+@app.route("/audio-store/metrics", methods=["GET"])
+def audio_store_metrics():
+    return jsonify(skin_ai.audio_store.metrics())
+
 # =========================
 # Run
 # =========================
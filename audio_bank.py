@@ -0,0 +1,108 @@
+"""
+Pre-rendered speech for phrases the app says over and over: product blurbs
+from products.json and fixed UI / error phrases.
+
+prerender_audio.py synthesizes the whole set offline and writes a manifest
+mapping the TTS cache key of each phrase (text, voice, model, speed) to its
+file. The server loads the manifest once at startup and serves those phrases
+without calling the TTS API. Phrases are keyed on spoken_text(), so a UI
+string with arrows or emoji ("Turn your head left →") finds its clip. The bank lives in its own directory, outside the
+audio store, so the store's sweeper never removes it.
+"""
+
+import json
+import os
+import re
+import threading
+import unicodedata
+
+from tts_cache import TTSCache
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "audio", "bank")
+MANIFEST_NAME = "manifest.json"
+
+# Phrases spoken verbatim by the server and the mirror UI, copied as the UI writes
+# them (static/mobile_ui/scan.js scan steps, app.js validation messages)
+FIXED_PHRASES = [
+    "Look straight ahead",
+    "Turn your head left →",
+    "Turn your head right ←",
+    "Look up ↑",
+    "Camera not found. Please refresh the page.",
+    "Face detection not available. Please refresh the page.",
+    "Scan failed. Please try again.",
+    "Request timed out. Please try again.",
+    "Network error. Please check your internet connection and try again.",
+    "Rate limit exceeded. Please try again in a moment.",
+    "I'm sorry, I couldn't generate a response. Please try again.",
+    "I'm sorry, I couldn't generate a response. Please try rephrasing your question.",
+]
+
+
+def spoken_text(text: str) -> str:
+    """What TTS should read: non-ASCII symbols (arrows, emoji) dropped, whitespace collapsed."""
+    text = unicodedata.normalize("NFKC", text or "")
+    text = "".join(ch for ch in text if ord(ch) < 128 or unicodedata.category(ch) not in ("Sm", "So", "Sk"))
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def product_phrases(products_path: str) -> list:
+    """One spoken blurb per product: "<name>. <description>."."""
+    try:
+        with open(products_path, "r", encoding="utf-8") as f:
+            products = json.load(f)
+    except (OSError, ValueError):
+        return []
+    phrases = []
+    for product in products.values():
+        name = (product.get("name") or "").strip()
+        description = (product.get("description") or "").strip().rstrip(".")
+        if name:
+            phrases.append(f"{name}. {description}." if description else f"{name}.")
+    return phrases
+
+
+class AudioBank:
+    """Read side of the manifest: phrase -> pre-rendered file."""
+
+    def __init__(self, directory: str = DEFAULT_DIR):
+        self.directory = directory
+        self.entries = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0}
+        self.load()
+
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def load(self):
+        try:
+            with open(self.manifest_path(), "r", encoding="utf-8") as f:
+                entries = json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            entries = {}
+        with self._lock:
+            self.entries = entries
+
+    def lookup(self, text: str, voice: str, model: str, speed: float = 1.0, extension: str = "mp3"):
+        """Filename of the pre-rendered clip for this phrase, or None."""
+        if not self.entries:
+            return None
+        entry = self.entries.get(TTSCache.make_key(spoken_text(text), voice, model, speed, extension))
+        if entry is None:
+            return None
+        with self._lock:
+            self.stats["hits"] += 1
+        return entry["file"]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def save_manifest(directory: str, entries: dict):
+    """Write the manifest atomically."""
+    path = os.path.join(directory, MANIFEST_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"entries": entries}, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
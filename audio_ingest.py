@@ -0,0 +1,269 @@
+"""
+Streaming intake for uploaded voice clips (/analyze-audio).
+
+The request body is read in small chunks and the audio bytes are handed to
+the transcription request as they arrive, through a bounded ChunkPipe, so
+neither the whole upload nor a temp file is ever held: memory per request is
+about PIPE_CHUNKS x CHUNK_SIZE regardless of clip length.
+
+Bodies may be multipart/form-data (the mobile UI's FormData with an "audio"
+file, parsed incrementally with werkzeug's sans-IO decoder) or raw audio
+(Content-Type: audio/*, optionally Transfer-Encoding: chunked).
+"""
+
+import os
+import queue
+import threading
+import time
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import NEED_DATA, Data, Epilogue, Field, File, MultipartDecoder
+
+CHUNK_SIZE = 64 * 1024
+PIPE_CHUNKS = 16
+try:
+    MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_AUDIO_UPLOAD_MB", "25")) * 1024 * 1024)
+except ValueError:
+    MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+
+# Small form fields (language, user_id) sent next to the audio
+MAX_FIELD_BYTES = 4096
+
+
+class UploadError(Exception):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+_FAILED = object()
+
+
+class ChunkPipe:
+    """
+    Read-only file object fed from another thread. write() blocks while
+    `max_chunks` chunks are waiting (backpressure on the request body);
+    read() blocks until data arrives and returns b"" after close(). The
+    writer's timeout only runs once the reader has called start(), so an
+    upload queued behind busy transcription workers just waits its turn.
+    """
+
+    def __init__(self, name: str = "audio", max_chunks: int = PIPE_CHUNKS, timeout: float = 30.0):
+        self.name = name
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._buffer = bytearray()
+        self._eof = False
+        self._failed = False
+        self._started = threading.Event()
+        self.aborted = False
+        self.bytes_written = 0
+
+    def _put(self, item) -> bool:
+        """Queue one item; False if the reader started but took nothing for `timeout`."""
+        deadline = None
+        while not self.aborted:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if not self._started.is_set():
+                    continue  # still waiting for a transcription worker
+                if deadline is None:
+                    deadline = time.time() + self.timeout
+                elif time.time() > deadline:
+                    return False
+        return False
+
+    # Writer side (request thread)
+    def write(self, chunk: bytes):
+        if self._put(chunk):
+            self.bytes_written += len(chunk)
+            return
+        raise UploadError("Transcription stopped reading the upload", 502 if self.aborted else 504)
+
+    def close(self, failed: bool = False):
+        """End of data; with failed=True the reader gets an error instead of EOF."""
+        if failed:
+            # Don't wait for a queued reader: it fails as soon as it starts reading
+            self._failed = True
+            try:
+                self._queue.put_nowait(_FAILED)
+            except queue.Full:
+                pass
+        elif not self._put(None):
+            self.aborted = True
+
+    # Reader side (transcription thread)
+    def start(self):
+        """The reader is running; the writer's timeout starts now."""
+        self._started.set()
+
+    def abort(self):
+        """Reader gave up; unblocks the writer."""
+        self.aborted = True
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            if self._failed:
+                raise IOError("audio upload failed")
+            try:
+                chunk = self._queue.get(timeout=self.timeout)
+            except queue.Empty:
+                raise IOError("audio upload stalled")
+            if chunk is _FAILED:
+                raise IOError("audio upload failed")
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+
+class AudioUpload:
+    """
+    One uploaded clip. open() reads until the audio starts (multipart: the
+    `field` file part) and fills filename / content_type / fields;
+    chunks() then yields the audio bytes as they arrive, and the rest of the
+    body (trailing form fields) is consumed after the audio ends.
+    """
+
+    def __init__(self, stream, headers, field: str = "audio", max_bytes: int = MAX_UPLOAD_BYTES):
+        self.stream = stream
+        self.field = field
+        self.max_bytes = max_bytes
+        self.fields = {}
+        self.filename = None
+        self.content_type = None
+        self.bytes_read = 0
+        self._decoder = None
+        self._in_audio = False
+        self._current_field = None
+
+        mimetype, options = parse_options_header(headers.get("Content-Type") or "")
+        if mimetype == "multipart/form-data":
+            if not options.get("boundary"):
+                raise UploadError("Missing multipart boundary")
+            # Field sizes are checked below; the decoder's own limit applies to its raw buffer
+            self._decoder = MultipartDecoder(options["boundary"].encode("latin-1"))
+        elif mimetype.startswith("audio/") or mimetype in ("video/webm", "application/octet-stream"):
+            self.content_type = mimetype
+            self.filename = "voice" + _extension(mimetype)
+        else:
+            raise UploadError("Expected multipart/form-data or an audio/* body", 415)
+
+    def _read(self) -> bytes:
+        chunk = self.stream.read(CHUNK_SIZE)
+        self.bytes_read += len(chunk)
+        if self.bytes_read > self.max_bytes:
+            raise UploadError(f"Audio upload larger than {self.max_bytes // (1024 * 1024)} MB", 413)
+        return chunk
+
+    def _events(self):
+        """Decode the multipart body incrementally; yields audio data and collects fields."""
+        body_done = False
+        while True:
+            try:
+                event = self._decoder.next_event()
+            except ValueError:
+                # werkzeug's verdict on a body that ended mid-part or is malformed
+                raise UploadError("Upload ended before the multipart body was complete") from None
+            if event is NEED_DATA:
+                if body_done:
+                    raise UploadError("Upload ended before the multipart body was complete")
+                chunk = self._read()
+                body_done = not chunk
+                self._decoder.receive_data(chunk or None)
+                continue
+            if isinstance(event, Epilogue):
+                return
+            if isinstance(event, File) and event.name == self.field and self.filename is None:
+                self.filename = event.filename or "voice.webm"
+                self.content_type = event.headers.get("Content-Type") or "audio/webm"
+                self._in_audio = True
+                yield None  # audio starts
+            elif isinstance(event, (File, Field)):
+                self._in_audio = False
+                self._current_field = event.name if isinstance(event, Field) else None
+                if self._current_field is not None:
+                    self.fields[self._current_field] = b""
+            elif isinstance(event, Data):
+                if self._in_audio:
+                    if event.data:
+                        yield event.data
+                    if not event.more_data:
+                        self._in_audio = False
+                elif self._current_field is not None:
+                    value = self.fields[self._current_field] + event.data
+                    if len(value) > MAX_FIELD_BYTES:
+                        raise UploadError(f"Form field {self._current_field!r} too large", 413)
+                    self.fields[self._current_field] = value
+
+    def open(self):
+        if self._decoder is None:
+            return self
+        self._iterator = self._events()
+        for item in self._iterator:
+            if item is None:
+                break
+        else:
+            raise UploadError(f"No {self.field!r} file in the upload")
+        return self
+
+    def chunks(self):
+        if self._decoder is None:
+            while True:
+                chunk = self._read()
+                if not chunk:
+                    return
+                yield chunk
+        # Audio data, then nothing while trailing fields are collected
+        yield from self._iterator
+
+    def form(self) -> dict:
+        """Text form fields seen so far (all of them once chunks() is exhausted)."""
+        return {name: value.decode("utf-8", "replace") for name, value in self.fields.items()}
+
+
+def transcribe_upload(upload: AudioUpload, transcribe, executor, timeout: float = 120.0) -> str:
+    """
+    Stream an opened upload into transcribe(file, filename, content_type) running
+    on `executor`, and return its result once the body is fully relayed.
+    """
+    pipe = ChunkPipe(upload.filename)
+
+    def consume():
+        pipe.start()
+        try:
+            return transcribe(pipe, upload.filename, upload.content_type)
+        finally:
+            pipe.abort()
+
+    future = executor.submit(consume)
+    try:
+        for chunk in upload.chunks():
+            pipe.write(chunk)
+    except Exception:
+        # The upload's own error wins: a transcription failure here is the closed pipe
+        pipe.close(failed=True)
+        raise
+    pipe.close()
+    return future.result(timeout=timeout)
+
+
+def _extension(mimetype: str) -> str:
+    return {
+        "audio/webm": ".webm", "video/webm": ".webm", "audio/ogg": ".ogg", "audio/mpeg": ".mp3",
+        "audio/mp4": ".m4a", "audio/x-m4a": ".m4a", "audio/wav": ".wav", "audio/x-wav": ".wav",
+        "audio/flac": ".flac",
+    }.get(mimetype, ".webm")
@@ -0,0 +1,119 @@
+"""
+Output profiles for generated speech.
+
+A profile fixes the TTS response format, an optional target bitrate and the
+content type the clip is served with. The in-store mirror on LAN gets the
+default "hd" mp3; phones on cellular get Opus (or AAC on Apple devices, whose
+browsers don't all play Ogg Opus) at a low bitrate. The profile is picked per
+request from an explicit `profile` parameter or the client hints the browser
+sends (Save-Data, ECT, Downlink, Accept, User-Agent).
+
+The OpenAI speech API has no bitrate setting, so profiles with bitrate_kbps
+are re-encoded with ffmpeg when it is installed; without ffmpeg the
+provider's native encoding in the same format is used.
+"""
+
+import shutil
+import subprocess
+import threading
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class AudioProfile:
+    name: str
+    response_format: str  # OpenAI speech response_format
+    extension: str
+    content_type: str
+    bitrate_kbps: int = None  # re-encode target; None keeps the provider's encoding
+    ffmpeg_codec: str = None
+
+    @property
+    def cache_tag(self) -> str:
+        """Discriminator mixed into TTS cache keys; "hd" keeps the original mp3 keys."""
+        return "mp3" if self.name == DEFAULT_PROFILE else self.name
+
+
+PROFILES = {
+    "hd": AudioProfile("hd", "mp3", "mp3", "audio/mpeg"),
+    "mobile": AudioProfile("mobile", "opus", "ogg", "audio/ogg", bitrate_kbps=32, ffmpeg_codec="libopus"),
+    "mobile-aac": AudioProfile("mobile-aac", "aac", "aac", "audio/aac", bitrate_kbps=48, ffmpeg_codec="aac"),
+}
+DEFAULT_PROFILE = "hd"
+
+CONTENT_TYPES = {profile.extension: profile.content_type for profile in PROFILES.values()}
+CONTENT_TYPES.update({"opus": "audio/ogg", "wav": "audio/wav", "flac": "audio/flac"})
+
+# Output container per ffmpeg codec
+_FFMPEG_FORMATS = {"libopus": "ogg", "aac": "adts"}
+
+_SLOW_NETWORKS = ("slow-2g", "2g", "3g")
+
+profile_stats = {}
+_stats_lock = threading.Lock()
+
+
+def get_profile(name: str = None) -> AudioProfile:
+    return PROFILES.get((name or "").lower()) or PROFILES[DEFAULT_PROFILE]
+
+
+def select_profile(headers, requested: str = None) -> AudioProfile:
+    """Profile for a request: explicit name first, then client hints, else "hd"."""
+    if requested and requested.lower() in PROFILES:
+        return PROFILES[requested.lower()]
+
+    save_data = (headers.get("Save-Data") or "").lower() == "on"
+    slow = (headers.get("ECT") or "").lower() in _SLOW_NETWORKS
+    try:
+        slow = slow or float(headers.get("Downlink") or "inf") < 2.0
+    except ValueError:
+        pass
+    if not (save_data or slow):
+        return PROFILES[DEFAULT_PROFILE]
+
+    accept = (headers.get("Accept") or "").lower()
+    user_agent = headers.get("User-Agent") or ""
+    apple = any(token in user_agent for token in ("iPhone", "iPad", "Macintosh")) and "Chrome" not in user_agent
+    if "audio/ogg" in accept or "opus" in accept or not apple:
+        return PROFILES["mobile"]
+    return PROFILES["mobile-aac"]
+
+
+def transcode(data: bytes, profile: AudioProfile) -> bytes:
+    """Re-encode provider output to the profile bitrate; returns data unchanged if not possible."""
+    if not profile.bitrate_kbps or not profile.ffmpeg_codec or not shutil.which("ffmpeg"):
+        return data
+    command = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+        "-c:a", profile.ffmpeg_codec, "-b:a", f"{profile.bitrate_kbps}k",
+        "-f", _FFMPEG_FORMATS.get(profile.ffmpeg_codec, profile.extension), "pipe:1",
+    ]
+    try:
+        result = subprocess.run(command, input=data, capture_output=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"⚠️ Audio transcode to {profile.name} failed: {e}")
+        return data
+    if result.returncode != 0 or not result.stdout:
+        print(f"⚠️ Audio transcode to {profile.name} failed: {result.stderr.decode(errors='replace')[:200]}")
+        return data
+    return result.stdout
+
+
+def profile_for_extension(extension: str):
+    """Profile name whose clips use this file extension, or None."""
+    for profile in PROFILES.values():
+        if profile.extension == extension.lower():
+            return profile.name
+    return None
+
+
+def record_served(profile_name: str, num_bytes: int):
+    with _stats_lock:
+        stats = profile_stats.setdefault(profile_name, {"responses": 0, "bytes": 0})
+        stats["responses"] += 1
+        stats["bytes"] += num_bytes
+
+
+def profile_snapshot() -> dict:
+    with _stats_lock:
+        return {name: dict(stats) for name, stats in profile_stats.items()}
@@ -0,0 +1,222 @@
+"""
+Managed directory of generated audio with a byte and age budget.
+
+Every generated clip is written through AudioStore.write(): the bytes go to a
+temporary file that is renamed into place, so a client requesting the URL
+never sees a partial mp3. Serving a file marks it used (its atime is bumped,
+which survives restarts without touching the mtime ETags are built from). A
+background sweeper deletes files unused for longer than max_age and then the
+least recently served files until the directory fits max_bytes.
+
+The directory is shared by every worker process, so the files on disk are the
+source of truth: exists() stats the file, and each sweep rescans the directory
+and runs under a non-blocking file lock, so only one worker sweeps at a time.
+"""
+
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "audio", "generated")
+
+# Leftover temp files from a crashed writer are removed after this long
+STALE_TMP_SECONDS = 3600
+
+SWEEP_LOCK_NAME = ".sweep.lock"
+
+
+class AudioStore:
+    """Budgeted audio directory; see module docstring."""
+
+    def __init__(self, directory: str = DEFAULT_DIR, max_bytes: int = 500 * 1024 * 1024,
+                 max_age: float = 30 * 86400, sweep_interval: float = 300.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self._files = {}  # filename -> [bytes, last_used]
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._stop = threading.Event()
+        self.stats = {"writes": 0, "served": 0, "evictions": 0, "expired": 0,
+                      "evicted_bytes": 0, "sweeps": 0, "last_sweep": None}
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Rebuild the file map from the directory (other workers write and serve too)."""
+        files, total = {}, 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file() or entry.name.endswith((".tmp", ".json", ".lock")):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                files[entry.name] = [st.st_size, max(st.st_atime, st.st_mtime)]
+                total += st.st_size
+        with self._lock:
+            self._files, self._bytes = files, total
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.directory, os.path.basename(filename))
+
+    def new_filename(self, extension: str = "mp3") -> str:
+        return f"{uuid.uuid4().hex}.{extension}"
+
+    def write(self, filename: str, data: bytes) -> str:
+        """Atomically store data under filename; returns the filename."""
+        filename = os.path.basename(filename)
+        path = self.path(filename)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            previous = self._files.get(filename)
+            if previous:
+                self._bytes -= previous[0]
+            self._files[filename] = [len(data), time.time()]
+            self._bytes += len(data)
+            self.stats["writes"] += 1
+        return filename
+
+    def exists(self, filename: str) -> bool:
+        return os.path.isfile(self.path(filename))
+
+    def mark_served(self, filename: str):
+        """Record that filename was just served (keeps it off the eviction list)."""
+        filename = os.path.basename(filename)
+        now = time.time()
+        try:
+            # The atime is what every worker's sweep sees
+            st = os.stat(self.path(filename))
+            os.utime(self.path(filename), (now, st.st_mtime))
+        except OSError:
+            return
+        with self._lock:
+            if filename not in self._files:
+                self._files[filename] = [st.st_size, now]
+                self._bytes += st.st_size
+            self._files[filename][1] = now
+            self.stats["served"] += 1
+
+    def remove(self, filename: str):
+        filename = os.path.basename(filename)
+        with self._lock:
+            entry = self._files.pop(filename, None)
+            if entry:
+                self._bytes -= entry[0]
+        try:
+            os.remove(self.path(filename))
+        except OSError:
+            pass
+
+    def sweep(self) -> int:
+        """Apply the age and byte budgets now; returns the number of files removed."""
+        if not FCNTL_AVAILABLE:
+            return self._sweep()
+        with open(os.path.join(self.directory, SWEEP_LOCK_NAME), "a+b") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return 0  # another worker is sweeping
+            try:
+                return self._sweep()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _sweep(self) -> int:
+        self._scan()
+        now = time.time()
+        with self._lock:
+            by_age = sorted(self._files.items(), key=lambda item: item[1][1])
+            victims = []
+            remaining = self._bytes
+            for name, (size, last_used) in by_age:
+                expired = now - last_used > self.max_age
+                if not expired and remaining <= self.max_bytes:
+                    break
+                victims.append((name, size, expired))
+                remaining -= size
+            for name, size, expired in victims:
+                del self._files[name]
+                self._bytes -= size
+                self.stats["expired" if expired else "evictions"] += 1
+                self.stats["evicted_bytes"] += size
+            self.stats["sweeps"] += 1
+            self.stats["last_sweep"] = now
+
+        for name, _, _ in victims:
+            try:
+                os.remove(self.path(name))
+            except OSError:
+                pass
+        self._remove_stale_tmp(now)
+        if victims:
+            print(f"🧹 Audio store: removed {len(victims)} files, {self._bytes / 1e6:.1f} MB in use")
+        return len(victims)
+
+    def _remove_stale_tmp(self, now: float):
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".tmp") and now - entry.stat().st_mtime > STALE_TMP_SECONDS:
+                        os.remove(entry.path)
+        except OSError:
+            pass
+
+    def start_sweeper(self):
+        """Run sweep() every sweep_interval seconds on a daemon thread."""
+        if self._sweeper is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(self.sweep_interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"⚠️ Audio store sweep failed: {e}")
+
+        self._sweeper = threading.Thread(target=loop, name="audio-store-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "files": len(self._files),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_age_seconds": self.max_age,
+            }
+
+
+def audio_store_from_env(prefix: str = "AUDIO_STORE") -> AudioStore:
+    """Build a store from <PREFIX>_DIR / _MAX_MB / _MAX_AGE_DAYS / _SWEEP_SECONDS and start its sweeper."""
+    try:
+        max_mb = float(os.getenv(f"{prefix}_MAX_MB", "500"))
+        max_age_days = float(os.getenv(f"{prefix}_MAX_AGE_DAYS", "30"))
+        sweep_seconds = float(os.getenv(f"{prefix}_SWEEP_SECONDS", "300"))
+    except ValueError:
+        max_mb, max_age_days, sweep_seconds = 500.0, 30.0, 300.0
+    store = AudioStore(
+        directory=os.getenv(f"{prefix}_DIR") or DEFAULT_DIR,
+        max_bytes=int(max_mb * 1024 * 1024),
+        max_age=max_age_days * 86400,
+        sweep_interval=sweep_seconds,
+    )
+    store.start_sweeper()
+    return store
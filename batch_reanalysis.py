@@ -0,0 +1,214 @@
+"""
+Bulk offline re-analysis of archived skin scans.
+
+Runs analyze_face over a directory or manifest of images with bounded
+concurrency, under a per-provider token-bucket rate limit. Results are appended
+to a JSONL file that doubles as the checkpoint: re-running the same command
+skips every image that already has an "ok" line, so an interrupted run resumes.
+
+Usage:
+    python batch_reanalysis.py scans/ -o results.jsonl --concurrency 4
+    python batch_reanalysis.py manifest.jsonl -o results.jsonl --language ru
+
+A manifest is either a text file with one image path per line, or JSONL with
+{"path": ..., "id": ..., "language": ...} objects (id and language optional).
+Relative paths are resolved against the manifest's directory.
+
+Rate limits are the server's (GEMINI_RPM / GEMINI_TPM, OPENAI_VISION_RPM /
+OPENAI_VISION_TPM): the batch draws from the same shared budget as live traffic.
+"""
+
+import argparse
+import base64
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import AI_Skin_Analysis as skin_ai
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+# -------------------- INPUT --------------------
+
+def load_jobs(source: str, language: str = "en") -> list:
+    """Return [{"id", "path", "language"}] for a directory or manifest file."""
+    jobs = []
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    jobs.append({"id": os.path.relpath(path, source), "path": path, "language": language})
+        jobs.sort(key=lambda job: job["id"])
+        return jobs
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                entry = json.loads(line)
+            else:
+                entry = {"path": line}
+            path = entry["path"]
+            if not os.path.isabs(path):
+                path = os.path.join(base_dir, path)
+            jobs.append({
+                "id": entry.get("id") or entry["path"],
+                "path": path,
+                "language": entry.get("language") or language,
+            })
+    return jobs
+
+
+def load_checkpoint(output_path: str) -> set:
+    """Ids that already have a successful result in the output JSONL."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short by an interrupted run; that image is simply redone
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+# -------------------- SCHEDULER --------------------
+
+def _is_rate_limited(error: Exception) -> bool:
+    return "429" in str(error) or "rate limit" in str(error).lower()
+
+
+def run_batch(jobs: list, output_path: str, concurrency: int = 4, limiters: dict = None,
+              max_retries: int = 3, backoff: float = 5.0) -> dict:
+    """
+    Analyze every job not already in the checkpoint and append results to output_path.
+
+    `limiters` (name -> SharedRateLimiter) is passed to each analysis in place of
+    the server's limiters; live calls in the same process keep using theirs.
+
+    Returns a summary dict with throughput and the provider rejection rate.
+    """
+    done = load_checkpoint(output_path)
+    pending = [job for job in jobs if job["id"] not in done]
+    print(f"📦 Batch: {len(jobs)} images, {len(done)} already done, {len(pending)} to analyze")
+
+    with skin_ai._provider_stats_lock:
+        stats_before = {name: dict(stats) for name, stats in skin_ai.provider_call_stats.items()}
+
+    counts = {"ok": 0, "failed": 0, "cached": 0, "retries": 0}
+    write_lock = threading.Lock()
+    # Bound queued work so huge archives don't sit in memory as pending futures
+    slots = threading.BoundedSemaphore(concurrency * 2)
+
+    def process(job, out):
+        try:
+            record = {"id": job["id"], "path": job["path"], "language": job["language"]}
+            start = time.time()
+            try:
+                with open(job["path"], "rb") as f:
+                    image_base64 = base64.b64encode(f.read()).decode("utf-8")
+                for attempt in range(max_retries + 1):
+                    try:
+                        result = skin_ai.analyze_face_result(image_base64, language=job["language"],
+                                                             limiters=limiters)
+                        break
+                    except Exception as e:
+                        if attempt == max_retries or not _is_rate_limited(e):
+                            raise
+                        with write_lock:
+                            counts["retries"] += 1
+                        time.sleep(backoff * (2 ** attempt))
+                record.update(status="ok", analysis=result["analysis"],
+                              provider=result["provider"], cached=result["cached"])
+            except Exception as e:
+                print(f"❌ Batch: {job['id']} failed: {e}")
+                record.update(status="error", error=str(e))
+            record["seconds"] = round(time.time() - start, 3)
+
+            with write_lock:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                counts["ok" if record["status"] == "ok" else "failed"] += 1
+                if record.get("cached"):
+                    counts["cached"] += 1
+                finished = counts["ok"] + counts["failed"]
+                if finished % 10 == 0 or finished == len(pending):
+                    print(f"⏳ Batch progress: {finished}/{len(pending)}")
+        finally:
+            slots.release()
+
+    start = time.time()
+    with open(output_path, "a", encoding="utf-8") as out:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as executor:
+            for job in pending:
+                slots.acquire()
+                executor.submit(process, job, out)
+    elapsed = time.time() - start
+
+    with skin_ai._provider_stats_lock:
+        stats_after = {name: dict(stats) for name, stats in skin_ai.provider_call_stats.items()}
+    providers = {}
+    for name, stats in stats_after.items():
+        before = stats_before.get(name, {"calls": 0, "rejected": 0, "throttled": 0})
+        calls = stats["calls"] - before["calls"]
+        rejected = stats["rejected"] - before["rejected"]
+        providers[name] = {
+            "calls": calls,
+            "rejected": rejected,
+            "throttled": stats["throttled"] - before["throttled"],
+            "rejection_rate": round(rejected / calls, 4) if calls else 0.0,
+        }
+    total_calls = sum(p["calls"] for p in providers.values())
+    total_rejected = sum(p["rejected"] for p in providers.values())
+
+    summary = {
+        "images": len(pending),
+        "skipped": len(jobs) - len(pending),
+        **counts,
+        "seconds": round(elapsed, 2),
+        "images_per_minute": round(len(pending) / elapsed * 60, 2) if elapsed > 0 else 0.0,
+        "rejection_rate": round(total_rejected / total_calls, 4) if total_calls else 0.0,
+        "providers": providers,
+    }
+    return summary
+
+
+# -------------------- CLI --------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run analyze_face over archived scans.")
+    parser.add_argument("source", help="directory of images or manifest (.txt / .jsonl)")
+    parser.add_argument("-o", "--output", default="reanalysis.jsonl", help="results JSONL (also the resume checkpoint)")
+    parser.add_argument("--language", default="en", help="default analysis language")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel analyses")
+    parser.add_argument("--max-retries", type=int, default=3, help="retries per image after a 429")
+    args = parser.parse_args()
+
+    # The server's limiters (limiter_from_env with its rpm/tpm): a batch run and
+    # live traffic share one budget and agree on its burst and refill rates
+    jobs = load_jobs(args.source, language=args.language)
+    summary = run_batch(jobs, args.output, concurrency=args.concurrency, max_retries=args.max_retries)
+
+    print("✅ Batch finished")
+    print(f"   analyzed: {summary['images']} (ok {summary['ok']}, failed {summary['failed']}, "
+          f"cached {summary['cached']}), skipped: {summary['skipped']}")
+    print(f"   throughput: {summary['images_per_minute']} images/min over {summary['seconds']}s")
+    print(f"   rejection rate: {summary['rejection_rate'] * 100:.1f}% ({summary['retries']} retries)")
+    for name, stats in summary["providers"].items():
+        print(f"   {name}: {stats['calls']} calls, {stats['rejected']} rejected, "
+              f"{stats['throttled']} held back by the client-side limiter")
+
+
+if __name__ == "__main__":
+    main()
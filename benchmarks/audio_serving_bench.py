@@ -0,0 +1,96 @@
+"""
+Benchmark /audio/<filename> serving over the repo's existing mp3s.
+
+Runs app.py on a local threaded server and fetches every clip in audio/ and
+static/audio/ with concurrent clients, comparing:
+
+  naive      - the handler reads the whole file into memory and returns it
+  send_file  - the /audio/ route (file wrapper, ETag, Range)
+  range      - the /audio/ route, 64 KB Range requests (seeking)
+  revalidate - the /audio/ route, If-None-Match with the ETag (mirror cache)
+
+Usage:
+    YOUCAM_API_KEY=x python benchmarks/audio_serving_bench.py
+    YOUCAM_API_KEY=x python benchmarks/audio_serving_bench.py --clients 16 --rounds 3
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("YOUCAM_API_KEY", "benchmark")
+
+from werkzeug.serving import make_server  # noqa: E402
+
+import app as server_app  # noqa: E402
+
+
+def naive_audio(filename):
+    path = server_app.find_audio_file(filename)
+    with open(path, "rb") as f:
+        return server_app.Response(f.read(), mimetype="audio/mpeg")
+
+
+def fetch(url: str, headers: dict = None) -> tuple:
+    request = urllib.request.Request(url, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, len(response.read()), response.headers.get("ETag")
+    except urllib.error.HTTPError as e:
+        return e.code, 0, None
+
+
+def run(label: str, jobs: list, clients: int):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(lambda job: fetch(*job), jobs))
+    elapsed = time.perf_counter() - start
+    total_bytes = sum(size for _, size, _ in results)
+    statuses = {}
+    for status, _, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    print(f"{label:<12}{len(jobs) / elapsed:>10.0f} req/s{total_bytes / elapsed / 1e6:>10.1f} MB/s"
+          f"{total_bytes / 1e6:>10.1f} MB   {statuses}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of /audio/ serving.")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--rounds", type=int, default=2, help="passes over the clip set")
+    args = parser.parse_args()
+
+    names = []
+    for directory in server_app.LEGACY_AUDIO_DIRS:
+        if directory.is_dir():
+            names += sorted(name for name in os.listdir(directory) if name.endswith(".mp3"))
+    if not names:
+        sys.exit("no mp3 files found in audio/ or static/audio/")
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server_app.app.add_url_rule("/naive-audio/<filename>", "naive_audio", naive_audio)
+    server = make_server("127.0.0.1", 0, server_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    names = names * args.rounds
+    print(f"{len(names)} requests over {len(names) // args.rounds} clips, {args.clients} clients")
+    run("naive", [(f"{base}/naive-audio/{name}",) for name in names], args.clients)
+    results = run("send_file", [(f"{base}/audio/{name}",) for name in names], args.clients)
+    run("range", [(f"{base}/audio/{name}", {"Range": "bytes=0-65535"}) for name in names], args.clients)
+    etags = [etag for _, _, etag in results]
+    run("revalidate", [(f"{base}/audio/{name}", {"If-None-Match": etag or ""})
+                       for name, etag in zip(names, etags)], args.clients)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
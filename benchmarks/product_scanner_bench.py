@@ -0,0 +1,107 @@
+"""
+Benchmark the Aho–Corasick product recognizer against the substring scan it
+replaced (lowercase the text, test every catalog name with `in`).
+
+Builds a synthetic catalog of brand x line x active x strength names, then
+scans chat-length texts that mention a few of them. Reports automaton build
+time, per-text scan time for both approaches, and checks that the automaton (with overlapping
+matches) reports exactly the products the substring scan sees.
+
+Usage:
+    python benchmarks/product_scanner_bench.py
+    python benchmarks/product_scanner_bench.py --names 50000 --texts 500
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from product_scanner import ProductMatcher  # noqa: E402
+
+BRANDS = ["cerave", "the ordinary", "la roche-posay", "paula's choice", "cosrx", "avene", "bioderma",
+          "neutrogena", "eucerin", "vichy", "kiehl's", "clinique", "drunk elephant", "inkey list",
+          "skinceuticals", "tatcha", "first aid beauty", "mario badescu", "glow recipe", "laneige"]
+LINES = ["hydrating", "foaming", "daily", "advanced", "gentle", "intensive", "clarifying", "barrier",
+         "calming", "brightening", "night", "ultra", "pure", "sensitive", "renewing"]
+ACTIVES = ["niacinamide", "salicylic acid", "retinol", "hyaluronic acid", "vitamin c", "azelaic acid",
+           "ceramides", "peptides", "glycolic acid", "lactic acid", "zinc", "squalane", "centella"]
+FORMS = ["cleanser", "serum", "cream", "toner", "gel", "lotion", "essence", "mask", "balm", "fluid"]
+STRENGTHS = ["", " 0.2%", " 0.5%", " 1%", " 2%", " 5%", " 10%", " 15%"]
+
+FILLER = ("my skin has been a bit dry around the nose lately and i get some redness after washing "
+          "so i wondered whether i should keep using it in the evening or switch to something milder "
+          "and what order to put things on in the morning before sunscreen ").split()
+
+
+def make_catalog(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        names.add(f"{rng.choice(BRANDS)} {rng.choice(LINES)} {rng.choice(ACTIVES)} "
+                  f"{rng.choice(FORMS)}{rng.choice(STRENGTHS)}")
+    return sorted(names)
+
+
+def make_texts(names: list, count: int, words: int = 60, seed: int = 11) -> list:
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        tokens = [rng.choice(FILLER) for _ in range(words)]
+        for _ in range(rng.randint(0, 3)):
+            name = rng.choice(names)
+            tokens.insert(rng.randrange(len(tokens) + 1), name.title() if rng.random() < 0.5 else name)
+        texts.append(" ".join(tokens))
+    return texts
+
+
+def substring_scan(names: list, text: str) -> list:
+    t = text.lower()
+    return [name for name in names if name in t]
+
+
+def timed(fn, texts: list) -> list:
+    samples = []
+    for text in texts:
+        start = time.perf_counter()
+        fn(text)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aho–Corasick vs substring product recognition.")
+    parser.add_argument("--names", type=int, default=10000, help="catalog size")
+    parser.add_argument("--texts", type=int, default=200, help="texts to scan")
+    args = parser.parse_args()
+
+    names = make_catalog(args.names)
+    texts = make_texts(names, args.texts)
+
+    start = time.perf_counter()
+    matcher = ProductMatcher(names)
+    build = time.perf_counter() - start
+    print(f"📦 {len(names)} names, automaton built in {build:.2f}s, "
+          f"{args.texts} texts (~{statistics.mean(len(t) for t in texts):.0f} chars)")
+
+    for text in texts:
+        found = {match.key for match in matcher.find_all(text, overlapping=True)}
+        expected = set(substring_scan(names, text))
+        if found != expected:
+            raise SystemExit(f"❌ automaton and substring scan disagree: "
+                             f"extra {found - expected}, missing {expected - found}")
+
+    automaton = timed(matcher.find_all, texts)
+    substring = timed(lambda text: substring_scan(names, text), texts)
+    for label, samples in (("aho-corasick", automaton), ("substring scan", substring)):
+        print(f"{label:>15}: median {statistics.median(samples) * 1e6:8.0f} µs/text, "
+              f"p95 {sorted(samples)[int(0.95 * (len(samples) - 1))] * 1e6:8.0f} µs/text")
+    print(f"⚡ {statistics.median(substring) / statistics.median(automaton):.1f}x faster per text (median)")
+
+
+if __name__ == "__main__":
+    main()
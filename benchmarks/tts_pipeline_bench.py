@@ -0,0 +1,126 @@
+"""
+Benchmark sentence-pipelined TTS against one whole-answer TTS call.
+
+Starts a local stand-in TTS server whose latency is a fixed overhead plus a
+per-character synthesis cost (defaults roughly match tts-1-hd), then
+synthesizes sample answers both ways and reports time to first playable audio
+and total time.
+
+Usage:
+    python benchmarks/tts_pipeline_bench.py
+    python benchmarks/tts_pipeline_bench.py --workers 4 --base-ms 400 --per-char-ms 10 --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tts_pipeline import split_sentences, synthesize_pipelined  # noqa: E402
+
+SAMPLE_ANSWERS = [
+    "Your skin looks slightly oily in the T-zone, with a few clogged pores on the nose. "
+    "I'd start with a gentle foaming cleanser morning and evening. "
+    "Follow it with a light, oil-free moisturizer so your skin doesn't overcompensate. "
+    "In the morning, finish with a broad-spectrum sunscreen of SPF 30 or higher. "
+    "Once a week you can add a salicylic acid treatment to keep the pores clear.",
+    "Your cheeks show some redness and dryness, which points to a weakened skin barrier. "
+    "Skip exfoliating acids for now and use a creamy, fragrance-free cleanser. "
+    "A moisturizer with ceramides will help your barrier recover within a couple of weeks. "
+    "Mineral sunscreen with zinc oxide is usually the calmest option for sensitive skin.",
+    "Great question! Retinol works best at night, after cleansing and before moisturizer. "
+    "Start two or three evenings a week and increase slowly as your skin adjusts. "
+    "Some dryness or flaking in the first weeks is normal. "
+    "Always wear sunscreen during the day while using retinol.",
+]
+
+
+def make_server(base_ms: float, per_char_ms: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])) or b"{}")
+            text = body.get("input", "")
+            time.sleep((base_ms + per_char_ms * len(text)) / 1000)
+            # ~1 KB of "mp3" per 15 characters of speech
+            audio = b"\xff\xfb" * (len(text) * 35)
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("Content-Length", str(len(audio)))
+            self.end_headers()
+            self.wfile.write(audio)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def synthesize_via(url: str):
+    def synthesize(text: str) -> bytes:
+        request = urllib.request.Request(url, data=json.dumps({"input": text}).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            return response.read()
+    return synthesize
+
+
+def run_sequential(text: str, synthesize) -> tuple:
+    start = time.perf_counter()
+    synthesize(text)
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+
+def run_pipelined(text: str, synthesize, workers: int) -> tuple:
+    start = time.perf_counter()
+    first = None
+    for index, _, _ in synthesize_pipelined(split_sentences(text), synthesize, max_workers=workers):
+        if index == 0:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sentence-pipelined vs whole-answer TTS latency.")
+    parser.add_argument("--workers", type=int, default=3, help="parallel segment syntheses")
+    parser.add_argument("--base-ms", type=float, default=350, help="stand-in per-request overhead")
+    parser.add_argument("--per-char-ms", type=float, default=6, help="stand-in synthesis cost per character")
+    parser.add_argument("--runs", type=int, default=3, help="repetitions per answer")
+    args = parser.parse_args()
+
+    server = make_server(args.base_ms, args.per_char_ms)
+    synthesize = synthesize_via(f"http://127.0.0.1:{server.server_address[1]}/v1/audio/speech")
+
+    results = {"sequential": ([], []), "pipelined": ([], [])}
+    for text in SAMPLE_ANSWERS:
+        for _ in range(args.runs):
+            for mode in results:
+                if mode == "sequential":
+                    first, total = run_sequential(text, synthesize)
+                else:
+                    first, total = run_pipelined(text, synthesize, args.workers)
+                results[mode][0].append(first)
+                results[mode][1].append(total)
+    server.shutdown()
+
+    print(f"{len(SAMPLE_ANSWERS)} answers x {args.runs} runs, {args.workers} workers, "
+          f"stand-in latency {args.base_ms:.0f} ms + {args.per_char_ms:.1f} ms/char")
+    print(f"{'mode':<12}{'first audio (median)':>22}{'total (median)':>18}")
+    for mode, (firsts, totals) in results.items():
+        print(f"{mode:<12}{statistics.median(firsts) * 1000:>19.0f} ms{statistics.median(totals) * 1000:>15.0f} ms")
+    seq_first, seq_total = (statistics.median(v) for v in results["sequential"])
+    pipe_first, pipe_total = (statistics.median(v) for v in results["pipelined"])
+    print(f"speedup: first audio {seq_first / pipe_first:.2f}x, total {seq_total / pipe_total:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
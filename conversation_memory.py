@@ -0,0 +1,121 @@
+"""
+Per-user conversation memory for analyze(): a rolling summary of older turns
+plus the most recent exchanges, kept under a token budget.
+
+When the recent turns outgrow their budget, the oldest exchanges are moved out
+of the prompt and folded into the summary by a background worker, so the
+request path never waits on summarization and the prompt stays roughly the
+same size however long the session runs.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from text_tokens import estimate_message_tokens, estimate_tokens
+
+
+class _UserMemory:
+    def __init__(self):
+        self.summary = ""
+        self.recent = []
+        self.pending = []
+        self.summarizing = False
+        self.lock = threading.Lock()
+
+
+class ConversationMemory:
+    """
+    `summarize(previous_summary, messages) -> str` builds the new rolling summary;
+    it runs on a background thread. `token_budget` caps summary + recent turns.
+    While summaries fail, at most `max_pending` messages wait for the next
+    attempt; older ones are dropped.
+    """
+
+    def __init__(self, summarize, token_budget: int = 800, summary_budget: int = 200, min_recent: int = 2,
+                 max_pending: int = 40):
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.min_recent = min_recent
+        self.max_pending = max_pending
+        self._users = {}
+        self._users_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation-summary")
+
+    def _user(self, user_id: str) -> _UserMemory:
+        with self._users_lock:
+            if user_id not in self._users:
+                self._users[user_id] = _UserMemory()
+            return self._users[user_id]
+
+    def context_messages(self, user_id: str) -> list:
+        """Messages to place between the system prompt and the new question."""
+        memory = self._user(user_id)
+        with memory.lock:
+            messages = []
+            if memory.summary:
+                messages.append({
+                    "role": "system",
+                    "content": f"Summary of the earlier conversation with this user:\n{memory.summary}"
+                })
+            messages.extend(memory.recent)
+            return messages
+
+    def append(self, user_id: str, question: str, answer: str):
+        """Record one exchange and compact older turns if the budget is exceeded."""
+        memory = self._user(user_id)
+        with memory.lock:
+            memory.recent.append({"role": "user", "content": question})
+            memory.recent.append({"role": "assistant", "content": answer})
+
+            recent_budget = self.token_budget - min(estimate_tokens(memory.summary), self.summary_budget)
+            while (len(memory.recent) > self.min_recent * 2
+                   and estimate_message_tokens(memory.recent) > recent_budget):
+                # Move the oldest whole exchange out of the prompt
+                memory.pending.extend(memory.recent[:2])
+                del memory.recent[:2]
+
+            if memory.pending and not memory.summarizing:
+                memory.summarizing = True
+                self._executor.submit(self._compact, memory)
+
+    def _compact(self, memory: _UserMemory):
+        while True:
+            with memory.lock:
+                if not memory.pending:
+                    memory.summarizing = False
+                    return
+                previous, batch = memory.summary, memory.pending
+                memory.pending = []
+            try:
+                summary = self.summarize(previous, batch)
+            except Exception as e:
+                # Keep the turns for the next attempt (the next append() retries)
+                print(f"⚠️ Conversation summary failed, {len(batch)} messages kept for retry: {e}")
+                with memory.lock:
+                    memory.pending[:0] = batch
+                    overflow = len(memory.pending) - self.max_pending
+                    if overflow > 0:
+                        # Drop whole exchanges, oldest first
+                        overflow += overflow % 2
+                        del memory.pending[:overflow]
+                        print(f"⚠️ Conversation summary still failing, dropped {overflow} oldest messages")
+                    memory.summarizing = False
+                return
+            with memory.lock:
+                memory.summary = _clip(summary, self.summary_budget)
+
+    def reset(self, user_id: str):
+        with self._users_lock:
+            self._users.pop(user_id, None)
+
+
+def _clip(text: str, budget: int) -> str:
+    """Cut text to roughly `budget` tokens, keeping the most recent part."""
+    text = (text or "").strip()
+    while text and estimate_tokens(text) > budget:
+        text = text[len(text) // 5:]
+        # Drop the partial sentence left at the front
+        if ". " in text:
+            text = text.split(". ", 1)[1]
+    return text
@@ -0,0 +1,150 @@
+"""
+Pre-render the audio bank: product blurbs from products.json plus the fixed
+UI / error phrases in audio_bank.FIXED_PHRASES.
+
+Each phrase is keyed like the TTS cache (text, voice, model, speed) on its
+audio_bank.spoken_text(), the form the server looks up, so an unchanged
+phrase keeps its file and only new or edited phrases are synthesized.
+Phrases that disappeared from the set are removed. The server picks up the
+manifest at startup (AUDIO_BANK_DIR).
+
+Usage:
+    python prerender_audio.py
+    python prerender_audio.py --voice alloy --concurrency 4 --phrases extra_phrases.txt
+    python prerender_audio.py --profile mobile
+    python prerender_audio.py --dry-run
+"""
+
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import AI_Skin_Analysis as skin_ai
+from audio_bank import DEFAULT_DIR, FIXED_PHRASES, AudioBank, product_phrases, save_manifest, spoken_text
+from audio_profiles import DEFAULT_PROFILE, PROFILES, get_profile, transcode
+from product_ranker import PRODUCTS_PATH
+from rate_limiter import RateLimitExceeded
+from tts_cache import TTSCache
+
+
+def collect_phrases(products_path: str, extra_path: str = None) -> list:
+    """[(source, spoken text)] without duplicates, products first."""
+    phrases = [("product", text) for text in product_phrases(products_path)]
+    phrases += [("fixed", text) for text in FIXED_PHRASES]
+    if extra_path:
+        with open(extra_path, "r", encoding="utf-8") as f:
+            phrases += [("extra", line.strip()) for line in f if line.strip() and not line.startswith("#")]
+    seen = set()
+    unique = []
+    for source, text in phrases:
+        text = spoken_text(text)
+        if text and text not in seen:
+            seen.add(text)
+            unique.append((source, text))
+    return unique
+
+
+def synthesize(text: str, voice: str, profile, max_retries: int = 3) -> tuple:
+    """Return (audio bytes in the profile's format, seconds) for text, waiting out client-side rate limits."""
+    for attempt in range(max_retries + 1):
+        try:
+            skin_ai._acquire_budget("tts-1-hd")
+            start = time.time()
+            response = skin_ai.client.audio.speech.create(
+                model=skin_ai.TTS_MODEL, voice=voice, input=text, speed=skin_ai.TTS_SPEED,
+                response_format=profile.response_format
+            )
+            return transcode(response.content, profile), time.time() - start
+        except RateLimitExceeded:
+            if attempt == max_retries:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def render_bank(phrases: list, directory: str, voice: str = "alloy", concurrency: int = 4,
+                dry_run: bool = False, profile: str = DEFAULT_PROFILE) -> dict:
+    """Bring the bank in `directory` up to date with `phrases` for one profile; returns counts."""
+    os.makedirs(directory, exist_ok=True)
+    audio_profile = get_profile(profile)
+    bank = AudioBank(directory)
+    wanted = {}
+    for source, text in phrases:
+        key = TTSCache.make_key(text, voice, skin_ai.TTS_MODEL, skin_ai.TTS_SPEED, audio_profile.cache_tag)
+        wanted[key] = {"file": f"{key}.{audio_profile.extension}", "text": text, "source": source,
+                       "voice": voice, "profile": audio_profile.name}
+
+    # Entries of other profiles are left alone
+    own = {key: entry for key, entry in bank.entries.items()
+           if entry.get("profile", DEFAULT_PROFILE) == audio_profile.name}
+    others = {key: entry for key, entry in bank.entries.items() if key not in own}
+    entries = {key: entry for key, entry in own.items()
+               if key in wanted and os.path.isfile(os.path.join(directory, entry["file"]))}
+    todo = [key for key in wanted if key not in entries]
+    stale = [entry for key, entry in own.items() if key not in wanted]
+    counts = {"phrases": len(wanted), "unchanged": len(entries), "rendered": 0,
+              "failed": 0, "removed": len(stale), "seconds": 0.0}
+    print(f"🎙️ Audio bank: {len(wanted)} phrases, {len(entries)} unchanged, "
+          f"{len(todo)} to render, {len(stale)} to remove")
+    if dry_run:
+        for key in todo:
+            print(f"   + {wanted[key]['text'][:80]}")
+        return counts
+
+    lock = threading.Lock()
+
+    def render(key):
+        data, seconds = synthesize(wanted[key]["text"], voice, audio_profile)
+        path = os.path.join(directory, wanted[key]["file"])
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with lock:
+            entries[key] = {**wanted[key], "bytes": len(data), "seconds": round(seconds, 3)}
+            counts["rendered"] += 1
+            counts["seconds"] += seconds
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="prerender") as executor:
+        futures = {executor.submit(render, key): key for key in todo}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"❌ Audio bank: failed to render {wanted[futures[future]]['text'][:60]!r}: {e}")
+
+    for entry in stale:
+        try:
+            os.remove(os.path.join(directory, entry["file"]))
+        except OSError:
+            pass
+    save_manifest(directory, {**others, **entries})
+    counts["seconds"] = round(counts["seconds"], 2)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render product blurbs and fixed phrases to audio.")
+    parser.add_argument("--dir", default=os.getenv("AUDIO_BANK_DIR") or DEFAULT_DIR, help="bank directory")
+    parser.add_argument("--products", default=PRODUCTS_PATH, help="products.json path")
+    parser.add_argument("--phrases", help="extra phrases file, one per line")
+    parser.add_argument("--voice", default="alloy", help="TTS voice")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, choices=sorted(PROFILES), help="output profile")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel syntheses")
+    parser.add_argument("--dry-run", action="store_true", help="only list what would be rendered")
+    args = parser.parse_args()
+
+    if not skin_ai.client and not args.dry_run:
+        parser.error("OpenAI client not initialized (OPENAI_API_KEY)")
+
+    phrases = collect_phrases(args.products, args.phrases)
+    counts = render_bank(phrases, args.dir, voice=args.voice, concurrency=args.concurrency,
+                         dry_run=args.dry_run, profile=args.profile)
+    print(f"✅ Audio bank: {counts['rendered']} rendered ({counts['seconds']}s of synthesis), "
+          f"{counts['unchanged']} unchanged, {counts['removed']} removed, {counts['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Local relevance ranking of the product list offered to analyze().
+
+Each product name is matched against the category key and description from
+products.json. Concern keywords in the question and recent user turns
+(oily, acne, redness, sunscreen, ...) are expanded to their synonyms and scored
+against that text. Only the top-k products go into the prompt, in their
+original relative order, so the verbal-order-matches-card-order rule still holds.
+"""
+
+import json
+import os
+import re
+
+PRODUCTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "products.json")
+
+# Concern -> words that signal it in a question or in a product's key/description
+CONCERN_KEYWORDS = {
+    "oily": ["oily", "oil", "oiliness", "greasy", "shine", "shiny", "sebum", "жирн", "блеск"],
+    "dry": ["dry", "dryness", "flaky", "flaking", "dehydrated", "tight", "moistur", "hydrat", "сух", "шелуш"],
+    "acne": ["acne", "pimple", "pimples", "breakout", "breakouts", "blemish", "zit", "spots", "salicylic", "акне", "прыщ"],
+    "pores": ["pore", "pores", "blackhead", "blackheads", "clogged", "пор", "черные точки"],
+    "sensitive": ["sensitive", "redness", "irritat", "calm", "sooth", "rosacea", "чувствит", "покрасн", "раздраж"],
+    "aging": ["aging", "anti-aging", "wrinkle", "wrinkles", "fine lines", "firm", "retinol", "морщин", "старен"],
+    "sun": ["sun", "sunscreen", "spf", "uv", "sunburn", "mineral", "zinc", "солн"],
+    "cleanse": ["cleanser", "cleanse", "wash", "foaming", "очищ", "умыв"],
+}
+
+# Keywords match at the start of a word, so "moistur" also covers "moisturizing"
+_CONCERN_PATTERNS = {
+    concern: re.compile(r"\b(?:" + "|".join(re.escape(word) for word in words) + ")")
+    for concern, words in CONCERN_KEYWORDS.items()
+}
+
+_catalog = None
+_catalog_mtime = None
+
+
+def _load_catalog() -> dict:
+    """Map lowercase product name -> concerns found in its category key, name and description."""
+    global _catalog, _catalog_mtime
+    try:
+        mtime = os.path.getmtime(PRODUCTS_PATH)
+    except OSError:
+        return {}
+    if _catalog is None or mtime != _catalog_mtime:
+        with open(PRODUCTS_PATH, "r", encoding="utf-8") as f:
+            products = json.load(f)
+        catalog = {}
+        for key, product in products.items():
+            name = product.get("name", "")
+            text = " ".join([key.replace("_", " "), name, product.get("description", "")])
+            catalog[name.lower()] = _concerns(text)
+        _catalog, _catalog_mtime = catalog, mtime
+    return _catalog
+
+
+def _concerns(text: str) -> set:
+    text = text.lower()
+    return {concern for concern, pattern in _CONCERN_PATTERNS.items() if pattern.search(text)}
+
+
+def _words(text: str) -> set:
+    return {w for w in re.findall(r"\w+", text.lower()) if len(w) > 2}
+
+
+def rank_products(products: list, question: str, history: list = None, top_k: int = 8) -> list:
+    """
+    Return at most top_k of `products` most relevant to the question and recent
+    user turns, keeping their original order. Returns the list unchanged when it
+    is already short enough.
+    """
+    if not products or len(products) <= top_k:
+        return list(products or [])
+
+    # The question counts double; recent user turns keep a follow-up ("and for the evening?") on topic
+    recent_user = " ".join(m["content"] for m in (history or [])[-4:] if m.get("role") == "user")
+    question_concerns = _concerns(question)
+    history_concerns = _concerns(recent_user) - question_concerns
+    query_words = _words(question) | _words(recent_user)
+
+    catalog = _load_catalog()
+    scored = []
+    for index, name in enumerate(products):
+        product_concerns = catalog.get(str(name).lower())
+        if product_concerns is None:
+            product_concerns = _concerns(str(name))
+        score = 2 * len(question_concerns & product_concerns) + len(history_concerns & product_concerns)
+        # Direct mentions of the product or its brand beat concern matches
+        score += 3 * len(query_words & _words(str(name)))
+        scored.append((score, index))
+
+    if not any(score for score, _ in scored):
+        return list(products[:top_k])
+
+    best = sorted(scored, key=lambda item: (-item[0], item[1]))[:top_k]
+    keep = sorted(index for _, index in best)
+    return [products[index] for index in keep]
@@ -1,6 +1,9 @@
 # Простейшая база продуктов + логика рекомендаций.
 # Для MVP — несколько примеров. Потом можно расширять.
 
+from collections import deque
+from dataclasses import dataclass
+
 PRODUCTS = {
     "cerave hydrating cleanser": {
         "type": "cleanser",
@@ -29,16 +32,141 @@ PRODUCTS = {
 }
 
 
+@dataclass(frozen=True)
+class ProductMatch:
+    key: str
+    start: int  # смещения в исходном тексте, text[start:end]
+    end: int
+
+
+class ProductMatcher:
+    """
+    Aho–Corasick: автомат строится один раз по всем названиям, затем текст
+    проходится за один проход независимо от размера каталога.
+    Совпадения — подстроки без учёта регистра, как в прежнем `key in text`
+    ("cerave hydrating cleansers" тоже находит "cerave hydrating cleanser");
+    пересечения разрешаются в пользу самого левого, затем самого длинного
+    названия.
+    """
+
+    def __init__(self, names):
+        self.names = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [-1]  # индекс названия (в исходном написании), которое заканчивается в этом узле
+        self._link = [0]  # ближайший суффиксный узел, где заканчивается название
+        for name in names:
+            self._add(name)
+        self._build_links()
+
+    def __len__(self):
+        return len(self.names)
+
+    def _add(self, name: str):
+        if not name:
+            return
+        node = 0
+        for ch in _fold(name):
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(-1)
+                self._link.append(0)
+            node = nxt
+        if self._out[node] < 0:
+            self._out[node] = len(self.names)
+            self.names.append(name)
+
+    def _build_links(self):
+        goto, fail, out, link = self._goto, self._fail, self._out, self._link
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(ch, 0)
+                fail[child] = target if target != child else 0
+                link[child] = target if out[target] >= 0 else link[target]
+
+    def find_all(self, text: str, overlapping: bool = False) -> list:
+        """
+        Все упоминания названий в тексте (ProductMatch по порядку). По
+        умолчанию без пересечений (leftmost-longest); overlapping=True
+        возвращает и вложенные/пересекающиеся совпадения.
+        """
+        goto, fail, out, link, names = self._goto, self._fail, self._out, self._link, self.names
+        found = []
+        state = 0
+        for i, ch in enumerate(text):
+            c = _fold_char(ch)
+            while state and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0)
+            node = state if out[state] >= 0 else link[state]
+            while node:
+                name = names[out[node]]
+                found.append(ProductMatch(name, i + 1 - len(name), i + 1))
+                node = link[node]
+        found.sort(key=lambda m: (m.start, -m.end))
+        if overlapping:
+            return found
+
+        result = []
+        position = 0
+        for match in found:
+            if match.start >= position:
+                result.append(match)
+                position = match.end
+        return result
+
+
+def _fold_char(ch: str) -> str:
+    c = ch.lower()
+    # Символы, которые в нижнем регистре дают два ("İ"), не меняем: смещения
+    # должны совпадать с исходным текстом
+    return c if len(c) == 1 else ch
+
+
+def _fold(text: str) -> str:
+    return "".join(_fold_char(ch) for ch in text)
+
+
+_matcher = None
+
+
+def rebuild_matcher() -> ProductMatcher:
+    """Пересобрать автомат по PRODUCTS; вызывать после любого изменения каталога."""
+    global _matcher
+    _matcher = ProductMatcher(PRODUCTS.keys())
+    return _matcher
+
+
+def get_matcher() -> ProductMatcher:
+    """Автомат по PRODUCTS, собранный при импорте (см. rebuild_matcher)."""
+    return _matcher
+
+
+rebuild_matcher()
+
+
+def find_products(text: str) -> list:
+    """Все продукты из PRODUCTS, упомянутые в тексте, со смещениями."""
+    return get_matcher().find_all(text or "")
+
+
 def recognize_product_from_text(text: str):
     """
-    Очень простой матчинг: ищем ключ по подстроке.
-    В реальном продукте можно сделать более умный поиск.
+    Первый (самый левый, при пересечении — самый длинный) продукт из
+    PRODUCTS, упомянутый в тексте, или None.
     """
-    t = text.lower()
-    for key in PRODUCTS.keys():
-        if key in t:
-            return key
-    return None
+    matches = find_products(text)
+    return matches[0].key if matches else None
 
 
 def recommend_product_usage(product_key: str, skin_state: dict) -> str:
@@ -0,0 +1,296 @@
+"""
+Latency-aware provider routing for the vision analysis calls.
+
+Each provider keeps a rolling EWMA of its latency and error rate. The router
+orders providers so that the fastest healthy one is tried first, falls back to
+the next one on failure, and can optionally "hedge": fire the second provider
+after a delay and keep whichever answers first. The error rate decays back
+toward healthy while a provider is not being called, so a provider that was
+marked unhealthy gets tried again instead of staying last for good.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class ProviderStats:
+    """Rolling latency / error-rate estimate for one provider."""
+
+    def __init__(self, name: str, alpha: float = 0.3, window: int = 200, recovery_half_life: float = 60.0):
+        self.name = name
+        self.alpha = alpha
+        self.recovery_half_life = recovery_half_life
+        self.latency_ewma = None
+        self.error_ewma = 0.0
+        self.updated_at = None
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0
+        self.samples = deque(maxlen=window)
+
+    def record(self, latency: float, ok: bool):
+        self.calls += 1
+        if not ok:
+            self.errors += 1
+        if ok:
+            # Only successful calls say anything about how fast a provider answers;
+            # failures often return instantly (auth errors) or hit the full timeout.
+            self.samples.append(latency)
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma = self.alpha * latency + (1 - self.alpha) * self.latency_ewma
+        self.error_ewma = self.alpha * (0.0 if ok else 1.0) + (1 - self.alpha) * self.error_rate()
+        self.updated_at = time.time()
+
+    def error_rate(self, now: float = None) -> float:
+        """Error EWMA, halved every `recovery_half_life` seconds since the last call."""
+        if self.updated_at is None or not self.recovery_half_life:
+            return self.error_ewma
+        idle = max(0.0, (now if now is not None else time.time()) - self.updated_at)
+        return self.error_ewma * 0.5 ** (idle / self.recovery_half_life)
+
+    def percentile(self, q: float):
+        """Latency percentile (0-100) over the recent successful calls, None without data."""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def as_dict(self) -> dict:
+        def rounded(value):
+            return round(value, 3) if value is not None else None
+
+        return {
+            "latency_ewma": rounded(self.latency_ewma),
+            "p50": rounded(self.percentile(50)),
+            "p95": rounded(self.percentile(95)),
+            "p99": rounded(self.percentile(99)),
+            "error_rate": round(self.error_rate(), 3),
+            "calls": self.calls,
+            "errors": self.errors,
+            "wins": self.wins,
+        }
+
+
+class ProviderRouter:
+    """
+    Picks the fastest healthy provider for a call.
+
+    Providers are passed to run() as an ordered dict of name -> zero-argument
+    callable; the order is the static preference used until there is data.
+    """
+
+    def __init__(self, name: str, error_threshold: float = 0.5, alpha: float = 0.3,
+                 hedge: bool = False, hedge_delay: float = 3.0, hedge_percentile: float = None,
+                 history_size: int = 100, prior_latency: float = 3.0, recovery_half_life: float = 60.0):
+        self.name = name
+        self.error_threshold = error_threshold
+        self.alpha = alpha
+        # Latency assumed for a provider without successful calls yet
+        self.prior_latency = prior_latency
+        self.recovery_half_life = recovery_half_life
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        # When set, hedge once the primary runs past this percentile of its own recent
+        # latency (e.g. 95) instead of after the fixed hedge_delay
+        self.hedge_percentile = hedge_percentile
+        self.runs = 0
+        self.stats = {}
+        self.history = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # -------------------- STATS --------------------
+
+    def _stats_for(self, provider: str) -> ProviderStats:
+        with self._lock:
+            if provider not in self.stats:
+                self.stats[provider] = ProviderStats(provider, alpha=self.alpha,
+                                                     recovery_half_life=self.recovery_half_life)
+            return self.stats[provider]
+
+    def _record(self, provider: str, latency: float, ok: bool):
+        stats = self._stats_for(provider)
+        with self._lock:
+            stats.record(latency, ok)
+
+    def order(self, providers, hedge: bool = False) -> list:
+        """
+        Return provider names, fastest healthy first, unhealthy last.
+
+        Providers without a successful call rank at `prior_latency`, so a new one
+        is tried before a proven slow provider but not before a proven fast one.
+        With hedging, never-called providers go after the measured ones: the
+        first-listed provider stays primary and the others are measured as the
+        hedge, instead of taking over the primary slot untested.
+        """
+        names = list(providers)
+        now = time.time()
+
+        def sort_key(item):
+            index, name = item
+            stats = self._stats_for(name)
+            unhealthy = stats.error_rate(now) >= self.error_threshold
+            unmeasured = stats.calls == 0
+            latency = stats.latency_ewma if stats.latency_ewma is not None else self.prior_latency
+            return (unhealthy, unmeasured and hedge, latency, index)
+
+        return [name for _, name in sorted(enumerate(names), key=sort_key)]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snapshot = {name: stats.as_dict() for name, stats in self.stats.items()}
+            for entry in snapshot.values():
+                entry["win_rate"] = round(entry["wins"] / self.runs, 3) if self.runs else 0.0
+            return snapshot
+
+    def summary_line(self) -> str:
+        """One-line per-provider win rate and tail latency report."""
+        def seconds(value):
+            return "n/a" if value is None else f"{value}s"
+
+        parts = []
+        for name, entry in self.snapshot().items():
+            parts.append(f"{name} wins {entry['win_rate'] * 100:.0f}% "
+                         f"p50={seconds(entry['p50'])} p95={seconds(entry['p95'])} p99={seconds(entry['p99'])}")
+        return f"{self.name}: " + " | ".join(parts)
+
+    def hedge_delay_for(self, provider: str, min_samples: int = 10) -> float:
+        """Seconds to give the primary before firing the hedge request."""
+        if self.hedge_percentile is None:
+            return self.hedge_delay
+        stats = self._stats_for(provider)
+        with self._lock:
+            if len(stats.samples) < min_samples:
+                return self.hedge_delay
+            return stats.percentile(self.hedge_percentile)
+
+    def last_record(self):
+        """Route record of the most recent run() on the calling thread."""
+        return getattr(self._local, "record", None)
+
+    # -------------------- CALLS --------------------
+
+    def _timed(self, provider: str, fn):
+        start = time.time()
+        try:
+            result = fn()
+        except Exception:
+            self._record(provider, time.time() - start, ok=False)
+            raise
+        self._record(provider, time.time() - start, ok=True)
+        return result
+
+    def run(self, providers: dict, hedge: bool = None):
+        """
+        Call providers until one succeeds and return its result.
+
+        Raises the last provider error when every provider fails.
+        """
+        if not providers:
+            raise RuntimeError(f"{self.name}: no providers available")
+
+        hedge = self.hedge if hedge is None else hedge
+        order = self.order(providers, hedge=hedge)
+        record = {
+            "router": self.name,
+            "order": order,
+            "chosen": order[0],
+            "hedged": bool(hedge and len(order) > 1),
+            "hedge_fired": False,
+            "winner": None,
+            "outcome": None,
+            "errors": {},
+        }
+        start = time.time()
+        try:
+            if record["hedged"]:
+                return self._run_hedged(providers, order, record)
+            return self._run_sequential(providers, order, record)
+        finally:
+            record["latency"] = round(time.time() - start, 3)
+            self._local.record = record
+            with self._lock:
+                self.history.append(record)
+                self.runs += 1
+                if record["winner"] is not None:
+                    self.stats[record["winner"]].wins += 1
+            print(f"🧭 {self.name}: chosen={record['chosen']} winner={record['winner']} "
+                  f"outcome={record['outcome']} latency={record['latency']}s")
+
+    def _run_sequential(self, providers, order, record):
+        last_error = None
+        for name in order:
+            try:
+                result = self._timed(name, providers[name])
+            except Exception as e:
+                print(f"❌ {self.name}: {name} failed: {e}")
+                record["errors"][name] = str(e)
+                last_error = e
+                continue
+            record["winner"] = name
+            record["outcome"] = "primary" if name == order[0] else "fallback"
+            return result
+        record["outcome"] = "error"
+        raise last_error
+
+    def _run_hedged(self, providers, order, record):
+        primary, secondary = order[0], order[1]
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"{self.name}-hedge")
+        futures = {executor.submit(self._timed, primary, providers[primary]): primary}
+        try:
+            record["hedge_delay"] = round(self.hedge_delay_for(primary), 3)
+            done, _ = wait(futures, timeout=record["hedge_delay"])
+            primary_failed = bool(done) and next(iter(done)).exception() is not None
+            if not done or primary_failed:
+                record["hedge_fired"] = True
+                futures[executor.submit(self._timed, secondary, providers[secondary])] = secondary
+
+            last_error = None
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = futures[future]
+                    error = future.exception()
+                    if error is not None:
+                        print(f"❌ {self.name}: {name} failed: {error}")
+                        record["errors"][name] = str(error)
+                        last_error = error
+                        continue
+                    # Winner found: drop the loser. A request already in flight can't be
+                    # aborted from here, so its thread finishes in the background and the
+                    # result is discarded; a request not yet started is cancelled outright.
+                    for loser in pending:
+                        loser.cancel()
+                    record["winner"] = name
+                    if not record["hedge_fired"]:
+                        record["outcome"] = "primary"
+                    elif name == primary:
+                        record["outcome"] = "hedge_lost"
+                    else:
+                        record["outcome"] = "hedge_won"
+                    return future.result()
+            record["outcome"] = "error"
+            raise last_error
+        finally:
+            executor.shutdown(wait=False)
+
+
+def router_from_env(name: str, prefix: str, hedge_percentile: float = None) -> ProviderRouter:
+    """Build a router configured from <PREFIX>_HEDGE / _HEDGE_DELAY / _HEDGE_PERCENTILE."""
+    hedge = os.getenv(f"{prefix}_HEDGE", "0").strip().lower() in ("1", "true", "yes")
+    try:
+        hedge_delay = float(os.getenv(f"{prefix}_HEDGE_DELAY", "3.0"))
+    except ValueError:
+        hedge_delay = 3.0
+    try:
+        hedge_percentile = float(os.getenv(f"{prefix}_HEDGE_PERCENTILE", hedge_percentile or 0)) or None
+    except ValueError:
+        pass
+    return ProviderRouter(name, hedge=hedge, hedge_delay=hedge_delay, hedge_percentile=hedge_percentile)
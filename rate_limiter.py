@@ -0,0 +1,167 @@
+"""
+Client-side rate limiting for the provider APIs.
+"""
+
+import os
+import struct
+import tempfile
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`.
+
+    acquire() blocks until the tokens are available, or returns False when they
+    can't be had within `timeout` seconds.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+        self.denied = 0
+
+    @classmethod
+    def per_minute(cls, per_minute: float, burst: float = None):
+        return cls(per_minute / 60.0, burst if burst is not None else max(1.0, per_minute / 60.0))
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0, timeout: float = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait_for = (tokens - self._tokens) / self.rate if self.rate > 0 else float("inf")
+                if deadline is not None and now + wait_for > deadline:
+                    self.denied += 1
+                    return False
+            time.sleep(min(wait_for, 1.0))
+            with self._lock:
+                self.waited += min(wait_for, 1.0)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call can't get rate-limit budget within its wait allowance."""
+
+
+# -------------------- CROSS-PROCESS LIMITER --------------------
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# requests tokens, requests updated-at, LLM tokens, LLM tokens updated-at
+_STATE = struct.Struct("<dddd")
+
+
+class SharedRateLimiter:
+    """
+    Requests-per-minute + tokens-per-minute limiter shared by every process on the host.
+
+    Both buckets live in a small state file guarded by flock(), so all Flask
+    workers (and batch jobs) calling the same provider draw from one budget.
+    acquire() waits when the budget refills within `timeout`, and returns False
+    straight away when it won't. Without fcntl (Windows) the limiter falls back
+    to per-process TokenBuckets. rpm or tpm of 0/None leaves that budget unlimited.
+    """
+
+    def __init__(self, name: str, rpm: float, tpm: float = None, state_dir: str = None):
+        self.name = name
+        self.rpm = float(rpm) if rpm and rpm > 0 else None
+        self.tpm = float(tpm) if tpm and tpm > 0 else None
+        state_dir = state_dir or os.getenv("RATE_LIMIT_DIR") or tempfile.gettempdir()
+        self.path = os.path.join(state_dir, f"runova-ratelimit-{name}.state")
+        self.stats = {"granted": 0, "denied": 0, "waited_seconds": 0.0}
+        self._stats_lock = threading.Lock()
+        self._local_requests = TokenBucket.per_minute(self.rpm) if self.rpm else None
+        self._local_tokens = TokenBucket.per_minute(self.tpm, burst=self.tpm) if self.tpm else None
+
+    def _count(self, key: str, amount: float = 1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _try_take(self, tokens: float) -> float:
+        """Take the budget if available and return 0, else return the seconds to wait."""
+        with open(self.path, "a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read(_STATE.size)
+                now = time.time()
+                if len(raw) == _STATE.size:
+                    req, req_at, tok, tok_at = _STATE.unpack(raw)
+                else:
+                    # Burst of one second's worth of requests, a full minute of tokens
+                    req, req_at, tok, tok_at = max(1.0, (self.rpm or 0.0) / 60.0), now, self.tpm or 0.0, now
+                # A bucket this process doesn't limit is written back untouched, so a
+                # process configured without it doesn't throw away another's refill
+                wait_for = 0.0
+                if self.rpm:
+                    burst = max(1.0, self.rpm / 60.0)
+                    req, req_at = min(burst, req + (now - req_at) * self.rpm / 60.0), now
+                    wait_for = max(0.0, (1.0 - req) * 60.0 / self.rpm)
+                if self.tpm:
+                    tok, tok_at = min(self.tpm, tok + (now - tok_at) * self.tpm / 60.0), now
+                    wanted = min(tokens, self.tpm)
+                    wait_for = max(wait_for, (wanted - tok) * 60.0 / self.tpm)
+                if wait_for <= 0:
+                    if self.rpm:
+                        req -= 1.0
+                    if self.tpm:
+                        tok -= min(tokens, self.tpm)
+                f.seek(0)
+                f.truncate()
+                f.write(_STATE.pack(req, req_at, tok, tok_at))
+                f.flush()
+                return wait_for
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def acquire(self, tokens: float = 0, timeout: float = 2.0) -> bool:
+        """Reserve one request plus `tokens` LLM tokens, waiting at most `timeout` seconds."""
+        if not self.rpm and not self.tpm:
+            self._count("granted")
+            return True
+        if not FCNTL_AVAILABLE:
+            granted = self._local_requests is None or self._local_requests.acquire(1.0, timeout=timeout)
+            if granted and self._local_tokens is not None:
+                granted = self._local_tokens.acquire(min(tokens, self.tpm), timeout=timeout)
+            self._count("granted" if granted else "denied")
+            return granted
+
+        deadline = time.time() + (timeout or 0.0)
+        while True:
+            wait_for = self._try_take(tokens)
+            if wait_for <= 0:
+                self._count("granted")
+                return True
+            if time.time() + wait_for > deadline:
+                self._count("denied")
+                print(f"⛔ {self.name}: rate limit budget exhausted (needs {wait_for:.1f}s)")
+                return False
+            time.sleep(wait_for)
+            self._count("waited_seconds", wait_for)
+
+
+def limiter_from_env(name: str, prefix: str, rpm: float, tpm: float = None) -> SharedRateLimiter:
+    """Build a shared limiter configured from <PREFIX>_RPM / <PREFIX>_TPM (0 disables TPM)."""
+    try:
+        rpm = float(os.getenv(f"{prefix}_RPM", rpm))
+        tpm = float(os.getenv(f"{prefix}_TPM", tpm or 0)) or None
+    except ValueError:
+        pass
+    return SharedRateLimiter(name, rpm=rpm, tpm=tpm)
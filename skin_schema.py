@@ -0,0 +1,164 @@
+"""
+Machine-readable skin analysis result.
+
+SKIN_METRICS_SCHEMA is the JSON schema the vision providers are asked to fill
+(strict-mode compatible: every property required, no extra properties).
+parse_skin_metrics() validates a provider reply without another LLM round trip
+and returns a compact SkinMetrics.
+"""
+
+import json
+from dataclasses import asdict, dataclass, field
+from typing import List
+
+SKIN_TYPES = ["dry", "oily", "combination", "normal"]
+REGIONS = ["forehead", "nose", "left_cheek", "right_cheek", "chin", "around_mouth", "under_eyes"]
+CONCERNS = ["acne", "blackheads", "redness", "dryness", "oiliness", "enlarged_pores", "texture", "pigmentation"]
+
+# 0-100 severity scores (0 = none, 100 = severe). Ranges are stated in the prompt and
+# enforced by validate_skin_metrics(): strict structured-output modes reject
+# minimum/maximum keywords.
+SCORE_FIELDS = ["acne", "redness", "dryness", "oiliness", "pores", "texture", "pigmentation"]
+
+_SCORE = {"type": "integer"}
+
+SKIN_METRICS_SCHEMA = {
+    "type": "object",
+    "additionalProperties": False,
+    "required": ["skin_type", "acne_count", "blackhead_count", "barrier_ok", "scores", "regions", "summary"],
+    "properties": {
+        "skin_type": {"type": "string", "enum": SKIN_TYPES},
+        "acne_count": {"type": "integer"},
+        "blackhead_count": {"type": "integer"},
+        "barrier_ok": {"type": "boolean"},
+        "scores": {
+            "type": "object",
+            "additionalProperties": False,
+            "required": SCORE_FIELDS,
+            "properties": {name: _SCORE for name in SCORE_FIELDS},
+        },
+        "regions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "additionalProperties": False,
+                "required": ["region", "concerns", "severity"],
+                "properties": {
+                    "region": {"type": "string", "enum": REGIONS},
+                    "concerns": {"type": "array", "items": {"type": "string", "enum": CONCERNS}},
+                    "severity": _SCORE,
+                },
+            },
+        },
+        "summary": {"type": "string"},
+    },
+}
+
+
+@dataclass
+class RegionFinding:
+    region: str
+    concerns: List[str]
+    severity: int
+
+
+@dataclass
+class SkinMetrics:
+    skin_type: str
+    acne_count: int
+    blackhead_count: int
+    barrier_ok: bool
+    scores: dict
+    regions: List[RegionFinding] = field(default_factory=list)
+    summary: str = ""
+
+    def to_skin_state(self) -> dict:
+        """The skin_state dict product_scanner.recommend_product_usage expects."""
+        return {
+            "redness": float(self.scores["redness"]),
+            "acne": float(self.scores["acne"]),
+            "barrier_ok": self.barrier_ok,
+        }
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SkinMetrics":
+        return validate_skin_metrics(data)
+
+
+def _int(value, name: str, low: int = 0, high: int = None) -> int:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{name} must be a number, got {value!r}")
+    value = int(round(value))
+    if value < low:
+        value = low
+    if high is not None and value > high:
+        value = high
+    return value
+
+
+def validate_skin_metrics(data: dict) -> SkinMetrics:
+    """Check a decoded reply against the schema; clamps scores, raises ValueError on bad shape."""
+    if not isinstance(data, dict):
+        raise ValueError("skin metrics must be a JSON object")
+    missing = [key for key in SKIN_METRICS_SCHEMA["required"] if key not in data]
+    if missing:
+        raise ValueError(f"skin metrics missing {missing}")
+
+    skin_type = str(data["skin_type"]).lower()
+    if skin_type not in SKIN_TYPES:
+        raise ValueError(f"unknown skin_type {skin_type!r}")
+    if not isinstance(data["barrier_ok"], bool):
+        raise ValueError("barrier_ok must be a boolean")
+
+    raw_scores = data["scores"]
+    if not isinstance(raw_scores, dict):
+        raise ValueError("scores must be an object")
+    scores = {}
+    for name in SCORE_FIELDS:
+        if name not in raw_scores:
+            raise ValueError(f"scores missing {name!r}")
+        scores[name] = _int(raw_scores[name], f"scores.{name}", 0, 100)
+
+    raw_regions = data["regions"] or []
+    if not isinstance(raw_regions, list):
+        raise ValueError("regions must be an array")
+    regions = []
+    for item in raw_regions:
+        if not isinstance(item, dict):
+            raise ValueError(f"regions items must be objects, got {item!r}")
+        region = str(item.get("region", "")).lower()
+        if region not in REGIONS:
+            # Unknown region names are dropped rather than failing the whole result
+            continue
+        raw_concerns = item.get("concerns") or []
+        if not isinstance(raw_concerns, list):
+            raise ValueError(f"regions.{region}.concerns must be an array")
+        concerns = [c for c in raw_concerns if c in CONCERNS]
+        regions.append(RegionFinding(region, concerns, _int(item.get("severity", 0), "severity", 0, 100)))
+
+    return SkinMetrics(
+        skin_type=skin_type,
+        acne_count=_int(data["acne_count"], "acne_count"),
+        blackhead_count=_int(data["blackhead_count"], "blackhead_count"),
+        barrier_ok=data["barrier_ok"],
+        scores=scores,
+        regions=regions,
+        summary=str(data["summary"]).strip(),
+    )
+
+
+def parse_skin_metrics(text: str) -> SkinMetrics:
+    """Decode a provider reply (optionally wrapped in a ```json fence) into SkinMetrics."""
+    text = (text or "").strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        if text.startswith("json"):
+            text = text[4:]
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f"skin metrics reply is not JSON: {e}")
+    return validate_skin_metrics(data)
@@ -0,0 +1,71 @@
+import os
+
+from analysis_cache import AnalysisCache, prompt_version
+
+
+def prompt_a():
+    return "Analyze this skin image."
+
+
+def prompt_b():
+    return "Analyze this skin image in detail."
+
+
+def test_key_depends_on_image_language_and_version():
+    key = AnalysisCache.make_key(b"image", "en", "v1")
+    assert key == AnalysisCache.make_key(b"image", "en", "v1")
+    assert key != AnalysisCache.make_key(b"other", "en", "v1")
+    assert key != AnalysisCache.make_key(b"image", "ru", "v1")
+    assert key != AnalysisCache.make_key(b"image", "en", "v2")
+
+
+def test_prompt_version_changes_with_prompt_text():
+    assert prompt_version(prompt_a) == prompt_version(prompt_a)
+    assert prompt_version(prompt_a) != prompt_version(prompt_b)
+    assert prompt_version(prompt_a, extra="tile=768") != prompt_version(prompt_a, extra="tile=512")
+
+
+def test_prompt_version_sees_nested_constants():
+    def outer():
+        def inner():
+            return "nested prompt"
+        return inner
+
+    def outer_edited():
+        def inner():
+            return "nested prompt, edited"
+        return inner
+
+    outer_edited.__name__ = "outer"
+    assert prompt_version(outer) != prompt_version(outer_edited)
+
+
+def test_new_prompt_version_misses_old_entries():
+    cache = AnalysisCache()
+    cache.put(AnalysisCache.make_key(b"image", "en", prompt_version(prompt_a)), "oily skin", provider="gemini")
+    assert cache.get(AnalysisCache.make_key(b"image", "en", prompt_version(prompt_a)))["result"] == "oily skin"
+    assert cache.get(AnalysisCache.make_key(b"image", "en", prompt_version(prompt_b))) is None
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = AnalysisCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a")["result"] == 1
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    AnalysisCache(disk_dir=str(tmp_path)).put("key", "dry skin", provider="gpt-4o")
+    entry = AnalysisCache(disk_dir=str(tmp_path)).get("key")
+    assert entry["result"] == "dry skin" and entry["provider"] == "gpt-4o"
+
+
+def test_disk_tier_is_trimmed_to_budget(tmp_path):
+    cache = AnalysisCache(disk_dir=str(tmp_path), disk_max_entries=3)
+    for i in range(6):
+        cache.put(f"key{i}", i)
+    assert len([n for n in os.listdir(tmp_path) if n.endswith(".json")]) == 3
@@ -0,0 +1,24 @@
+from audio_bank import FIXED_PHRASES, AudioBank, save_manifest, spoken_text
+from tts_cache import TTSCache
+
+
+def test_spoken_text_drops_arrows_and_emoji():
+    assert spoken_text("Turn your head left →") == "Turn your head left"
+    assert spoken_text("Look up ↑") == "Look up"
+    assert spoken_text("Great skin ✨  today") == "Great skin today"
+
+
+def test_spoken_text_keeps_ascii_symbols_and_punctuation():
+    assert spoken_text("Effaclar Duo+ 2% (40 ml).") == "Effaclar Duo+ 2% (40 ml)."
+
+
+def test_ui_strings_hit_the_prerendered_clip(tmp_path):
+    entries = {}
+    for text in FIXED_PHRASES:
+        key = TTSCache.make_key(spoken_text(text), "alloy", "tts-1-hd", 1.0, "mp3")
+        entries[key] = {"file": f"{key}.mp3", "text": spoken_text(text)}
+    save_manifest(str(tmp_path), entries)
+    bank = AudioBank(str(tmp_path))
+    for ui_text in ("Turn your head left →", "Turn your head right ←", "Look up ↑", "Look straight ahead"):
+        assert bank.lookup(ui_text, "alloy", "tts-1-hd", 1.0, "mp3") is not None
+    assert bank.lookup("Something else", "alloy", "tts-1-hd", 1.0, "mp3") is None
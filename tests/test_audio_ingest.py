@@ -0,0 +1,172 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import audio_ingest
+from audio_ingest import AudioUpload, ChunkPipe, UploadError, transcribe_upload
+
+BOUNDARY = "----runova-test"
+
+
+def multipart(parts):
+    """parts: (name, filename or None, content type or None, bytes)."""
+    body = b""
+    for name, filename, content_type, data in parts:
+        body += f"--{BOUNDARY}\r\n".encode()
+        disposition = f'form-data; name="{name}"'
+        if filename:
+            disposition += f'; filename="{filename}"'
+        body += f"Content-Disposition: {disposition}\r\n".encode()
+        if content_type:
+            body += f"Content-Type: {content_type}\r\n".encode()
+        body += b"\r\n" + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+MULTIPART = {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+
+
+class TrickleStream:
+    """A request body that arrives a few bytes at a time."""
+
+    def __init__(self, data, step=1000):
+        self.data, self.step, self.position = data, step, 0
+
+    def read(self, size):
+        chunk = self.data[self.position:self.position + min(size, self.step)]
+        self.position += len(chunk)
+        return chunk
+
+
+def reader(seen):
+    def transcribe(audio, filename, content_type):
+        chunks = []
+        while True:
+            chunk = audio.read(4096)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        seen.update(filename=filename, content_type=content_type, data=b"".join(chunks))
+        return "hello skin"
+    return transcribe
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+
+def test_multipart_audio_and_fields(executor):
+    audio = os.urandom(300 * 1024)
+    body = multipart([("language", None, None, b"ru"),
+                      ("audio", "clip.ogg", "audio/ogg", audio),
+                      ("user_id", None, None, b"u-7")])
+    upload = AudioUpload(TrickleStream(body, step=7000), MULTIPART).open()
+    assert (upload.filename, upload.content_type) == ("clip.ogg", "audio/ogg")
+    # Fields before the file are known as soon as the audio starts
+    assert upload.form() == {"language": "ru"}
+
+    seen = {}
+    assert transcribe_upload(upload, reader(seen), executor) == "hello skin"
+    assert seen["data"] == audio
+    assert seen["content_type"] == "audio/ogg"
+    # Trailing fields are collected after the audio
+    assert upload.form() == {"language": "ru", "user_id": "u-7"}
+    assert upload.bytes_read == len(body)
+
+
+def test_raw_audio_body(executor):
+    audio = os.urandom(200 * 1024)
+    upload = AudioUpload(TrickleStream(audio), {"Content-Type": "audio/webm; codecs=opus"}).open()
+    assert upload.filename == "voice.webm"
+    seen = {}
+    transcribe_upload(upload, reader(seen), executor)
+    assert seen["data"] == audio
+    assert upload.form() == {}
+
+
+def test_unsupported_content_type_is_415():
+    with pytest.raises(UploadError) as error:
+        AudioUpload(io.BytesIO(b"hi"), {"Content-Type": "text/plain"})
+    assert error.value.status == 415
+
+
+def test_multipart_without_audio_part():
+    body = multipart([("other", "notes.txt", "text/plain", b"abc")])
+    with pytest.raises(UploadError) as error:
+        AudioUpload(io.BytesIO(body), MULTIPART).open()
+    assert error.value.status == 400
+    with pytest.raises(UploadError):
+        AudioUpload(io.BytesIO(b""), {"Content-Type": "multipart/form-data"})
+
+
+def test_oversized_raw_body_is_413_and_the_reader_fails(executor):
+    upload = AudioUpload(TrickleStream(b"x" * 300_000, step=64 * 1024), {"Content-Type": "audio/webm"},
+                         max_bytes=100_000).open()
+    failed = threading.Event()
+
+    def transcribe(audio, filename, content_type):
+        try:
+            while audio.read(4096):
+                pass
+        except IOError:
+            failed.set()
+            raise
+
+    with pytest.raises(UploadError) as error:
+        transcribe_upload(upload, transcribe, executor)
+    assert error.value.status == 413
+    assert failed.wait(2)
+
+
+def test_oversized_multipart_file_and_field_are_413(executor):
+    body = multipart([("audio", "clip.webm", "audio/webm", b"x" * 300_000)])
+    upload = AudioUpload(io.BytesIO(body), MULTIPART, max_bytes=100_000).open()
+    with pytest.raises(UploadError) as error:
+        transcribe_upload(upload, reader({}), executor)
+    assert error.value.status == 413
+
+    body = multipart([("audio", "clip.webm", "audio/webm", b"x"),
+                      ("note", None, None, b"y" * (audio_ingest.MAX_FIELD_BYTES + 1))])
+    upload = AudioUpload(io.BytesIO(body), MULTIPART).open()
+    with pytest.raises(UploadError) as error:
+        list(upload.chunks())
+    assert error.value.status == 413
+
+
+def test_pipe_backpressure_waits_for_a_queued_reader():
+    pipe = ChunkPipe(max_chunks=1, timeout=0.2)
+    pipe.write(b"a")
+    # No reader has started: the writer waits instead of timing out
+    writer = threading.Thread(target=pipe.write, args=(b"b",), daemon=True)
+    writer.start()
+    writer.join(0.5)
+    assert writer.is_alive()
+    pipe.start()
+    assert pipe.read(1) == b"a"
+    writer.join(1)
+    assert not writer.is_alive()
+    assert pipe.read(1) == b"b"
+    pipe.close()
+    assert pipe.read() == b""
+
+
+def test_pipe_write_times_out_once_the_reader_stalls():
+    pipe = ChunkPipe(max_chunks=1, timeout=0.2)
+    pipe.start()
+    pipe.write(b"a")
+    with pytest.raises(UploadError) as error:
+        pipe.write(b"b")
+    assert error.value.status == 504
+
+
+def test_truncated_multipart_body_fails_the_reader_with_400(executor):
+    body = multipart([("audio", "clip.webm", "audio/webm", b"x" * 5000)])[:-200]
+    upload = AudioUpload(io.BytesIO(body), MULTIPART).open()
+    with pytest.raises(UploadError) as error:
+        transcribe_upload(upload, reader({}), executor)
+    assert error.value.status == 400
@@ -0,0 +1,41 @@
+from audio_profiles import DEFAULT_PROFILE, PROFILES, get_profile, profile_for_extension, select_profile
+
+IPHONE = "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 Version/17.0 Safari/604.1"
+ANDROID = "Mozilla/5.0 (Linux; Android 14) AppleWebKit/537.36 Chrome/120.0 Mobile Safari/537.36"
+
+
+def test_default_is_hd():
+    assert select_profile({}).name == DEFAULT_PROFILE
+
+
+def test_explicit_profile_wins_over_hints():
+    assert select_profile({"Save-Data": "on"}, "HD").name == "hd"
+    assert select_profile({}, "mobile-aac").name == "mobile-aac"
+
+
+def test_unknown_explicit_profile_falls_back_to_hints():
+    assert select_profile({"Save-Data": "on", "User-Agent": ANDROID}, "ultra").name == "mobile"
+
+
+def test_save_data_or_slow_network_selects_mobile():
+    assert select_profile({"Save-Data": "on", "User-Agent": ANDROID}).name == "mobile"
+    assert select_profile({"ECT": "3g", "User-Agent": ANDROID}).name == "mobile"
+    assert select_profile({"Downlink": "0.8", "User-Agent": ANDROID}).name == "mobile"
+
+
+def test_fast_network_stays_hd():
+    assert select_profile({"ECT": "4g", "Downlink": "10"}).name == "hd"
+    assert select_profile({"Downlink": "not-a-number"}).name == "hd"
+
+
+def test_apple_without_ogg_gets_aac():
+    assert select_profile({"Save-Data": "on", "User-Agent": IPHONE}).name == "mobile-aac"
+    headers = {"Save-Data": "on", "User-Agent": IPHONE, "Accept": "audio/ogg, audio/*"}
+    assert select_profile(headers).name == "mobile"
+
+
+def test_get_profile_and_extension_lookup():
+    assert get_profile(None) is PROFILES[DEFAULT_PROFILE]
+    assert get_profile("Mobile") is PROFILES["mobile"]
+    assert profile_for_extension("OGG") == "mobile"
+    assert profile_for_extension("wav") is None
@@ -0,0 +1,69 @@
+import os
+import time
+
+from audio_store import AudioStore
+from tts_cache import TTSCache
+
+
+def age(store, filename, seconds):
+    path = store.path(filename)
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_write_is_visible_to_another_worker(tmp_path):
+    first, second = AudioStore(str(tmp_path)), AudioStore(str(tmp_path))
+    first.write("clip.mp3", b"x" * 10)
+    assert second.exists("clip.mp3")
+    first.remove("clip.mp3")
+    assert not second.exists("clip.mp3")
+
+
+def test_sweep_evicts_least_recently_served_across_workers(tmp_path):
+    first = AudioStore(str(tmp_path), max_bytes=25)
+    second = AudioStore(str(tmp_path), max_bytes=25)
+    for name in ("a.mp3", "b.mp3", "c.mp3"):
+        first.write(name, b"x" * 10)
+        age(first, name, 100)
+    # Served by the other worker only
+    second.mark_served("a.mp3")
+    assert first.sweep() == 1
+    assert first.exists("a.mp3")
+    assert not first.exists("b.mp3")
+    assert first.exists("c.mp3")
+
+
+def test_sweep_picks_up_files_written_by_other_workers(tmp_path):
+    sweeper = AudioStore(str(tmp_path), max_age=60)
+    other = AudioStore(str(tmp_path))
+    other.write("old.mp3", b"x")
+    age(other, "old.mp3", 3600)
+    assert sweeper.sweep() == 1
+    assert sweeper.metrics()["expired"] == 1
+
+
+def test_cache_miss_after_another_worker_swept_the_file(tmp_path):
+    store = AudioStore(str(tmp_path))
+    cache = TTSCache(store=store)
+    key = TTSCache.make_key("Hello", "nova", "tts-1-hd")
+    filename = cache.put(key, b"audio")
+    AudioStore(str(tmp_path)).remove(filename)
+    assert cache.get(key) is None
+
+
+def test_cache_index_merges_entries_from_other_workers(tmp_path):
+    first, second = TTSCache(str(tmp_path)), TTSCache(str(tmp_path))
+    first.put("a", b"1")
+    second.put("b", b"2")
+    first.put("c", b"3")
+    entries = TTSCache(str(tmp_path))._entries
+    assert set(entries) == {"a", "b", "c"}
+    assert first.get("b") == "b.mp3"
+
+
+def test_cache_eviction_is_not_undone_by_the_merge(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=10)
+    cache.put("a", b"x" * 6)
+    cache.put("b", b"x" * 6)
+    assert set(TTSCache(str(tmp_path))._entries) == {"b"}
+    assert not os.path.exists(os.path.join(str(tmp_path), "a.mp3"))
@@ -0,0 +1,58 @@
+import time
+
+from conversation_memory import ConversationMemory
+
+
+def wait_idle(memory, user_id):
+    deadline = time.time() + 5
+    while memory._user(user_id).summarizing and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def long_answer(i):
+    return f"answer {i} " + "word " * 60
+
+
+def test_old_turns_are_folded_into_the_summary():
+    memory = ConversationMemory(lambda previous, messages: f"{len(messages)} messages summarized",
+                                token_budget=120, min_recent=1)
+    for i in range(4):
+        memory.append("u", f"question {i}", long_answer(i))
+        wait_idle(memory, "u")
+    messages = memory.context_messages("u")
+    assert messages[0]["role"] == "system"
+    assert "summarized" in messages[0]["content"]
+    assert messages[-1]["content"] == long_answer(3)
+
+
+def test_failed_summary_keeps_turns_for_retry():
+    calls = []
+
+    def summarize(previous, messages):
+        calls.append(len(messages))
+        if len(calls) == 1:
+            raise RuntimeError("provider down")
+        return "summary"
+
+    memory = ConversationMemory(summarize, token_budget=120, min_recent=1)
+    memory.append("u", "question 0", long_answer(0))
+    memory.append("u", "question 1", long_answer(1))
+    wait_idle(memory, "u")
+    assert memory._user("u").pending
+    memory.append("u", "question 2", long_answer(2))
+    wait_idle(memory, "u")
+    assert calls[1] > calls[0]
+    assert not memory._user("u").pending
+
+
+def test_pending_is_capped_while_summaries_fail():
+    def summarize(previous, messages):
+        raise RuntimeError("provider down")
+
+    memory = ConversationMemory(summarize, token_budget=120, min_recent=1, max_pending=6)
+    for i in range(10):
+        memory.append("u", f"question {i}", long_answer(i))
+        wait_idle(memory, "u")
+    pending = memory._user("u").pending
+    assert len(pending) <= 6
+    assert pending[0]["role"] == "user"
@@ -0,0 +1,55 @@
+import random
+
+import product_scanner
+from product_scanner import ProductMatcher, find_products, recognize_product_from_text
+
+WORDS = ["cerave", "the", "ordinary", "retinol", "acid", "serum", "cleanser", "gel", "2%", "0.5%", "niacinamide"]
+
+
+def substring_scan(names, text):
+    t = text.lower()
+    return {name for name in names if name in t}
+
+
+def test_matcher_agrees_with_substring_scan():
+    rng = random.Random(3)
+    names = sorted({" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))) for _ in range(200)})
+    matcher = ProductMatcher(names)
+    for _ in range(300):
+        text = " ".join(rng.choice(WORDS + ["and", "my", "skin", "serums", "Retinols"]) for _ in range(20))
+        found = matcher.find_all(text, overlapping=True)
+        assert {match.key for match in found} == substring_scan(names, text)
+        for match in found:
+            assert text[match.start:match.end].lower() == match.key
+
+
+def test_non_overlapping_prefers_leftmost_longest():
+    matcher = ProductMatcher(["retinol", "generic retinol 0.5%", "acid"])
+    keys = [match.key for match in matcher.find_all("Generic Retinol 0.5% with acid")]
+    assert keys == ["generic retinol 0.5%", "acid"]
+
+
+def test_plural_still_matches_like_the_old_substring_check():
+    assert recognize_product_from_text("I use CeraVe Hydrating Cleansers daily") == "cerave hydrating cleanser"
+    assert recognize_product_from_text("nothing here") is None
+
+
+def test_catalog_edits_take_effect_after_rebuild(monkeypatch):
+    catalog = dict(product_scanner.PRODUCTS)
+    monkeypatch.setattr(product_scanner, "PRODUCTS", catalog)
+    # Same size, different names: a length check would have kept the old automaton
+    catalog.pop("generic retinol 0.5%")
+    catalog["generic retinal 0.1%"] = {"type": "serum", "strength": "strong", "actives": ["retinal"], "avoid_if": []}
+    product_scanner.rebuild_matcher()
+    try:
+        assert [m.key for m in find_products("generic retinal 0.1% at night")] == ["generic retinal 0.1%"]
+        assert find_products("generic retinol 0.5%") == []
+    finally:
+        monkeypatch.undo()
+        product_scanner.rebuild_matcher()
+
+
+def test_names_differing_only_by_case_build_once():
+    matcher = ProductMatcher(["CeraVe Cleanser", "cerave cleanser"])
+    assert len(matcher) == 1
+    assert product_scanner.get_matcher() is product_scanner.get_matcher()
@@ -0,0 +1,100 @@
+import time
+
+import pytest
+
+from provider_router import ProviderRouter, ProviderStats
+
+
+def ok(value):
+    return lambda: value
+
+
+def fail():
+    raise RuntimeError("provider down")
+
+
+def measured(router, name, latency, calls=3):
+    for _ in range(calls):
+        router._record(name, latency, ok=True)
+
+
+def test_order_keeps_preference_without_data():
+    router = ProviderRouter("test")
+    assert router.order(["openai", "gemini", "claude"]) == ["openai", "gemini", "claude"]
+
+
+def test_order_fastest_healthy_first():
+    router = ProviderRouter("test")
+    measured(router, "openai", 4.0)
+    measured(router, "gemini", 1.0)
+    assert router.order(["openai", "gemini"]) == ["gemini", "openai"]
+
+
+def test_unmeasured_provider_ranks_at_prior_latency():
+    router = ProviderRouter("test", prior_latency=3.0)
+    measured(router, "fast", 1.0)
+    measured(router, "slow", 6.0)
+    assert router.order(["new", "slow", "fast"]) == ["fast", "new", "slow"]
+
+
+def test_unhealthy_provider_goes_last():
+    router = ProviderRouter("test")
+    measured(router, "openai", 1.0)
+    measured(router, "gemini", 2.0)
+    router._record("openai", 0.1, ok=False)
+    router._record("openai", 0.1, ok=False)
+    assert router.order(["openai", "gemini"]) == ["gemini", "openai"]
+
+
+def test_unhealthy_provider_recovers_over_time():
+    router = ProviderRouter("test", recovery_half_life=10.0)
+    measured(router, "openai", 1.0)
+    measured(router, "gemini", 2.0)
+    router._record("openai", 0.1, ok=False)
+    router._record("openai", 0.1, ok=False)
+    stats = router.stats["openai"]
+    assert stats.error_rate() >= router.error_threshold
+    # Nothing has called it for two half-lives
+    stats.updated_at -= 20.0
+    assert stats.error_rate() < router.error_threshold
+    assert router.order(["openai", "gemini"]) == ["openai", "gemini"]
+
+
+def test_error_rate_decay_halves_per_half_life():
+    stats = ProviderStats("p", recovery_half_life=5.0)
+    stats.record(1.0, ok=False)
+    assert stats.error_rate(now=stats.updated_at + 5.0) == pytest.approx(stats.error_ewma / 2)
+
+
+def test_hedge_keeps_first_listed_primary_until_measured():
+    router = ProviderRouter("test")
+    measured(router, "openai", 5.0)
+    assert router.order(["openai", "gemini"], hedge=True) == ["openai", "gemini"]
+    assert router.order(["gemini", "openai"], hedge=True) == ["openai", "gemini"]
+
+
+def test_run_falls_back_and_records_outcome():
+    router = ProviderRouter("test")
+    assert router.run({"openai": fail, "gemini": ok("answer")}) == "answer"
+    record = router.last_record()
+    assert record["winner"] == "gemini"
+    assert record["outcome"] == "fallback"
+    assert "openai" in record["errors"]
+
+
+def test_run_raises_last_error_when_all_fail():
+    router = ProviderRouter("test")
+    with pytest.raises(RuntimeError):
+        router.run({"openai": fail, "gemini": fail})
+    assert router.last_record()["outcome"] == "error"
+
+
+def test_hedged_run_uses_secondary_when_primary_is_slow():
+    router = ProviderRouter("test", hedge=True, hedge_delay=0.05)
+
+    def slow():
+        time.sleep(0.5)
+        return "slow"
+
+    assert router.run({"openai": slow, "gemini": ok("fast")}) == "fast"
+    assert router.last_record()["outcome"] == "hedge_won"
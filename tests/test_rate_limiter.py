@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+import rate_limiter
+from rate_limiter import _STATE, SharedRateLimiter, TokenBucket, limiter_from_env
+
+
+def read_state(limiter):
+    with open(limiter.path, "rb") as f:
+        return _STATE.unpack(f.read(_STATE.size))
+
+
+def test_token_bucket_allows_burst_then_denies():
+    bucket = TokenBucket(rate=1.0, capacity=3)
+    assert all(bucket.acquire(timeout=0) for _ in range(3))
+    assert not bucket.acquire(timeout=0)
+    assert bucket.denied == 1
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=100.0, capacity=1)
+    assert bucket.acquire(timeout=0)
+    assert bucket.acquire(timeout=0.5)
+
+
+def test_token_bucket_per_minute():
+    bucket = TokenBucket.per_minute(600)
+    assert bucket.rate == pytest.approx(10.0)
+    assert bucket.capacity == pytest.approx(10.0)
+
+
+@pytest.mark.skipif(not rate_limiter.FCNTL_AVAILABLE, reason="shared limiter needs fcntl")
+def test_shared_limiter_burst_is_one_second_of_requests(tmp_path):
+    limiter = SharedRateLimiter("burst", rpm=120, state_dir=str(tmp_path))
+    assert limiter.acquire(timeout=0)
+    assert limiter.acquire(timeout=0)
+    assert not limiter.acquire(timeout=0)
+    assert limiter.stats["granted"] == 2 and limiter.stats["denied"] == 1
+
+
+@pytest.mark.skipif(not rate_limiter.FCNTL_AVAILABLE, reason="shared limiter needs fcntl")
+def test_shared_limiter_budget_is_shared_between_instances(tmp_path):
+    first = SharedRateLimiter("shared", rpm=60, state_dir=str(tmp_path))
+    second = SharedRateLimiter("shared", rpm=60, state_dir=str(tmp_path))
+    assert first.acquire(timeout=0)
+    assert not second.acquire(timeout=0)
+
+
+@pytest.mark.skipif(not rate_limiter.FCNTL_AVAILABLE, reason="shared limiter needs fcntl")
+def test_shared_limiter_token_budget(tmp_path):
+    limiter = SharedRateLimiter("tokens", rpm=6000, tpm=1000, state_dir=str(tmp_path))
+    assert limiter.acquire(tokens=800, timeout=0)
+    assert not limiter.acquire(tokens=800, timeout=0)
+    assert limiter.acquire(tokens=100, timeout=0)
+    _, _, tok, _ = read_state(limiter)
+    assert tok == pytest.approx(100, abs=5)
+
+
+@pytest.mark.skipif(not rate_limiter.FCNTL_AVAILABLE, reason="shared limiter needs fcntl")
+def test_rpm_only_limiter_leaves_token_bucket_untouched(tmp_path):
+    with_tpm = SharedRateLimiter("mixed", rpm=6000, tpm=1000, state_dir=str(tmp_path))
+    assert with_tpm.acquire(tokens=600, timeout=0)
+    _, _, tok_before, tok_at_before = read_state(with_tpm)
+    rpm_only = SharedRateLimiter("mixed", rpm=6000, state_dir=str(tmp_path))
+    assert rpm_only.acquire(timeout=0)
+    _, _, tok_after, tok_at_after = read_state(with_tpm)
+    assert (tok_after, tok_at_after) == (tok_before, tok_at_before)
+
+
+def test_zero_rpm_and_tpm_mean_unlimited(tmp_path):
+    limiter = SharedRateLimiter("free", rpm=0, tpm=0, state_dir=str(tmp_path))
+    assert all(limiter.acquire(tokens=10 ** 6, timeout=0) for _ in range(100))
+
+
+@pytest.mark.skipif(not rate_limiter.FCNTL_AVAILABLE, reason="shared limiter needs fcntl")
+def test_stats_are_counted_from_many_threads(tmp_path):
+    limiter = SharedRateLimiter("threads", rpm=60 * 1000, state_dir=str(tmp_path))
+
+    def worker():
+        for _ in range(50):
+            limiter.acquire(timeout=0)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert limiter.stats["granted"] + limiter.stats["denied"] == 400
+
+
+def test_limiter_from_env(monkeypatch):
+    monkeypatch.setenv("TEST_LIMIT_RPM", "30")
+    monkeypatch.setenv("TEST_LIMIT_TPM", "0")
+    limiter = limiter_from_env("env", "TEST_LIMIT", rpm=500, tpm=1000)
+    assert limiter.rpm == 30.0 and limiter.tpm is None
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from tts_pipeline import split_sentences, synthesize_pipelined
+
+
+def test_empty_text():
+    assert split_sentences("") == []
+    assert split_sentences("   ") == []
+    assert split_sentences(None) == []
+
+
+def test_splits_at_sentence_ends_and_keeps_the_text():
+    text = ("Your skin looks well hydrated today, which is great news. "
+            "The redness around the nose is mild and should settle! "
+            "Would you like a gentle cleanser recommendation?")
+    segments = split_sentences(text)
+    assert segments == [
+        "Your skin looks well hydrated today, which is great news.",
+        "The redness around the nose is mild and should settle!",
+        "Would you like a gentle cleanser recommendation?",
+    ]
+    assert " ".join(segments) == text
+
+
+def test_short_sentences_are_merged():
+    segments = split_sentences("Hi. Okay. Your skin barrier looks healthy and calm today.")
+    assert segments == ["Hi. Okay. Your skin barrier looks healthy and calm today."]
+    # A short tail is merged into the segment before it
+    segments = split_sentences("Your skin barrier looks healthy and calm today. Thanks!")
+    assert segments == ["Your skin barrier looks healthy and calm today. Thanks!"]
+
+
+def test_closing_quotes_stay_with_their_sentence():
+    segments = split_sentences('The label says "use at night." Apply a pea-sized amount after cleansing.',
+                               min_chars=10)
+    assert segments == ['The label says "use at night."', "Apply a pea-sized amount after cleansing."]
+
+
+def test_long_sentences_are_cut_at_commas_then_spaces():
+    clause = "apply a thin layer of serum"
+    text = ", ".join([clause] * 20) + "."
+    segments = split_sentences(text, max_chars=100)
+    assert all(len(segment) <= 100 for segment in segments)
+    assert " ".join(segments) == text
+    assert all(segment.endswith((",", ".")) for segment in segments)
+
+    words = " ".join(["hydration"] * 50)
+    segments = split_sentences(words, min_chars=40, max_chars=60)
+    # Only a short tail merged into the last cut can go past max_chars
+    assert all(len(segment) <= 60 for segment in segments[:-1])
+    assert len(segments[-1]) < 60 + 40
+    assert " ".join(segments) == words
+
+
+def test_pipelined_results_come_back_in_order():
+    def synthesize(segment):
+        time.sleep(0.05 if segment == "a" else 0.0)
+        return segment.upper()
+
+    assert list(synthesize_pipelined(["a", "b", "c"], synthesize)) == [(0, "a", "A"), (1, "b", "B"), (2, "c", "C")]
+
+
+def test_pipelined_respects_max_workers_and_reraises():
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def synthesize(segment):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        if segment == "bad":
+            raise RuntimeError("tts failed")
+        return segment
+
+    results = synthesize_pipelined(["a", "b", "bad", "c", "d"], synthesize, max_workers=2)
+    assert next(results)[2] == "a"
+    assert next(results)[2] == "b"
+    with pytest.raises(RuntimeError):
+        next(results)
+    assert peak[0] <= 2
@@ -0,0 +1,37 @@
+import os
+
+import voice_trace
+
+
+def span(stage, start, duration, utterance_id="u1"):
+    return {"utterance_id": utterance_id, "stage": stage, "start": start, "duration": duration}
+
+
+def test_parallel_segments_count_wall_clock_time():
+    spans = [
+        span("transcription", 10.0, 2.0),
+        span("transcription", 10.5, 2.0),
+        span("transcription", 11.0, 2.0),
+    ]
+    stats = voice_trace.summarize(spans)["stages"]["transcription"]
+    assert stats["count"] == 1
+    assert stats["max"] == 3.0
+
+
+def test_release_to_playback():
+    spans = [
+        span("recording", 0.0, 4.0),
+        span("playback", 5.5, 3.0),
+        span("recording", 20.0, 2.0, "u2"),
+        span("playback", 23.0, 1.0, "u2"),
+    ]
+    summary = voice_trace.summarize(spans)
+    assert summary["utterances"] == 2
+    assert summary["stages"]["release_to_playback"]["max"] == 1.5
+    assert voice_trace.summarize(spans, last=1)["stages"]["release_to_playback"]["max"] == 1.0
+
+
+def test_trace_file_is_next_to_the_module():
+    if not os.getenv("VOICE_TRACE_FILE"):
+        assert os.path.dirname(voice_trace.TRACE_FILE) == os.path.join(
+            os.path.dirname(os.path.abspath(voice_trace.__file__)), "logs")
@@ -0,0 +1,47 @@
+import numpy as np
+
+from voice_vad import trim_silence
+
+FS = 16000
+
+
+def tone(seconds, amplitude=8000, fs=FS):
+    t = np.arange(int(seconds * fs)) / fs
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+
+def noise(seconds, amplitude=30, fs=FS, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(-amplitude, amplitude, int(seconds * fs)).astype(np.int16)
+
+
+def test_trims_leading_and_trailing_silence_with_padding():
+    audio = np.concatenate([noise(1.0), tone(0.5), noise(1.5, seed=1)])
+    trimmed = trim_silence(audio, FS, pad_ms=150)
+    # Speech plus about 150 ms of padding on each side, cut on 30 ms frames
+    assert 0.5 + 0.24 <= len(trimmed) / FS <= 0.5 + 0.36
+    # A view of the input, not a copy
+    assert np.shares_memory(trimmed, audio)
+    assert np.abs(trimmed).max() == np.abs(tone(0.5)).max()
+
+
+def test_keeps_pauses_inside_speech():
+    audio = np.concatenate([noise(0.5), tone(0.3), noise(0.8, seed=2), tone(0.3), noise(0.5, seed=3)])
+    trimmed = trim_silence(audio, FS, pad_ms=0)
+    assert abs(len(trimmed) / FS - (0.3 + 0.8 + 0.3)) < 0.07
+
+
+def test_silence_only_and_short_clips_are_returned_unchanged():
+    silence = noise(1.0)
+    assert np.array_equal(trim_silence(silence, FS), silence)
+    digital = np.zeros(FS, dtype=np.int16)
+    assert len(trim_silence(digital, FS)) == FS
+    short = tone(0.01)
+    assert np.array_equal(trim_silence(short, FS), short)
+
+
+def test_accepts_column_shaped_input():
+    audio = np.concatenate([noise(0.5), tone(0.4), noise(0.5, seed=4)]).reshape(-1, 1)
+    trimmed = trim_silence(audio, FS, pad_ms=0)
+    assert trimmed.ndim == 1
+    assert abs(len(trimmed) / FS - 0.4) < 0.07
@@ -0,0 +1,28 @@
+"""
+Fast local token estimate for prompt budgeting (no tokenizer download).
+
+Roughly 4 characters per token for Latin text and 2 for Cyrillic and other
+non-ASCII scripts, which tracks the OpenAI tokenizers well enough for budgets
+and logging.
+"""
+
+import math
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    other_chars = len(text) - ascii_chars
+    return math.ceil(ascii_chars / 4 + other_chars / 2)
+
+
+def estimate_message_tokens(messages: list) -> int:
+    """Estimate for a chat messages list, including ~4 tokens of per-message overhead."""
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            total += estimate_tokens(content)
+        total += 4
+    return total
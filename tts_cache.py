@@ -0,0 +1,223 @@
+"""
+Content-addressed cache of synthesized speech.
+
+Files are named after a hash of (text, voice, model, speed), so the same phrase
+is synthesized once and every later request gets the existing file URL. A
+single index.json in the cache directory holds size, synthesis time and last
+use per entry; it is read once at startup (no directory scan) and rewritten
+atomically. Every worker process has its own copy, so each write takes a file
+lock and merges the index on disk first (newest last use wins, entries this
+process evicted stay gone). The cache is kept under a byte budget by evicting
+the least recently used files.
+
+Given an audio_store.AudioStore, the clips live in the store's directory and
+are written, served and removed through it, so the store's sweeper also
+covers them; an entry whose file the sweeper removed is simply synthesized
+again.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "audio", "tts")
+INDEX_NAME = "index.json"
+
+# Hits only touch last-use times; persist those at most this often
+INDEX_SAVE_INTERVAL = 30.0
+
+
+class TTSCache:
+    """Disk LRU of audio files keyed on make_key(text, voice, model, speed)."""
+
+    def __init__(self, directory: str = DEFAULT_DIR, max_bytes: int = 200 * 1024 * 1024, store=None):
+        self.store = store
+        self.directory = store.directory if store is not None else directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._removed = {}  # key -> when this process dropped it (kept out of the merge)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = 0.0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "seconds_saved": 0.0}
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(text: str, voice: str, model: str, speed: float = 1.0, extension: str = "mp3") -> str:
+        raw = json.dumps([text.strip(), voice, model, round(float(speed), 3), extension], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, INDEX_NAME)
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as f:
+                return json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            return {}
+
+    def _load_index(self):
+        self._merge(self._read_index())
+
+    @contextmanager
+    def _index_lock(self):
+        """Exclusive lock on the index across worker processes (no-op without fcntl)."""
+        if not FCNTL_AVAILABLE:
+            yield
+            return
+        with open(self._index_path() + ".lock", "a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _merge(self, entries: dict):
+        """Fold index entries written by other processes into ours. Caller holds the lock."""
+        for key, entry in entries.items():
+            last_used = entry.get("last_used", 0)
+            if last_used <= self._removed.get(key, -1):
+                continue
+            mine = self._entries.get(key)
+            if mine is None or last_used > mine.get("last_used", 0):
+                self._entries[key] = entry
+        self._entries = OrderedDict(sorted(self._entries.items(), key=lambda item: item[1].get("last_used", 0)))
+        self._bytes = sum(entry.get("bytes", 0) for entry in self._entries.values())
+
+    def _evict(self):
+        """Drop least recently used entries until under budget. Caller holds the lock."""
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.stats["evictions"] += 1
+
+    def _save_index(self):
+        """Merge with the index on disk and write it back atomically. Caller holds the lock."""
+        path = self._index_path()
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with self._index_lock():
+                self._merge(self._read_index())
+                self._evict()
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"entries": self._entries}, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            self._removed.clear()
+            self._dirty = False
+            self._saved_at = time.time()
+        except OSError as e:
+            print(f"⚠️ TTS cache index write failed: {e}")
+
+    def get(self, key: str):
+        """Return the cached filename for key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._file_exists(entry["file"]):
+                # Removed behind our back; forget it and synthesize again
+                self._drop(key)
+                self._dirty = True
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            entry["last_used"] = time.time()
+            self.stats["hits"] += 1
+            self.stats["seconds_saved"] += entry.get("seconds", 0.0)
+            self._dirty = True
+            if time.time() - self._saved_at > INDEX_SAVE_INTERVAL:
+                self._save_index()
+        if self.store is not None:
+            self.store.mark_served(entry["file"])
+        return entry["file"]
+
+    def _file_exists(self, filename: str) -> bool:
+        if self.store is not None:
+            return self.store.exists(filename)
+        return os.path.exists(os.path.join(self.directory, filename))
+
+    def put(self, key: str, data: bytes, seconds: float = 0.0, extension: str = "mp3") -> str:
+        """Store audio bytes under key; returns the filename."""
+        filename = f"{key}.{extension}"
+        if self.store is not None:
+            self.store.write(filename, data)
+        else:
+            path = os.path.join(self.directory, filename)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key, remove_file=False)
+            self._entries[key] = {
+                "file": filename,
+                "bytes": len(data),
+                "seconds": round(seconds, 3),
+                "last_used": time.time(),
+            }
+            self._bytes += len(data)
+            self.stats["stores"] += 1
+            self._save_index()
+        return filename
+
+    def _drop(self, key: str, remove_file: bool = True):
+        """Forget an entry (and delete its file). Caller holds the lock."""
+        entry = self._entries.pop(key)
+        self._bytes -= entry.get("bytes", 0)
+        self._removed[key] = time.time()
+        if remove_file:
+            if self.store is not None:
+                self.store.remove(entry["file"])
+                return
+            try:
+                os.remove(os.path.join(self.directory, entry["file"]))
+            except OSError:
+                pass
+
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "seconds_saved": round(self.stats["seconds_saved"], 2),
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+def tts_cache_from_env(prefix: str = "TTS_CACHE", store=None):
+    """
+    Build a cache from <PREFIX>_DIR / <PREFIX>_MAX_MB; <PREFIX>=0 disables it (returns None).
+    With a store, the cache lives in the store unless <PREFIX>_DIR is set.
+    """
+    if os.getenv(prefix, "1").lower() in ("0", "false", "no", "off"):
+        return None
+    try:
+        max_mb = float(os.getenv(f"{prefix}_MAX_MB", "200"))
+    except ValueError:
+        max_mb = 200.0
+    directory = os.getenv(f"{prefix}_DIR")
+    if directory:
+        store = None
+    return TTSCache(directory=directory or DEFAULT_DIR, max_bytes=int(max_mb * 1024 * 1024), store=store)
@@ -0,0 +1,72 @@
+"""
+Sentence-pipelined speech synthesis.
+
+A long answer is split at sentence boundaries and the segments are
+synthesized concurrently with bounded parallelism. Results come back in
+answer order, each one as soon as it and everything before it is ready, so the
+first sentence can start playing while the rest are still being synthesized.
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# Sentence end: . ! ? … (optionally followed by quotes/brackets, which stay with
+# the sentence) and whitespace
+_SENTENCE_END = re.compile(r"(?<=[.!?…])([\"'»)\]]*)\s+")
+
+# Segments shorter than this are merged into their neighbour: every TTS call has
+# a fixed overhead, and very short clips sound choppy when played back to back
+MIN_SEGMENT_CHARS = 40
+# Longer segments are split at commas/semicolons to keep the first one quick
+MAX_SEGMENT_CHARS = 300
+
+
+def split_sentences(text: str, min_chars: int = MIN_SEGMENT_CHARS, max_chars: int = MAX_SEGMENT_CHARS) -> list:
+    """Split text into speakable segments of roughly min_chars..max_chars characters."""
+    text = " ".join((text or "").split())
+    if not text:
+        return []
+
+    pieces = []
+    # Whitespace is normalized above, so a newline can mark the cuts
+    for sentence in _SENTENCE_END.sub("\\1\n", text).split("\n"):
+        sentence = sentence.strip()
+        while len(sentence) > max_chars:
+            cut = max(sentence.rfind(", ", 0, max_chars), sentence.rfind("; ", 0, max_chars))
+            if cut <= 0:
+                cut = sentence.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                break
+            pieces.append(sentence[:cut + 1].strip())
+            sentence = sentence[cut + 1:].strip()
+        if sentence:
+            pieces.append(sentence)
+
+    segments = []
+    for piece in pieces:
+        if segments and len(segments[-1]) < min_chars:
+            segments[-1] = f"{segments[-1]} {piece}"
+        else:
+            segments.append(piece)
+    if len(segments) > 1 and len(segments[-1]) < min_chars:
+        tail = segments.pop()
+        segments[-1] = f"{segments[-1]} {tail}"
+    return segments
+
+
+def synthesize_pipelined(segments: list, synthesize, max_workers: int = 3):
+    """
+    Run synthesize(segment) for every segment with at most max_workers in flight
+    and yield (index, segment, result) in segment order as each becomes available.
+    An exception from synthesize is re-raised when its segment's turn comes.
+    """
+    if not segments:
+        return
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="tts-segment")
+    try:
+        futures = [executor.submit(synthesize, segment) for segment in segments]
+        for index, (segment, future) in enumerate(zip(segments, futures)):
+            yield index, segment, future.result()
+    finally:
+        # A consumer that stops early (client disconnected) doesn't wait for the rest
+        executor.shutdown(wait=False, cancel_futures=True)
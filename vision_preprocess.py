@@ -0,0 +1,154 @@
+"""
+Token-aware image preparation for the vision providers.
+
+The client image is decoded once per request, then resized to each provider's
+preferred geometry and re-encoded once per provider. Variants are cached on the
+PreparedImage, so the router / hedging / retry paths all reuse the same bytes.
+"""
+
+import base64
+import io
+import math
+import threading
+
+try:
+    import PIL.Image
+    PIL_AVAILABLE = True
+except ImportError:
+    print("⚠️ Pillow not installed - images are sent to vision providers unresized")
+    PIL_AVAILABLE = False
+
+
+# -------------------- PROVIDER GEOMETRY --------------------
+
+# OpenAI "detail: high": fit in 2048x2048, shortest side scaled to 768,
+# then 170 tokens per 512px tile plus 85 base tokens.
+OPENAI_MAX_SIDE = 2048
+OPENAI_SHORT_SIDE = 768
+OPENAI_TILE = 512
+OPENAI_TILE_TOKENS = 170
+OPENAI_BASE_TOKENS = 85
+# A side that overshoots a tile boundary by less than this fraction is snapped
+# down to the boundary, saving a whole row/column of tiles for a few pixels.
+OPENAI_TILE_SLACK = 0.2
+
+# Gemini: images up to 384px on both sides cost one 258-token tile, larger ones
+# are split into 768x768 tiles of 258 tokens each.
+GEMINI_SMALL_SIDE = 384
+GEMINI_TILE = 768
+GEMINI_TILE_TOKENS = 258
+
+JPEG_QUALITY = 90
+
+
+def estimate_openai_tokens(width: int, height: int) -> int:
+    """Image tokens GPT-4o charges for a width x height image at detail=high."""
+    width, height = _openai_geometry(width, height, snap=False)
+    tiles = math.ceil(width / OPENAI_TILE) * math.ceil(height / OPENAI_TILE)
+    return OPENAI_BASE_TOKENS + OPENAI_TILE_TOKENS * tiles
+
+
+def estimate_gemini_tokens(width: int, height: int) -> int:
+    """Image tokens Gemini charges for a width x height image."""
+    if width <= GEMINI_SMALL_SIDE and height <= GEMINI_SMALL_SIDE:
+        return GEMINI_TILE_TOKENS
+    tiles = math.ceil(width / GEMINI_TILE) * math.ceil(height / GEMINI_TILE)
+    return GEMINI_TILE_TOKENS * tiles
+
+
+def _openai_geometry(width: int, height: int, snap: bool = True):
+    scale = min(1.0, OPENAI_MAX_SIDE / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, OPENAI_SHORT_SIDE / min(width, height))
+    width, height = width * scale, height * scale
+    if snap:
+        width, height = _snap_to_tiles(width, height)
+    return max(1, int(width)), max(1, int(height))
+
+
+def _snap_to_tiles(width: float, height: float):
+    """Shrink (keeping aspect ratio) when one side barely spills into an extra tile."""
+    scale = 1.0
+    for side in (width, height):
+        boundary = math.floor(side / OPENAI_TILE) * OPENAI_TILE
+        if boundary and side > boundary and (side - boundary) / boundary < OPENAI_TILE_SLACK:
+            scale = min(scale, boundary / side)
+    return width * scale, height * scale
+
+
+def _gemini_geometry(width: int, height: int):
+    scale = min(1.0, GEMINI_TILE / max(width, height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+PROVIDER_GEOMETRY = {
+    "openai": (_openai_geometry, estimate_openai_tokens),
+    "gemini": (_gemini_geometry, estimate_gemini_tokens),
+}
+
+
+# -------------------- PREPARED IMAGE --------------------
+
+class PreparedImage:
+    """One decoded client image plus its cached per-provider variants."""
+
+    def __init__(self, image_base64: str):
+        clean_base64 = image_base64
+        if "," in clean_base64:
+            clean_base64 = clean_base64.split(",", 1)[1]
+        self.original_base64 = clean_base64
+        self.raw = base64.b64decode(clean_base64)
+        self.image = None
+        self.size = None
+        if PIL_AVAILABLE:
+            image = PIL.Image.open(io.BytesIO(self.raw))
+            image.load()
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            self.image = image
+            self.size = image.size
+        self._variants = {}
+        self._lock = threading.Lock()
+        self.report = {"original_bytes": len(self.raw), "size": self.size, "providers": {}}
+
+    def _variant(self, provider: str):
+        with self._lock:
+            if provider in self._variants:
+                return self._variants[provider]
+
+            if self.image is None:
+                variant = (None, self.original_base64)
+            else:
+                geometry, estimate = PROVIDER_GEOMETRY[provider]
+                width, height = self.size
+                target = geometry(width, height)
+                image = self.image if target == self.size else self.image.resize(target, PIL.Image.LANCZOS)
+                buffer = io.BytesIO()
+                image.save(buffer, format="JPEG", quality=JPEG_QUALITY)
+                encoded = buffer.getvalue()
+                variant = (image, base64.b64encode(encoded).decode("utf-8"))
+                self.report["providers"][provider] = {
+                    "size": target,
+                    "bytes": len(encoded),
+                    "tokens_before": estimate(width, height),
+                    "tokens_after": estimate(*target),
+                }
+                print(f"🖼️ {provider} image: {width}x{height} → {target[0]}x{target[1]}, "
+                      f"~{estimate(width, height)} → ~{estimate(*target)} tokens, "
+                      f"{len(self.raw)} → {len(encoded)} bytes")
+
+            self._variants[provider] = variant
+            return variant
+
+    def pil_for(self, provider: str):
+        """Resized PIL image for the provider (None when Pillow is missing)."""
+        return self._variant(provider)[0]
+
+    def base64_for(self, provider: str) -> str:
+        """Resized, JPEG-encoded base64 (no data: prefix) for the provider."""
+        return self._variant(provider)[1]
+
+
+def prepare_vision_image(image_base64: str) -> PreparedImage:
+    """Decode a client base64 image (with or without data: prefix) once."""
+    return PreparedImage(image_base64)
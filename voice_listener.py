@@ -1,16 +1,30 @@
 import sounddevice as sd
 import numpy as np
 import requests
-import tempfile
-import wave
 import time
 import openai
 from pynput import keyboard
 from threading import Event, Thread
+from concurrent.futures import ThreadPoolExecutor
 import queue
+import io
 import os
+import shutil
+import subprocess
+from urllib.parse import urljoin
 from dotenv import load_dotenv
 
+from voice_vad import SpeechSegmenter
+from voice_upload import prepare_upload, read_wav, record_upload, upload_stats
+from voice_recorder import MemoryProbe, RingRecorder
+from voice_pipeline import VoicePipeline
+import voice_trace
+
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
 # Load environment variables
 load_dotenv()
 
@@ -20,20 +34,72 @@ load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY", "YOUR_OPENAI_API_KEY")
 RUNOVA_API = "http://127.0.0.1:5001/ask"  # эндпоинт Runova Flask
 
+# Streaming mode: pauses split the recording into segments that are transcribed
+# while the V key is still held (VOICE_STREAMING=0 transcribes the whole clip on release)
+STREAMING = os.getenv("VOICE_STREAMING", "1").lower() not in ("0", "false", "no", "off")
+SEGMENT_WORKERS = 3
+
+# Ring buffer length; longer takes keep their most recent MAX_RECORD_SECONDS
+try:
+    MAX_RECORD_SECONDS = float(os.getenv("VOICE_MAX_RECORD_SECONDS", "60"))
+except ValueError:
+    MAX_RECORD_SECONDS = 60.0
+# Log peak memory and new allocations per utterance (tracemalloc; adds overhead)
+MEMORY_STATS = os.getenv("VOICE_MEMORY_STATS", "0").lower() in ("1", "true", "yes")
+# Speak Runova's answer (VOICE_SPEAK=0 only prints it). The clip comes from app.py's
+# /generate-audio, so prerendered (audio bank) and cached clips are reused
+SPEAK = os.getenv("VOICE_SPEAK", "1").lower() not in ("0", "false", "no", "off")
+RUNOVA_TTS_API = os.getenv("RUNOVA_TTS_API", "http://127.0.0.1:5005/generate-audio")
+SPEAK_VOICE = os.getenv("VOICE_SPEAK_VOICE", "alloy")
+SPEAK_PROFILE = os.getenv("VOICE_SPEAK_PROFILE", "hd")
+SPEAK_RATE = 24000  # clips decoded with ffmpeg are resampled to this
+
 
 # -----------------------------
 #  RECORD AUDIO (push-to-talk)
 # -----------------------------
-def record_audio_until_stop(stop_event, fs=16000):
-    """Record audio until stop_event is set"""
+def record_audio_until_stop(stop_event, fs=16000, on_segment=None, recorder=None):
+    """Record audio until stop_event is set; returns the int16 samples or None.
+
+    Blocks are copied into a preallocated RingRecorder (one is created if not
+    given), so nothing is allocated per block and nothing touches disk. The
+    returned array is a view into the recorder's buffer, valid until its next
+    take; copy it before handing it on. With on_segment, a VAD thread cuts the audio at pauses and calls
+    on_segment(samples) for each finished speech segment while recording
+    continues; the last segment is delivered before this returns.
+    """
     print("🎤 Listening... (V key held)")
     
-    audio_chunks = []
+    recorder = recorder or RingRecorder(fs, MAX_RECORD_SECONDS)
+    recorder.reset()
+    positions = queue.Queue() if on_segment else None
     
     def audio_callback(indata, frames, time, status):
         if status:
             print(f"⚠️ Audio status: {status}")
-        audio_chunks.append(indata.copy())
+        recorder.write(indata)
+        if positions is not None:
+            # VAD runs off the audio thread; it reads the new samples from the ring
+            positions.put(recorder.total)
+    
+    vad_thread = None
+    if on_segment:
+        def segment_loop():
+            segmenter = SpeechSegmenter(fs)
+            done = 0
+            while True:
+                position = positions.get()
+                if position is None:
+                    break
+                for segment in segmenter.feed(recorder.view(done, position)):
+                    # Segments outlive this take's buffer, so they are copied
+                    on_segment(segment.copy())
+                done = position
+            final = segmenter.flush()
+            if final is not None:
+                on_segment(final.copy())
+        vad_thread = Thread(target=segment_loop, daemon=True)
+        vad_thread.start()
     
     stream = sd.InputStream(samplerate=fs, channels=1, dtype='int16', 
                            callback=audio_callback, blocksize=int(fs * 0.1))
@@ -46,69 +112,210 @@ def record_audio_until_stop(stop_event, fs=16000):
     stream.stop()
     stream.close()
     
-    if not audio_chunks:
-        return None
-    
-    # Concatenate all audio chunks
-    audio = np.concatenate(audio_chunks, axis=0)
+    if vad_thread is not None:
+        positions.put(None)
+        vad_thread.join()
     
-    # Save to temporary WAV file
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-    with wave.open(tmp.name, "wb") as wf:
-        wf.setnchannels(1)
-        wf.setsampwidth(2)
-        wf.setframerate(fs)
-        wf.writeframes(audio.tobytes())
+    if recorder.total == 0:
+        return None
     
-    duration = len(audio) / fs
-    print(f"✅ Recorded {duration:.2f} seconds")
-    return tmp.name
+    if recorder.overflowed:
+        print(f"⚠️ Recording longer than {MAX_RECORD_SECONDS:.0f}s, keeping the last {MAX_RECORD_SECONDS:.0f}s")
+    print(f"✅ Recorded {recorder.duration():.2f} seconds")
+    return recorder.samples()
 
 
 # -----------------------------
 #  TRANSCRIBE WITH WHISPER
 # -----------------------------
-def transcribe_audio(path):
+def transcribe_audio(path, fs=16000, preprocess=True, utterance_id=None):
+    """Transcribe a WAV file path or int16 samples.
+
+    Silence is trimmed and the clip compressed before upload (see
+    voice_upload); preprocess=False uploads the plain WAV. Preparing the upload and the API call are traced as the "upload" and
+    "transcription" spans of utterance_id (default: the current one).
+    """
     print("🧠 Transcribing with Whisper...")
 
-    with open(path, "rb") as f:
+    if isinstance(path, np.ndarray):
+        audio = path
+    else:
+        audio, fs = read_wav(path)
+    with voice_trace.span("upload", utterance_id) as attrs:
+        if preprocess:
+            upload = prepare_upload(audio, fs)
+        else:
+            upload = prepare_upload(audio, fs, fmt="wav", trim=False)
+        attrs.update(format=upload["format"], bytes=upload["bytes"], raw_bytes=upload["raw_bytes"])
+
+    start = time.time()
+    with voice_trace.span("transcription", utterance_id, bytes=upload["bytes"]):
         transcript = openai.audio.transcriptions.create(
             model="gpt-4o-transcribe",
-            file=f
+            file=upload["file"]
         )
+    latency = time.time() - start
+    record_upload(upload, latency)
+    print(f"📦 Uploaded {upload['bytes'] / 1024:.0f} KB {upload['format']} "
+          f"(raw {upload['raw_bytes'] / 1024:.0f} KB, {upload['trimmed_seconds']:.2f}s silence trimmed), "
+          f"transcribed in {latency:.2f}s")
 
     text = transcript.text.strip()
     print("🔎 You said:", text)
     return text
 
 
+def compare_preprocessing(path):
+    """Transcribe one WAV raw and preprocessed; print bytes and latency for both."""
+    for label, preprocess in (("raw", False), ("preprocessed", True)):
+        before = dict(upload_stats)
+        transcribe_audio(path, preprocess=preprocess)
+        sent = upload_stats["uploaded_bytes"] - before["uploaded_bytes"]
+        seconds = upload_stats["transcribe_seconds"] - before["transcribe_seconds"]
+        print(f"📊 {label}: {sent / 1024:.0f} KB uploaded, {seconds:.2f}s transcription")
+
+
+class StreamingTranscriber:
+    """Transcribe speech segments in parallel as they arrive; finish() joins them in order."""
+
+    def __init__(self, fs=16000, workers=SEGMENT_WORKERS, utterance_id=None):
+        self.fs = fs
+        # Worker threads don't inherit the trace context, so the id is passed along
+        self.utterance_id = utterance_id
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="segment-transcribe")
+        self.futures = []
+        self.released_at = None
+
+    def submit(self, segment):
+        index = len(self.futures)
+        print(f"✂️ Segment {index + 1}: {len(segment) / self.fs:.2f}s → transcribing")
+        self.futures.append(self.executor.submit(transcribe_audio, segment, self.fs,
+                                                 utterance_id=self.utterance_id))
+
+    def finish(self):
+        """Ordered transcript of all segments (waits for the ones still in flight)."""
+        texts = []
+        for index, future in enumerate(self.futures):
+            try:
+                texts.append(future.result())
+            except Exception as e:
+                print(f"⚠️ Segment {index + 1} transcription failed: {e}")
+        self.executor.shutdown(wait=False)
+        if self.released_at is not None:
+            print(f"⏱️ Transcript ready {time.time() - self.released_at:.2f}s after release "
+                  f"({len(self.futures)} segments)")
+        return " ".join(text for text in texts if text)
+
+
 # -----------------------------
 #  SEND TO RUNOVA BACKEND
 # -----------------------------
 def ask_runova(question):
     print("📡 Sending to Runova…")
 
-    resp = requests.post(RUNOVA_API, json={"question": question})
+    # The server traces its LLM / TTS spans under the same utterance id
+    utterance_id = voice_trace.current_utterance_id()
+    headers = {voice_trace.HEADER: utterance_id} if utterance_id else {}
+    with voice_trace.span("ask"):
+        resp = requests.post(RUNOVA_API, json={"question": question}, headers=headers)
 
     if resp.status_code != 200:
         print("❌ Server error:", resp.text)
-        return "Error"
+        return None
 
-    answer = resp.json().get("answer", "No answer")
+    answer = resp.json().get("answer") or None
     print("💡 Runova:", answer)
     return answer
 
 
+# -----------------------------
+#  SPEAK THE ANSWER
+# -----------------------------
+def decode_clip(data):
+    """(int16 mono samples, sample rate) of a served clip, or None if neither soundfile nor ffmpeg can decode it."""
+    if soundfile is not None:
+        try:
+            samples, fs = soundfile.read(io.BytesIO(data), dtype="int16")
+            return (samples[:, 0] if samples.ndim > 1 else samples), fs
+        except Exception:
+            pass  # older libsndfile builds can't read mp3
+    if shutil.which("ffmpeg"):
+        command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+                   "-f", "s16le", "-ac", "1", "-ar", str(SPEAK_RATE), "pipe:1"]
+        try:
+            result = subprocess.run(command, input=data, capture_output=True, timeout=30)
+            if result.returncode == 0 and result.stdout:
+                return np.frombuffer(result.stdout, dtype=np.int16), SPEAK_RATE
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+    return None
+
+
+def speak_answer(answer, cancelled=None):
+    """Fetch the answer's clip from the server and play it; stops early when `cancelled` is set (barge-in).
+
+    /generate-audio answers from the audio bank or the TTS cache when it can
+    and synthesizes only new text; the listener then downloads the clip.
+    """
+    utterance_id = voice_trace.current_utterance_id()
+    headers = {voice_trace.HEADER: utterance_id} if utterance_id else {}
+    with voice_trace.span("tts", chars=len(answer), profile=SPEAK_PROFILE) as attrs:
+        resp = requests.post(RUNOVA_TTS_API, headers=headers,
+                             json={"text": answer, "voice": SPEAK_VOICE, "profile": SPEAK_PROFILE})
+        audio_url = resp.json().get("audio_url") if resp.status_code == 200 else None
+        if not audio_url:
+            print("❌ TTS error:", resp.text)
+            return
+        clip = requests.get(urljoin(RUNOVA_TTS_API, audio_url))
+        clip.raise_for_status()
+        attrs["bytes"] = len(clip.content)
+    if cancelled is not None and cancelled.is_set():
+        return
+    decoded = decode_clip(clip.content)
+    if decoded is None:
+        print(f"⚠️ Can't decode {audio_url} (needs soundfile with mp3 support, or ffmpeg)")
+        return
+    samples, fs = decoded
+    # The playback span starts when audio starts: its start is what the user hears
+    with voice_trace.span("playback", seconds=round(len(samples) / fs, 2)) as attrs:
+        sd.play(samples, fs)
+        deadline = time.time() + len(samples) / fs
+        while time.time() < deadline:
+            if cancelled is not None and cancelled.wait(0.05):
+                sd.stop()
+                attrs["interrupted"] = True
+                print("🔇 Playback interrupted")
+                return
+            if cancelled is None:
+                time.sleep(0.05)
+
+
 # -----------------------------
 #  MAIN LOOP (Push-to-Talk with V key)
 # -----------------------------
 
 class VoiceListener:
+    """
+    The key handlers only start and stop recordings; waiting for the take,
+    transcription, the Runova request and playback run as VoicePipeline
+    stages. Pressing V again while an answer is pending or playing cancels it.
+    """
+
     def __init__(self):
         self.is_recording = False
         self.stop_event = None
-        self.recording_thread = None
-        self.audio_queue = queue.Queue()
+        self.utterance = None
+        self.streaming = STREAMING
+        # One preallocated buffer for every take; each take is copied out before
+        # the next one starts writing (see _record_audio)
+        self.recorder = RingRecorder(16000, MAX_RECORD_SECONDS)
+        self.memory_stats = MEMORY_STATS
+        self.pipeline = VoicePipeline(
+            transcribe=self._transcribe,
+            ask=ask_runova,
+            speak=speak_answer if SPEAK else None,
+            stop_playback=sd.stop if SPEAK else None,
+        )
         
     def on_press(self, key):
         """Called when a key is pressed"""
@@ -118,13 +325,26 @@ class VoiceListener:
                 if not self.is_recording:
                     self.is_recording = True
                     self.stop_event = Event()
+                    previous = self.utterance
+                    # Barge-in: anything still in flight is cancelled
+                    utterance = self.pipeline.new_utterance()
+                    if self.streaming:
+                        utterance.transcriber = StreamingTranscriber(utterance_id=utterance.trace_id)
+                    utterance.recorder = self.recorder
+                    if self.memory_stats:
+                        # tracemalloc's peak is process-wide: a barged-in utterance isn't reported
+                        if previous is not None and previous.memory_probe:
+                            previous.memory_probe.discard()
+                        utterance.memory_probe = MemoryProbe()
+                        utterance.memory_probe.start()
                     
                     # Start recording in a separate thread
-                    self.recording_thread = Thread(
+                    utterance.recording_thread = Thread(
                         target=self._record_audio,
-                        args=(self.stop_event,)
+                        args=(self.stop_event, utterance, previous)
                     )
-                    self.recording_thread.start()
+                    utterance.recording_thread.start()
+                    self.utterance = utterance
         except AttributeError:
             # Special keys don't have .char attribute
             pass
@@ -139,18 +359,10 @@ class VoiceListener:
                     # Signal to stop recording
                     if self.stop_event:
                         self.stop_event.set()
-                    
-                    # Wait for recording to finish and process
-                    if self.recording_thread:
-                        self.recording_thread.join(timeout=5)
-                    
-                    # Process the recorded audio
-                    if not self.audio_queue.empty():
-                        audio_path = self.audio_queue.get()
-                        if audio_path:
-                            text = transcribe_audio(audio_path)
-                            if text.strip() != "":
-                                ask_runova(text)
+                    if self.utterance.transcriber:
+                        self.utterance.transcriber.released_at = time.time()
+                    # The pipeline waits for the take; the key handler returns at once
+                    self.pipeline.submit(self.utterance)
         except AttributeError:
             # Special keys don't have .char attribute
             pass
@@ -159,18 +371,48 @@ class VoiceListener:
         if key == keyboard.Key.esc:
             return False
     
-    def _record_audio(self, stop_event):
+    def _transcribe(self, utterance):
+        """Transcription stage: join streamed segments, or transcribe the whole take."""
+        text = ""
+        if utterance.transcriber:
+            # Most segments were transcribed while the key was held
+            text = utterance.transcriber.finish()
+        if not text.strip() and not utterance.cancelled.is_set():
+            text = transcribe_audio(utterance.audio)
+        if utterance.memory_probe:
+            self._report_memory(utterance)
+        return text
+    
+    def _report_memory(self, utterance):
+        stats = utterance.memory_probe.stop()
+        if stats is None:
+            return
+        print(f"🧮 Utterance memory: peak {stats['peak_bytes'] / 1024:.0f} KB traced, "
+              f"{stats['new_blocks']} new allocations, recorder buffers {utterance.recorder.allocations}")
+    
+    def _record_audio(self, stop_event, utterance, previous=None):
         """Record audio in a separate thread"""
         try:
-            audio_path = record_audio_until_stop(stop_event)
-            if audio_path:
-                self.audio_queue.put(audio_path)
+            # The recorder is shared: the previous take must be copied out before it is reset
+            if previous is not None and previous.recording_thread is not None:
+                previous.recording_thread.join()
+            on_segment = utterance.transcriber.submit if utterance.transcriber else None
+            audio = record_audio_until_stop(stop_event, on_segment=on_segment, recorder=utterance.recorder)
+            # The returned samples are a view into the shared buffer; the queued clip gets
+            # its own copy, which the next take can't overwrite
+            utterance.audio = audio.copy() if audio is not None else None
         except Exception as e:
             print(f"⚠️ Recording error: {e}")
-            self.audio_queue.put(None)
+            utterance.audio = None
 
 
 if __name__ == "__main__":
+    import sys
+    if len(sys.argv) == 3 and sys.argv[1] == "--compare":
+        # python voice_listener.py --compare clip.wav
+        compare_preprocessing(sys.argv[2])
+        sys.exit(0)
+    
     print("🎧 Runova Voice Listener Started.")
     print("Press and hold V to talk → release to stop.")
     print("Press ESC to exit.")
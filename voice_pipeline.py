@@ -0,0 +1,153 @@
+"""
+Staged worker pipeline for the voice loop: record -> transcribe -> ask -> speak.
+
+Each stage runs on its own thread and hands an Utterance to the next one
+through a queue, so the keyboard handler only starts and stops recordings
+and never waits on the network. Pressing the key again (barge-in) cancels
+every utterance still in flight: queued work is dropped at the next stage
+boundary and playback is stopped. Every utterance carries per-stage
+timestamps, and its stages run under its trace id (voice_trace).
+"""
+
+import itertools
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+import voice_trace
+
+STAGES = ("record", "transcribe", "ask", "speak")
+
+
+class Utterance:
+    _ids = itertools.count(1)
+
+    def __init__(self, generation: int):
+        self.id = next(self._ids)
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.generation = generation
+        self.marks = {"pressed": time.time()}
+        self.cancelled = threading.Event()
+        self.recording_thread = None
+        self.transcriber = None
+        self.recorder = None
+        self.memory_probe = None
+        self.audio = None
+        self.text = ""
+        self.answer = None
+
+    def mark(self, name: str):
+        self.marks[name] = time.time()
+
+    def timings(self) -> dict:
+        """Seconds spent in each stage (from the previous mark), for the marks present."""
+        order = ["pressed", "released", "recorded", "transcribed", "answered", "playback_started", "playback_finished"]
+        present = [name for name in order if name in self.marks]
+        return {
+            name: round(self.marks[name] - self.marks[previous], 3)
+            for previous, name in zip(present, present[1:])
+        }
+
+
+class VoicePipeline:
+    """
+    transcribe(utterance) -> text, ask(text) -> answer (None on failure),
+    speak(answer, cancelled_event) are supplied by the caller. stop_playback()
+    is called on barge-in.
+    """
+
+    def __init__(self, transcribe, ask, speak=None, stop_playback=None, history_size: int = 50):
+        self.transcribe = transcribe
+        self.ask = ask
+        self.speak = speak
+        self.stop_playback = stop_playback
+        self.generation = 0
+        self.history = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+        self._queues = {stage: queue.Queue() for stage in STAGES}
+        self._handlers = {
+            "record": self._record_stage,
+            "transcribe": self._transcribe_stage,
+            "ask": self._ask_stage,
+            "speak": self._speak_stage,
+        }
+        for stage in STAGES:
+            threading.Thread(target=self._worker, args=(stage,), name=f"voice-{stage}", daemon=True).start()
+
+    def new_utterance(self) -> Utterance:
+        """Barge in on anything in flight and start a new utterance."""
+        with self._lock:
+            self.generation += 1
+            generation = self.generation
+        for utterance in list(self.history):
+            if not utterance.cancelled.is_set() and utterance.generation < generation:
+                utterance.cancelled.set()
+        if self.stop_playback:
+            self.stop_playback()
+        utterance = Utterance(generation)
+        self.history.append(utterance)
+        return utterance
+
+    def submit(self, utterance: Utterance):
+        """Hand a released recording to the pipeline (returns immediately)."""
+        utterance.mark("released")
+        self._queues["record"].put(utterance)
+
+    def _stale(self, utterance: Utterance) -> bool:
+        return utterance.cancelled.is_set() or utterance.generation != self.generation
+
+    def _worker(self, stage: str):
+        handler = self._handlers[stage]
+        next_stage = STAGES[STAGES.index(stage) + 1] if stage != STAGES[-1] else None
+        while True:
+            utterance = self._queues[stage].get()
+            if self._stale(utterance):
+                print(f"⏭️ Utterance {utterance.id}: cancelled before {stage}")
+                continue
+            try:
+                with voice_trace.trace_context(utterance.trace_id):
+                    proceed = handler(utterance)
+            except Exception as e:
+                print(f"⚠️ Utterance {utterance.id}: {stage} failed: {e}")
+                proceed = False
+            if proceed and next_stage and not self._stale(utterance):
+                self._queues[next_stage].put(utterance)
+            else:
+                self._report(utterance)
+
+    def _record_stage(self, utterance: Utterance) -> bool:
+        if utterance.recording_thread:
+            utterance.recording_thread.join(timeout=5)
+        utterance.mark("recorded")
+        voice_trace.record_span("recording", utterance.marks["pressed"], utterance.marks["recorded"],
+                                seconds_held=round(utterance.marks["released"] - utterance.marks["pressed"], 3))
+        return utterance.audio is not None
+
+    def _transcribe_stage(self, utterance: Utterance) -> bool:
+        utterance.text = (self.transcribe(utterance) or "").strip()
+        utterance.mark("transcribed")
+        return bool(utterance.text)
+
+    def _ask_stage(self, utterance: Utterance) -> bool:
+        # A barged-in question is never sent: the server would add it to the conversation
+        if utterance.cancelled.is_set():
+            return False
+        utterance.answer = self.ask(utterance.text)
+        utterance.mark("answered")
+        return bool(utterance.answer) and self.speak is not None
+
+    def _speak_stage(self, utterance: Utterance) -> bool:
+        utterance.mark("playback_started")
+        self.speak(utterance.answer, utterance.cancelled)
+        utterance.mark("playback_finished")
+        return True
+
+    def _report(self, utterance: Utterance):
+        timings = utterance.timings()
+        if not timings:
+            return
+        parts = " | ".join(f"{name} +{seconds:.2f}s" for name, seconds in timings.items())
+        state = " (cancelled)" if utterance.cancelled.is_set() else ""
+        print(f"⏱️ Utterance {utterance.id}{state}: {parts}")
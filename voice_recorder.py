@@ -0,0 +1,115 @@
+"""
+Preallocated ring-buffer recorder for push-to-talk.
+
+The audio callback copies each block into one int16 buffer allocated up
+front (max_seconds long), so recording does no per-block allocation and no
+final concatenate. Past max_seconds the oldest audio is overwritten and the
+most recent max_seconds are kept. samples() is only valid until the next
+take, so a caller that hands the take on copies it first.
+
+MemoryProbe measures peak traced memory and net new allocations for one
+utterance (VOICE_MEMORY_STATS=1 in voice_listener).
+"""
+
+import threading
+import tracemalloc
+
+import numpy as np
+
+
+class RingRecorder:
+    def __init__(self, fs: int = 16000, max_seconds: float = 60.0):
+        self.fs = fs
+        self.capacity = int(fs * max_seconds)
+        self.buffer = np.zeros(self.capacity, dtype=np.int16)
+        self.total = 0  # samples written since reset(), including overwritten ones
+        self.allocations = 1  # buffers this recorder has allocated
+        self._ordered = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.total = 0
+
+    def write(self, block: np.ndarray):
+        """Copy one block (called from the audio callback)."""
+        block = block.reshape(-1)
+        if len(block) > self.capacity:
+            block = block[-self.capacity:]
+        with self._lock:
+            start = self.total % self.capacity
+            first = min(len(block), self.capacity - start)
+            self.buffer[start:start + first] = block[:first]
+            if first < len(block):
+                self.buffer[:len(block) - first] = block[first:]
+            self.total += len(block)
+
+    @property
+    def overflowed(self) -> bool:
+        return self.total > self.capacity
+
+    def view(self, start: int, end: int) -> np.ndarray:
+        """Samples [start, end) in recording order; a view unless the range wraps."""
+        with self._lock:
+            start = max(start, self.total - self.capacity)
+            end = min(end, self.total)
+            if end <= start:
+                return self.buffer[:0]
+            a, b = start % self.capacity, end % self.capacity or self.capacity
+            if a < b:
+                return self.buffer[a:b]
+            return np.concatenate([self.buffer[a:], self.buffer[:b]])
+
+    def samples(self) -> np.ndarray:
+        """The take in order: a view of the buffer, or an ordered copy after wrap-around."""
+        with self._lock:
+            if not self.overflowed:
+                return self.buffer[:self.total]
+            if self._ordered is None:
+                self._ordered = np.empty_like(self.buffer)
+                self.allocations += 1
+            split = self.total % self.capacity
+            head = self.capacity - split
+            self._ordered[:head] = self.buffer[split:]
+            self._ordered[head:] = self.buffer[:split]
+            return self._ordered
+
+    def duration(self) -> float:
+        return min(self.total, self.capacity) / self.fs
+
+
+class MemoryProbe:
+    """
+    Peak traced memory and net new allocations between start() and stop().
+
+    tracemalloc is process-wide: the first probe starts it and it is left
+    running, and start() resets the shared peak. Only one probe should be live
+    at a time, so a probe whose utterance is barged in is discard()ed and its
+    stop() returns None instead of numbers that include the next utterance.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._snapshot = tracemalloc.take_snapshot()
+
+    def discard(self):
+        with self._lock:
+            self._snapshot = None
+
+    def stop(self):
+        with self._lock:
+            before, self._snapshot = self._snapshot, None
+            if before is None:
+                return None
+            current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+        diff = after.compare_to(before, "filename")
+        new_blocks = sum(stat.count_diff for stat in diff if stat.count_diff > 0)
+        return {"peak_bytes": peak, "current_bytes": current, "new_blocks": new_blocks}
@@ -0,0 +1,198 @@
+"""
+End-to-end latency tracing for the voice loop.
+
+voice_listener, AI_Skin_Analysis.analyze and generate_voice emit spans
+(recording, upload, transcription, ask, llm, tts, playback) into one local
+JSONL file, one line per span. All spans of an utterance share its id. The
+listener sends the id to the server in the X-Utterance-Id header, and
+trace_context() makes it current for the request. Spans emitted without an
+utterance id (ordinary web traffic) are dropped.
+
+VOICE_TRACE=0 disables tracing; VOICE_TRACE_FILE sets the file
+(default logs/voice_trace.jsonl next to this module).
+
+Summary of recorded traces:
+    python voice_trace.py
+    python voice_trace.py logs/voice_trace.jsonl --last 200
+"""
+
+import argparse
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+ENABLED = os.getenv("VOICE_TRACE", "1").lower() not in ("0", "false", "no", "off")
+TRACE_FILE = os.getenv("VOICE_TRACE_FILE") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "logs", "voice_trace.jsonl")
+HEADER = "X-Utterance-Id"
+
+# Display order for the summary; other stages follow alphabetically
+STAGE_ORDER = ["recording", "upload", "transcription", "ask", "llm", "tts", "playback"]
+
+_utterance_id = contextvars.ContextVar("utterance_id", default=None)
+_active_span = contextvars.ContextVar("active_span", default=None)
+_write_lock = threading.Lock()
+
+
+def current_utterance_id():
+    return _utterance_id.get()
+
+
+@contextmanager
+def trace_context(utterance_id):
+    """Make utterance_id current for spans emitted in this thread/context."""
+    token = _utterance_id.set(utterance_id or None)
+    try:
+        yield
+    finally:
+        _utterance_id.reset(token)
+
+
+def record_span(stage: str, start: float, end: float, utterance_id=None, **attrs):
+    """Write one already-measured span (wall-clock seconds)."""
+    utterance_id = utterance_id or _utterance_id.get()
+    if not ENABLED or not utterance_id:
+        return
+    line = json.dumps({
+        "utterance_id": utterance_id,
+        "stage": stage,
+        "start": round(start, 4),
+        "duration": round(max(0.0, end - start), 4),
+        "pid": os.getpid(),
+        **attrs,
+    }, ensure_ascii=False, default=str)
+    try:
+        with _write_lock:
+            directory = os.path.dirname(TRACE_FILE)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except OSError as e:
+        print(f"⚠️ Voice trace write failed: {e}")
+
+
+@contextmanager
+def span(stage: str, utterance_id=None, **attrs):
+    """
+    Time the block as one span. Yields the attribute dict, so the block can
+    add results (bytes, cache hit, ...); an exception is recorded as `error`.
+    """
+    start = time.time()
+    token = _active_span.set(attrs)
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _active_span.reset(token)
+        record_span(stage, start, time.time(), utterance_id, **attrs)
+
+
+def annotate(**attrs):
+    """Add attributes to the innermost open span, if any."""
+    active = _active_span.get()
+    if active is not None:
+        active.update(attrs)
+
+
+# -----------------------------
+#  SUMMARY
+# -----------------------------
+def load_spans(path: str = TRACE_FILE) -> list:
+    spans = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                spans.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # partially written last line
+    return spans
+
+
+def _percentile(ordered: list, q: float):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def summarize(spans: list, last: int = None) -> dict:
+    """
+    Per-stage latency percentiles, plus "release_to_playback": the end of
+    recording to the first playback start, the latency the user hears. A
+    stage's latency in an utterance is the wall-clock time from its earliest
+    span start to its latest span end, so segments transcribed in parallel
+    count once, not once per segment.
+    """
+    utterances = {}
+    for item in spans:
+        utterances.setdefault(item["utterance_id"], []).append(item)
+    ids = sorted(utterances, key=lambda uid: min(s["start"] for s in utterances[uid]))
+    if last:
+        ids = ids[-last:]
+
+    per_stage = {}
+    end_to_end = []
+    for uid in ids:
+        windows = {}
+        for item in utterances[uid]:
+            start, end = item["start"], item["start"] + item["duration"]
+            first, last = windows.get(item["stage"], (start, end))
+            windows[item["stage"]] = (min(first, start), max(last, end))
+        for stage, (start, end) in windows.items():
+            per_stage.setdefault(stage, []).append(end - start)
+        released = [s["start"] + s["duration"] for s in utterances[uid] if s["stage"] == "recording"]
+        playback = [s["start"] for s in utterances[uid] if s["stage"] == "playback"]
+        if released and playback:
+            end_to_end.append(min(playback) - max(released))
+    if end_to_end:
+        per_stage["release_to_playback"] = end_to_end
+
+    def ordering(stage):
+        if stage in STAGE_ORDER:
+            return (0, STAGE_ORDER.index(stage), stage)
+        return (1 if stage != "release_to_playback" else 2, 0, stage)
+
+    summary = {}
+    for stage in sorted(per_stage, key=ordering):
+        ordered = sorted(per_stage[stage])
+        summary[stage] = {
+            "count": len(ordered),
+            "p50": round(_percentile(ordered, 50), 3),
+            "p90": round(_percentile(ordered, 90), 3),
+            "p99": round(_percentile(ordered, 99), 3),
+            "max": round(ordered[-1], 3),
+        }
+    return {"utterances": len(ids), "stages": summary}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage latency percentiles of traced voice utterances.")
+    parser.add_argument("path", nargs="?", default=TRACE_FILE, help="trace JSONL file")
+    parser.add_argument("--last", type=int, help="only the most recent N utterances")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        parser.error(f"{args.path} not found (set VOICE_TRACE_FILE or run the voice loop first)")
+    summary = summarize(load_spans(args.path), last=args.last)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"📊 {summary['utterances']} utterances")
+    print(f"{'stage':<22}{'count':>7}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    for stage, stats in summary["stages"].items():
+        print(f"{stage:<22}{stats['count']:>7}{stats['p50']:>8.2f}s{stats['p90']:>8.2f}s"
+              f"{stats['p99']:>8.2f}s{stats['max']:>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
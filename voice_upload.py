@@ -0,0 +1,107 @@
+"""
+Prepare recorded speech for the transcription upload.
+
+Leading and trailing silence is trimmed (voice_vad.trim_silence) and the clip
+is encoded compactly before it leaves the machine. VOICE_UPLOAD_FORMAT picks
+the encoding:
+
+  flac  lossless, about half the size of WAV (needs soundfile, in requirements.txt)
+  opus  low-bitrate Ogg Opus, about a tenth of WAV (needs ffmpeg)
+  wav   raw 16-bit PCM, no dependencies
+
+An encoding whose dependency is missing falls back to WAV (reported once at import). upload_stats
+accumulates raw vs uploaded bytes and transcription time.
+"""
+
+import io
+import os
+import shutil
+import subprocess
+import threading
+import wave
+
+import numpy as np
+
+from voice_vad import trim_silence
+
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+UPLOAD_FORMAT = os.getenv("VOICE_UPLOAD_FORMAT", "flac").lower()
+OPUS_BITRATE = "24k"
+
+if UPLOAD_FORMAT == "flac" and soundfile is None:
+    print("⚠️ VOICE_UPLOAD_FORMAT=flac needs soundfile (pip install soundfile); uploading WAV")
+elif UPLOAD_FORMAT == "opus" and not shutil.which("ffmpeg"):
+    print("⚠️ VOICE_UPLOAD_FORMAT=opus needs ffmpeg on PATH; uploading WAV")
+
+upload_stats = {"uploads": 0, "raw_bytes": 0, "uploaded_bytes": 0, "trimmed_seconds": 0.0, "transcribe_seconds": 0.0}
+_stats_lock = threading.Lock()
+
+
+def wav_bytes(audio, fs=16000):
+    """Encode int16 mono samples as an in-memory WAV file."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(fs)
+        wf.writeframes(audio.tobytes())
+    return buffer.getvalue()
+
+
+def read_wav(source):
+    """(int16 samples, sample rate) from a WAV path or bytes."""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with wave.open(source, "rb") as wf:
+        fs = wf.getframerate()
+        audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        if wf.getnchannels() > 1:
+            audio = audio.reshape(-1, wf.getnchannels())[:, 0].copy()
+    return audio, fs
+
+
+def encode_audio(audio, fs=16000, fmt=UPLOAD_FORMAT):
+    """(filename, bytes, format actually used) for int16 mono samples."""
+    if fmt == "flac" and soundfile is not None:
+        buffer = io.BytesIO()
+        soundfile.write(buffer, audio, fs, format="FLAC", subtype="PCM_16")
+        return "speech.flac", buffer.getvalue(), "flac"
+    if fmt == "opus" and shutil.which("ffmpeg"):
+        command = ["ffmpeg", "-hide_banner", "-loglevel", "error",
+                   "-f", "s16le", "-ar", str(fs), "-ac", "1", "-i", "pipe:0",
+                   "-c:a", "libopus", "-b:a", OPUS_BITRATE, "-application", "voip", "-f", "ogg", "pipe:1"]
+        try:
+            result = subprocess.run(command, input=audio.tobytes(), capture_output=True, timeout=30)
+            if result.returncode == 0 and result.stdout:
+                return "speech.ogg", result.stdout, "opus"
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+    return "speech.wav", wav_bytes(audio, fs), "wav"
+
+
+def prepare_upload(audio, fs=16000, fmt=UPLOAD_FORMAT, trim=True) -> dict:
+    """Trim and encode a clip; returns {"file": (name, bytes), "format", "raw_bytes", "bytes", "trimmed_seconds"}."""
+    audio = audio.reshape(-1)
+    raw_bytes = 44 + audio.nbytes  # what the plain WAV upload would have been
+    trimmed = trim_silence(audio, fs) if trim else audio
+    name, data, used = encode_audio(trimmed, fs, fmt)
+    return {
+        "file": (name, data),
+        "format": used,
+        "raw_bytes": raw_bytes,
+        "bytes": len(data),
+        "trimmed_seconds": round((len(audio) - len(trimmed)) / fs, 3),
+    }
+
+
+def record_upload(report: dict, seconds: float):
+    with _stats_lock:
+        upload_stats["uploads"] += 1
+        upload_stats["raw_bytes"] += report["raw_bytes"]
+        upload_stats["uploaded_bytes"] += report["bytes"]
+        upload_stats["trimmed_seconds"] += report["trimmed_seconds"]
+        upload_stats["transcribe_seconds"] += seconds
@@ -0,0 +1,160 @@
+"""
+Lightweight NumPy voice-activity detection for push-to-talk audio.
+
+EnergyVAD labels fixed 30 ms frames as speech or silence by their RMS energy
+against an adaptive noise floor. SpeechSegmenter feeds recorder blocks
+through it and cuts the stream into utterance segments at pauses, so each
+finished segment can be transcribed while the user keeps talking.
+trim_silence() cuts leading and trailing silence from a whole clip.
+"""
+
+from collections import deque
+
+import numpy as np
+
+
+class EnergyVAD:
+    """
+    Frame-level speech/silence decision.
+
+    A frame is speech when its RMS exceeds `ratio` times the running noise floor
+    (and an absolute minimum, so digital silence doesn't make every breath
+    "speech"). The floor tracks non-speech frames only.
+    """
+
+    def __init__(self, fs: int = 16000, frame_ms: int = 30, ratio: float = 3.0,
+                 min_rms: float = 200.0, floor_alpha: float = 0.05):
+        self.fs = fs
+        self.frame = int(fs * frame_ms / 1000)
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.floor_alpha = floor_alpha
+        self.noise_floor = None
+
+    def frame_rms(self, frames: np.ndarray) -> np.ndarray:
+        """RMS per row of an (n, frame) int16 array."""
+        samples = frames.astype(np.float32)
+        return np.sqrt(np.mean(samples * samples, axis=1))
+
+    def classify(self, frames: np.ndarray) -> np.ndarray:
+        """Boolean speech flag per row of an (n, frame) int16 array."""
+        rms = self.frame_rms(frames)
+        if self.noise_floor is None:
+            # Assume the first frames after the key press are mostly room noise
+            self.noise_floor = float(np.percentile(rms, 20)) if len(rms) else self.min_rms / self.ratio
+        flags = np.empty(len(rms), dtype=bool)
+        for i, value in enumerate(rms):
+            threshold = max(self.noise_floor * self.ratio, self.min_rms)
+            flags[i] = value > threshold
+            if not flags[i]:
+                self.noise_floor += self.floor_alpha * (value - self.noise_floor)
+        return flags
+
+
+class SpeechSegmenter:
+    """
+    Turn a stream of int16 blocks into speech segments.
+
+    feed() returns the segments completed by that block: speech followed by at
+    least `min_silence_ms` of silence, or anything longer than `max_segment_s`.
+    Segments shorter than `min_speech_ms` are dropped as clicks. flush() returns
+    the segment in progress when recording stops.
+    """
+
+    def __init__(self, fs: int = 16000, min_silence_ms: int = 500, min_speech_ms: int = 250,
+                 max_segment_s: float = 15.0, pad_ms: int = 150, vad: EnergyVAD = None):
+        self.vad = vad or EnergyVAD(fs)
+        self.fs = fs
+        frame_ms = 1000 * self.vad.frame / fs
+        self.min_silence_frames = max(1, int(min_silence_ms / frame_ms))
+        self.min_speech_frames = max(1, int(min_speech_ms / frame_ms))
+        self.max_segment_frames = int(max_segment_s * 1000 / frame_ms)
+        self.pad_frames = int(pad_ms / frame_ms)
+        self._pending = np.zeros(0, dtype=np.int16)
+        self._preroll = deque(maxlen=max(1, self.pad_frames))
+        self._segment = []
+        self._speech_frames = 0
+        self._silence_run = 0
+        self.segments_emitted = 0
+
+    def feed(self, block: np.ndarray) -> list:
+        samples = np.concatenate([self._pending, block.reshape(-1)])
+        n = len(samples) // self.vad.frame
+        self._pending = samples[n * self.vad.frame:]
+        if n == 0:
+            return []
+        frames = samples[:n * self.vad.frame].reshape(n, self.vad.frame)
+        flags = self.vad.classify(frames)
+
+        finished = []
+        for frame, is_speech in zip(frames, flags):
+            if not self._segment:
+                if is_speech:
+                    # Start a segment with a little audio from before the onset
+                    self._segment = list(self._preroll)
+                    self._segment.append(frame)
+                    self._speech_frames = 1
+                    self._silence_run = 0
+                else:
+                    self._preroll.append(frame)
+                continue
+
+            self._segment.append(frame)
+            if is_speech:
+                self._speech_frames += 1
+                self._silence_run = 0
+            else:
+                self._silence_run += 1
+            if self._silence_run >= self.min_silence_frames or len(self._segment) >= self.max_segment_frames:
+                segment = self._close()
+                if segment is not None:
+                    finished.append(segment)
+        return finished
+
+    def _close(self):
+        segment, speech = self._segment, self._speech_frames
+        # Keep only pad_frames of the trailing silence
+        trailing = max(0, self._silence_run - self.pad_frames)
+        if trailing:
+            segment = segment[:-trailing]
+        self._segment = []
+        self._speech_frames = 0
+        self._silence_run = 0
+        self._preroll.clear()
+        if speech < self.min_speech_frames:
+            return None
+        self.segments_emitted += 1
+        return np.concatenate(segment)
+
+    def flush(self):
+        """Segment in progress (including any partial frame), or None."""
+        if not self._segment:
+            return None
+        if len(self._pending):
+            self._segment.append(self._pending)
+            self._pending = np.zeros(0, dtype=np.int16)
+        return self._close()
+
+
+def trim_silence(audio: np.ndarray, fs: int = 16000, pad_ms: int = 150, frame_ms: int = 30,
+                 ratio: float = 3.0, min_rms: float = 200.0) -> np.ndarray:
+    """
+    Cut leading and trailing silence from int16 mono audio in one vectorized
+    pass: frame RMS against a floor taken from the quietest frames. Returns the
+    input unchanged when no frame looks like speech.
+    """
+    audio = audio.reshape(-1)
+    frame = int(fs * frame_ms / 1000)
+    n = len(audio) // frame
+    if n == 0:
+        return audio
+    samples = audio[:n * frame].reshape(n, frame).astype(np.float32)
+    rms = np.sqrt(np.mean(samples * samples, axis=1))
+    threshold = max(float(np.percentile(rms, 10)) * ratio, min_rms)
+    speech = np.flatnonzero(rms > threshold)
+    if len(speech) == 0:
+        return audio
+    pad = int(pad_ms / frame_ms)
+    start = max(0, speech[0] - pad) * frame
+    end = min(len(audio), (speech[-1] + 1 + pad) * frame)
+    return audio[start:end]